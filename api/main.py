@@ -5,30 +5,38 @@ main.py - FastAPI Backend for OCI DataProtect MVP Dashboard
 Enterprise-grade REST API for backup operations, policy management,
 and compliance reporting. Demonstrates API-first architecture.
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
 import logging
+import re
+import threading
+import time
 from datetime import datetime
 from typing import List, Optional, Dict
 import sys
 import os
 
-# Add parent directory to path for imports
+# Add parent directory (and python/ for the backup modules) to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
 
 from api.models import (
     BackupRequest, BackupResponse, BackupStatus,
+    BatchBackupRequest, BatchBackupResponse,
     RestoreRequest, RestoreResponse,
     PolicyResponse, PolicyCreateRequest,
+    BulkPolicyRequest, BulkPolicyAssignRequest, BulkPolicyResponse,
     ValidationReport, DashboardMetrics,
     HealthCheck
 )
-from api.services.backup_service import BackupService
-from api.services.policy_service import PolicyService
-from api.services.validation_service import ValidationService
-from api.services.metrics_service import MetricsService
+from api.services import LazyService
+from api.responses import DEFAULT_RESPONSE_CLASS, ResponseCache
+
+import metrics
+import profiling
+import tracing
 
 # Configure logging
 logging.basicConfig(
@@ -37,31 +45,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global service instances
-backup_service: Optional[BackupService] = None
-policy_service: Optional[PolicyService] = None
-validation_service: Optional[ValidationService] = None
-metrics_service: Optional[MetricsService] = None
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "API request latency by route template", ["method", "route", "status"]
+)
+HTTP_IN_PROGRESS = metrics.gauge("http_requests_in_progress", "API requests currently being handled")
+
+# One profiled request at a time; concurrent requests would share samples anyway
+_profile_lock = threading.Lock()
+_PROFILE_ID = re.compile(r"^profile-[0-9T]+-[0-9a-f]{8}$")
+
+# Global service instances, each imported and created on first use so
+# cold starts do not pay for services (or the OCI SDK) a request never needs
+backup_service = LazyService("api.services.backup_service", "BackupService")
+policy_service = LazyService("api.services.policy_service", "PolicyService")
+validation_service = LazyService("api.services.validation_service", "ValidationService")
+metrics_service = LazyService("api.services.metrics_service", "MetricsService")
+catalog_service = LazyService("api.services.catalog_service", "CatalogService")
+SERVICES = (backup_service, policy_service, validation_service, metrics_service, catalog_service)
+
+# Encoded bodies of the large list responses. Backup listings come from
+# OCI, whose changes the API does not see, so they expire quickly.
+BACKUP_LIST_CACHE_SECONDS = float(os.environ.get("OCI_BACKUP_LIST_CACHE_SECONDS", "15"))
+backup_list_cache = ResponseCache("backup_list", ttl=BACKUP_LIST_CACHE_SECONDS)
+policy_list_cache = ResponseCache("policy_list")
+validation_report_cache = ResponseCache("validation_report")
+FINISHED_REPORT_STATES = ("completed", "failed")
+
+# Set to create every service during startup instead (e.g. behind a readiness probe)
+EAGER_SERVICES = os.environ.get("OCI_BACKUP_EAGER_SERVICES", "").lower() in ("1", "true", "yes")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle management for FastAPI application"""
-    global backup_service, policy_service, validation_service, metrics_service
-    
     # Startup
     logger.info("Initializing OCI DataProtect API...")
-    backup_service = BackupService()
-    policy_service = PolicyService()
-    validation_service = ValidationService()
-    metrics_service = MetricsService()
+    if EAGER_SERVICES:
+        for service in SERVICES:
+            service.get()
     logger.info("API initialization complete")
     
     yield
     
     # Shutdown
     logger.info("Shutting down API...")
-    # Cleanup resources if needed
+    for service in SERVICES:
+        service.reset()
 
 
 # Create FastAPI application
@@ -72,6 +101,7 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    default_response_class=DEFAULT_RESPONSE_CLASS,
     lifespan=lifespan
 )
 
@@ -85,6 +115,62 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """
+    Per-route latency histogram and a server span for every request.
+    
+    Routes are labelled by their path template (/api/v1/backup/status/{job_id})
+    so label cardinality stays bounded; unmatched paths share one label.
+    An incoming W3C traceparent header makes the request part of the
+    caller's trace, and the trace id is returned in X-Trace-Id.
+    Streaming responses are timed until their headers are sent.
+    
+    With OCI_BACKUP_PROFILING=on, /api/v1/* requests sent with
+    ``X-Profile: 1`` or ``?profile=1`` are run under the sampling
+    profiler; the X-Profile-Id response header names the profile to fetch
+    from /api/v1/system/profiles/{profile_id}.
+    """
+    started = time.perf_counter()
+    status = 500
+    HTTP_IN_PROGRESS.inc()
+    profiler = None
+    if (request.url.path.startswith("/api/v1/") and profiling.PROFILING_ALLOWED
+            and (profiling.is_requested(request.headers.get("X-Profile"))
+                 or profiling.is_requested(request.query_params.get("profile")))
+            and _profile_lock.acquire(blocking=False)):
+        profiler = profiling.SamplingProfiler().start()
+    with tracing.span(
+        f"{request.method} {request.url.path}",
+        parent=tracing.parse_traceparent(request.headers.get("traceparent")),
+        kind=tracing.KIND_SERVER,
+        attributes={"http.method": request.method, "http.target": request.url.path}
+    ) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if span.context is not None:
+                response.headers["X-Trace-Id"] = span.context.trace_id
+            if profiler is not None:
+                path = profiling.new_profile_path()
+                profiler.stop().write(path)
+                profiling.prune_profiles()
+                response.headers["X-Profile-Id"] = os.path.basename(path)[:-len(".folded")]
+            return response
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                _profile_lock.release()
+            HTTP_IN_PROGRESS.dec()
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(request.method, route, status).observe(time.perf_counter() - started)
+            span.name = f"{request.method} {route}"
+            span.set_attribute("http.route", route)
+            span.set_attribute("http.status_code", status)
+            if status >= 500:
+                span.set_status(tracing.STATUS_ERROR)
+
+
 # ============================================================================
 # Health Check Endpoints
 # ============================================================================
@@ -126,6 +212,82 @@ async def get_version():
     }
 
 
+@app.get("/api/v1/system/oci-concurrency", tags=["Health"])
+async def get_oci_concurrency():
+    """
+    Current adaptive concurrency limits per OCI API family.
+    
+    Shows the in-flight limit, outstanding calls and recent throttle rate
+    that the AIMD controller is tracking for each family and region, plus
+    retry counts, retry budget and circuit breaker state per endpoint.
+    """
+    from resilience import get_resilience
+    from throttling import get_controller
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "families": get_controller().snapshot(),
+        "endpoints": get_resilience().snapshot()
+    }
+
+
+@app.get("/api/v1/system/traces", tags=["Health"])
+async def get_traces(trace_id: Optional[str] = None, limit: int = 50):
+    """
+    Recently finished spans from the in-process trace buffer.
+    
+    Without trace_id, returns the most recent traces (newest first) with
+    their spans; pass a trace id (see the X-Trace-Id response header) to
+    get one trace. Set OCI_BACKUP_TRACE_FILE to also keep an OTLP/JSON
+    file for the OpenTelemetry Collector or Jaeger.
+    """
+    exporter = tracing.memory_exporter()
+    if exporter is None:
+        raise HTTPException(status_code=404, detail="In-memory tracing is not enabled")
+    traces: Dict[str, list] = {}
+    for span in reversed(exporter.spans(trace_id)):
+        if span.context.trace_id not in traces and len(traces) >= limit:
+            continue
+        traces.setdefault(span.context.trace_id, []).append(span.to_dict())
+    if trace_id and not traces:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return {
+        "traces": [
+            {"trace_id": tid, "spans": sorted(spans, key=lambda s: s["start_time_unix_nano"])}
+            for tid, spans in traces.items()
+        ]
+    }
+
+
+@app.get("/api/v1/system/profiles/{profile_id}", tags=["Health"])
+async def get_profile(profile_id: str):
+    """
+    Collapsed stacks of a profiled request, ready for flamegraph.pl or speedscope.
+    
+    Send any /api/v1/* request with ``X-Profile: 1`` (or ``?profile=1``)
+    and pass its X-Profile-Id response header here. Requires
+    OCI_BACKUP_PROFILING=on; only the newest profiles are kept.
+    """
+    if not _PROFILE_ID.match(profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = os.path.join(profiling.DEFAULT_PROFILE_DIR, f"{profile_id}.folded")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path) as f:
+        return Response(f.read(), media_type="text/plain")
+
+
+@app.get("/metrics", tags=["Health"])
+async def get_prometheus_metrics():
+    """
+    Prometheus scrape endpoint.
+    
+    Request latency per route, OCI call latency and errors per operation,
+    AIMD and retry state, job and queue gauges, worker utilization and
+    cache hit counters.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ============================================================================
 # Dashboard Metrics Endpoints
 # ============================================================================
@@ -151,11 +313,34 @@ async def get_dashboard_metrics(compartment_id: str):
 
 
 @app.get("/api/v1/dashboard/recent-jobs", tags=["Dashboard"])
-async def get_recent_jobs(compartment_id: str, limit: int = 10):
-    """Get recent backup jobs with status"""
+async def get_recent_jobs(
+    compartment_id: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    sort: str = "started",
+    order: str = "desc",
+    job_type: Optional[str] = None,
+    instance: Optional[str] = None,
+    state: Optional[str] = None,
+    max_age_days: Optional[float] = None
+):
+    """
+    Get recent backup and restore jobs with status, newest first.
+    
+    Pages are cursor based: pass ``next_cursor`` from a response as
+    ``cursor`` (with the same sort and order) for the next page.
+    Filter by job_type, instance (instance OCID), state and max_age_days;
+    sort by started or instance. Items carry instance_name (the instance
+    OCID; null for restores), progress_percent, end_time and
+    duration_seconds for display.
+    """
     try:
-        jobs = await metrics_service.get_recent_jobs(compartment_id, limit)
-        return {"jobs": jobs}
+        return await backup_service.list_jobs(
+            compartment_id, limit, cursor, sort, order,
+            job_type=job_type, instance=instance, state=state, max_age_days=max_age_days
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get recent jobs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -217,6 +402,54 @@ async def start_backup(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/backup/batch", response_model=BatchBackupResponse, tags=["Backup"])
+async def start_batch_backup(
+    request: BatchBackupRequest,
+    background_tasks: BackgroundTasks
+):
+    """
+    Start backup jobs for many instances in one request.
+    
+    Targets the listed instances, or every running instance in the
+    compartment matching target_tags when instance_ids is empty.
+    Returns a batch id together with the job id of each instance.
+    """
+    try:
+        batch = await backup_service.start_batch_backup(
+            compartment_id=request.compartment_id,
+            instance_ids=request.instance_ids,
+            target_tags=request.target_tags,
+            policy_id=request.policy_id
+        )
+        
+        if request.validate_after_backup:
+            background_tasks.add_task(
+                backup_service.validate_batch_async,
+                batch["batch_id"]
+            )
+        
+        batch["message"] = f"Batch admitted {batch['total_jobs']} backup jobs"
+        return batch
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch backup failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/v1/backup/batch/{batch_id}", response_model=BatchBackupResponse, tags=["Backup"])
+async def get_batch_status(batch_id: str):
+    """Get aggregate progress and per-job status of a batch backup"""
+    try:
+        return await backup_service.get_batch_status(batch_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    except Exception as e:
+        logger.error(f"Failed to get batch status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/v1/backup/status/{job_id}", response_model=BackupResponse, tags=["Backup"])
 async def get_backup_status(job_id: str):
     """Get status of a backup job"""
@@ -234,20 +467,42 @@ async def get_backup_status(job_id: str):
 async def list_backups(
     compartment_id: str,
     limit: int = 100,
-    backup_type: Optional[str] = None
+    backup_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    sort: str = "created",
+    order: str = "desc",
+    instance: Optional[str] = None,
+    state: Optional[str] = None,
+    min_size_gb: Optional[float] = None,
+    max_size_gb: Optional[float] = None,
+    min_age_days: Optional[float] = None,
+    max_age_days: Optional[float] = None
 ):
     """
-    List all backups in a compartment.
+    List backups in a compartment, one page at a time.
     
-    Optionally filter by backup type (boot_volume, block_volume).
+    Filter by backup type (boot_volume, block_volume), instance name,
+    state, size and age in days; sort by created, size or instance in
+    either order. Pass ``next_cursor`` from a response as ``cursor``
+    (with the same sort and order) for the next page; it is null on the
+    last page. Every page costs the same however deep it is.
     """
+    params = {
+        "backup_type": backup_type, "cursor": cursor, "sort": sort, "order": order,
+        "instance": instance, "state": state,
+        "min_size_gb": min_size_gb, "max_size_gb": max_size_gb,
+        "min_age_days": min_age_days, "max_age_days": max_age_days
+    }
+    
+    async def build():
+        return await backup_service.list_backups(compartment_id=compartment_id, limit=limit, **params)
+    
     try:
-        backups = await backup_service.list_backups(
-            compartment_id=compartment_id,
-            limit=limit,
-            backup_type=backup_type
+        return await backup_list_cache.respond(
+            (compartment_id, limit, *params.values()), None, build
         )
-        return {"backups": backups, "count": len(backups)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to list backups: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -262,6 +517,7 @@ async def delete_backup(backup_id: str):
     """
     try:
         result = await backup_service.delete_backup(backup_id)
+        backup_list_cache.clear()
         return result
     except PermissionError as e:
         raise HTTPException(status_code=403, detail=str(e))
@@ -330,13 +586,53 @@ async def list_policies(enabled_only: bool = False):
     Optionally filter to show only enabled policies.
     """
     try:
-        policies = await policy_service.list_policies(enabled_only=enabled_only)
-        return policies
+        # Service data is already in PolicyResponse shape; the cached body
+        # skips response_model validation
+        return await policy_list_cache.respond(
+            enabled_only,
+            policy_service.revision,
+            lambda: policy_service.list_policies(enabled_only=enabled_only)
+        )
     except Exception as e:
         logger.error(f"Failed to list policies: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/policies/bulk", response_model=BulkPolicyResponse, tags=["Policies"])
+async def bulk_apply_policies(request: BulkPolicyRequest):
+    """
+    Create, update or upsert many policies in one transaction.
+    
+    All entries are validated before anything is written. If any entry
+    is invalid nothing is applied and the per-item results say why.
+    """
+    try:
+        result = await policy_service.bulk_apply(request.policies, request.mode)
+        if not result["applied"]:
+            return JSONResponse(status_code=400, content=result)
+        return result
+    except Exception as e:
+        logger.error(f"Bulk policy {request.mode} failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/v1/policies/bulk/assign", response_model=BulkPolicyResponse, tags=["Policies"])
+async def bulk_assign_policies(request: BulkPolicyAssignRequest):
+    """Add target compartments and tags to many policies in one transaction"""
+    try:
+        result = await policy_service.bulk_assign(
+            policy_ids=request.policy_ids,
+            target_compartments=request.target_compartments,
+            target_tags=request.target_tags
+        )
+        if not result["applied"]:
+            return JSONResponse(status_code=400, content=result)
+        return result
+    except Exception as e:
+        logger.error(f"Bulk policy assign failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/v1/policies/{policy_id}", response_model=PolicyResponse, tags=["Policies"])
 async def get_policy(policy_id: str):
     """Get details of a specific policy"""
@@ -466,7 +762,17 @@ async def get_validation_report(job_id: str):
         report = await validation_service.get_report(job_id)
         if not report:
             raise HTTPException(status_code=404, detail="Report not found")
-        return report
+        
+        async def build():
+            return report  # Already fetched above; a cache miss only needs encoding
+        
+        # Finished reports never change; running ones are encoded afresh
+        return await validation_report_cache.respond(
+            job_id,
+            report["status"],
+            build,
+            lambda content: content["status"] in FINISHED_REPORT_STATES
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -474,6 +780,92 @@ async def get_validation_report(job_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/validation/report/{job_id}/stream", tags=["Validation"])
+async def stream_validation_report(job_id: str):
+    """
+    Stream a validation report as NDJSON.
+    
+    One line per validated backup, followed by a summary line. Lines are
+    delivered while the validation job is still running.
+    """
+    report = await validation_service.get_report(job_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return StreamingResponse(
+        validation_service.stream_report(job_id),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.get("/api/v1/validation/report/{job_id}/diff", tags=["Validation"])
+async def get_validation_report_diff(job_id: str, baseline_job_id: Optional[str] = None):
+    """
+    Compare a validation run with an earlier run of the same compartment.
+    
+    Returns newly failing, newly passing, new and deleted backups.
+    Defaults to the previous run when no baseline is given.
+    """
+    try:
+        return await validation_service.diff_report(job_id, baseline_job_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e).strip("'"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to diff validation reports: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================================================
+# File Catalog Endpoints
+# ============================================================================
+
+@app.get("/api/v1/catalog/search", tags=["Catalog"])
+async def search_catalog(prefix: str, limit: int = 100):
+    """
+    Search cataloged files by path prefix.
+    
+    Returns each matching path with its newest version and version count.
+    """
+    try:
+        files = await catalog_service.search(prefix, limit)
+        return {"files": files, "count": len(files)}
+    except Exception as e:
+        logger.error(f"Failed to search catalog: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/v1/catalog/history", tags=["Catalog"])
+async def get_file_history(path: str):
+    """
+    Versions of one file across backups.
+    
+    Each version lists the backup it changed in and every backup that
+    contains it, e.g. to pick the backup for a single-file restore.
+    """
+    try:
+        versions = await catalog_service.history(path)
+    except Exception as e:
+        logger.error(f"Failed to get file history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not versions:
+        raise HTTPException(status_code=404, detail=f"{path} not found in catalog")
+    return {"path": path, "versions": versions}
+
+
+@app.get("/api/v1/catalog/backups/{backup_id}/files", tags=["Catalog"])
+async def list_backup_files(backup_id: str, prefix: str = "/", limit: int = 1000):
+    """Browse the files under a path prefix as they were in one backup"""
+    try:
+        files = await catalog_service.list_files(backup_id, prefix, limit)
+        return {"backup_id": backup_id, "files": files, "count": len(files)}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e).strip("'"))
+    except Exception as e:
+        logger.error(f"Failed to list backup files: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================================================
 # Cost Analytics Endpoints
 # ============================================================================
@@ -100,6 +100,72 @@ class BackupResponse(BaseModel):
         }
 
 
+class BatchBackupRequest(BaseModel):
+    """Request to start backup jobs for many instances at once"""
+    compartment_id: str = Field(..., description="OCI compartment OCID")
+    instance_ids: List[str] = Field(
+        default=[],
+        description="Instance OCIDs to backup (leave empty to use the selector)"
+    )
+    target_tags: Dict[str, str] = Field(
+        default={},
+        description="Freeform tags an instance must carry to be selected"
+    )
+    policy_id: Optional[str] = Field(None, description="Backup policy to apply")
+    validate_after_backup: bool = Field(
+        default=True,
+        description="Automatically validate backups after completion"
+    )
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "compartment_id": "ocid1.compartment.oc1..aaa",
+                "instance_ids": [],
+                "target_tags": {"Environment": "Production"},
+                "policy_id": "prod-daily",
+                "validate_after_backup": True
+            }
+        }
+
+
+class BatchJobItem(BaseModel):
+    """Per-instance job admitted by a batch"""
+    instance_id: str = Field(..., description="Instance OCID")
+    job_id: str = Field(..., description="Backup job identifier")
+    status: BackupStatus = Field(..., description="Current job status")
+    progress: int = Field(default=0, description="Progress percentage")
+
+
+class BatchBackupResponse(BaseModel):
+    """Response from a batch backup operation"""
+    batch_id: str = Field(..., description="Unique batch identifier")
+    status: str = Field(..., description="Aggregate batch status")
+    message: str = Field(..., description="Status message")
+    timestamp: str = Field(..., description="Response timestamp")
+    total_jobs: int = Field(..., description="Number of jobs in the batch")
+    status_counts: Dict[str, int] = Field(default={}, description="Job count per status")
+    progress_percent: float = Field(default=0, description="Aggregate progress percentage")
+    jobs: List[BatchJobItem] = Field(default=[], description="Per-instance jobs")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "batch_id": "batch-12345",
+                "status": "running",
+                "message": "Batch admitted 2 backup jobs",
+                "timestamp": "2025-01-06T10:00:00Z",
+                "total_jobs": 2,
+                "status_counts": {"running": 2},
+                "progress_percent": 0,
+                "jobs": [
+                    {"instance_id": "ocid1.instance.oc1..aaa", "job_id": "backup-aaa", "status": "running", "progress": 0},
+                    {"instance_id": "ocid1.instance.oc1..bbb", "job_id": "backup-bbb", "status": "running", "progress": 0}
+                ]
+            }
+        }
+
+
 # ============================================================================
 # Restore Models
 # ============================================================================
@@ -197,6 +263,54 @@ class PolicyResponse(BaseModel):
     updated_at: str
 
 
+class BulkPolicyRequest(BaseModel):
+    """Request to create, update or upsert many policies in one transaction"""
+    mode: str = Field(
+        default="upsert",
+        description="create, update or upsert",
+        pattern="^(create|update|upsert)$"
+    )
+    policies: List[Dict] = Field(..., description="Policy definitions (partial for updates)")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "mode": "upsert",
+                "policies": [
+                    {"policy_id": "app-123-daily", "name": "App 123 Daily", "description": "Daily backups",
+                     "frequency": "daily", "retention_days": 30, "retention_class": "standard"},
+                    {"policy_id": "prod-daily", "retention_days": 120}
+                ]
+            }
+        }
+
+
+class BulkPolicyAssignRequest(BaseModel):
+    """Request to add targets to many policies in one transaction"""
+    policy_ids: List[str] = Field(..., description="Policies to assign")
+    target_compartments: List[str] = Field(default=[], description="Compartments to add")
+    target_tags: Dict[str, str] = Field(default={}, description="Tags to add or overwrite")
+
+
+class BulkPolicyItemResult(BaseModel):
+    """Outcome for one entry of a bulk policy request"""
+    index: int
+    policy_id: Optional[str]
+    action: Optional[str] = Field(None, description="created or updated")
+    status: str = Field(..., description="ok or error")
+    error: Optional[str] = None
+
+
+class BulkPolicyResponse(BaseModel):
+    """Response from a bulk policy operation"""
+    mode: str
+    applied: bool = Field(..., description="Whether the transaction was committed")
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BulkPolicyItemResult]
+
+
 # ============================================================================
 # Validation Models
 # ============================================================================
@@ -208,7 +322,8 @@ class ValidationReport(BaseModel):
     report_date: str = Field(..., description="Report generation timestamp")
     summary: Dict = Field(..., description="Summary statistics")
     status: str = Field(..., description="Overall compliance status")
-    failed_backups: List[str] = Field(default=[], description="Failed backup OCIDs")
+    failed_backups: List[str] = Field(default=[], description="Failed backup OCIDs (the first ones when there are many)")
+    failed_backups_omitted: Optional[int] = Field(None, description="Failed backups not listed in failed_backups")
     recommendations: List[str] = Field(default=[], description="Recommendations")
     details: Optional[List[Dict]] = Field(None, description="Detailed results")
     
@@ -0,0 +1,125 @@
+"""
+responses.py - Fast JSON responses for large API payloads
+
+FastAPI validates a route's return value against its response_model,
+converts it with jsonable_encoder and encodes it with the json module.
+For list endpoints returning thousands of items built by our own services,
+that work dominates request CPU while checking nothing new. Routes serving
+such data return a ready Response instead, which FastAPI passes through
+untouched, encoded with orjson when installed. ResponseCache keeps the
+encoded bodies so repeated requests for unchanged data skip building and
+encoding altogether. Other routes keep their validation but are encoded
+with orjson too (FastJSONResponse as the app's default response class).
+
+Set OCI_BACKUP_FAST_JSON=off to serve these routes through the standard
+FastAPI path again (used by the serialization benchmark as its baseline).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = os.environ.get("OCI_BACKUP_FAST_JSON", "on").lower() not in ("0", "off", "false", "no")
+DEFAULT_CACHE_ENTRIES = int(os.environ.get("OCI_BACKUP_RESPONSE_CACHE_ENTRIES", "256"))
+
+SERIALIZE_SECONDS = metrics.histogram(
+    "response_serialize_seconds", "Time to encode large API response bodies", ["route"]
+)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON; datetimes and other non-JSON values become strings"""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson (stdlib json if it is not installed)"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# The app's default; plain JSONResponse while fast JSON is off
+DEFAULT_RESPONSE_CLASS = FastJSONResponse if FAST_JSON else JSONResponse
+
+
+class EncodedJSONResponse(Response):
+    """Response for a body that is already encoded JSON"""
+    media_type = "application/json"
+
+
+class ResponseCache:
+    """
+    Encoded response bodies keyed by request parameters.
+    
+    Each entry carries the ``version`` of the data it was built from (a
+    revision counter, a job status, ...); a lookup with a different
+    version is a miss. Entries also expire after ``ttl`` seconds when set,
+    for data whose changes the API does not see. Least recently used
+    entries are dropped beyond ``max_entries``.
+    """
+    
+    def __init__(self, name: str, ttl: Optional[float] = None, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, version: Hashable = None) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, body, expires = entry
+                if entry_version == version and (expires is None or expires > time.monotonic()):
+                    self._entries.move_to_end(key)
+                    metrics.record_cache(self.name, True)
+                    return body
+                del self._entries[key]
+        metrics.record_cache(self.name, False)
+        return None
+    
+    def put(self, key: Hashable, body: bytes, version: Hashable = None):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (version, body, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    async def respond(self, key: Hashable, version: Hashable, build: Callable[[], Awaitable[Any]],
+                      cacheable: Callable[[Any], bool] = lambda content: True):
+        """
+        Response for ``key``, from the cache or from ``build()``.
+        
+        ``cacheable`` can refuse to keep bodies that are still changing,
+        such as a running job's report. With fast JSON off, returns the
+        built content for FastAPI to validate and encode as usual.
+        """
+        if not FAST_JSON:
+            return await build()
+        body = self.get(key, version)
+        if body is None:
+            content = await build()
+            with SERIALIZE_SECONDS.labels(self.name).time():
+                body = dumps(content)
+            if cacheable(content):
+                self.put(key, body, version)
+        return EncodedJSONResponse(body)
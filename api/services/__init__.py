@@ -3,3 +3,50 @@ Services package for OCI DataProtect MVP API
 
 Provides business logic layer between API endpoints and backend operations.
 """
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyService:
+    """
+    Service singleton created on first use.
+    
+    Stands in for the service itself: attribute access is forwarded to the
+    instance, which is imported and constructed by whichever request needs
+    it first. Startup therefore only pays for the services it uses.
+    """
+    
+    def __init__(self, module: str, class_name: str):
+        self.module = module
+        self.class_name = class_name
+        self._instance = None
+        self._lock = threading.Lock()
+    
+    def get(self):
+        """The service instance, created if needed"""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    service_class = getattr(importlib.import_module(self.module), self.class_name)
+                    self._instance = service_class()
+                    logger.info(f"{self.class_name} started in {time.perf_counter() - started:.3f}s")
+                instance = self._instance
+        return instance
+    
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+    
+    def reset(self):
+        """Drop the instance; the next use creates a new one"""
+        with self._lock:
+            self._instance = None
+    
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -4,9 +4,11 @@ backup_service.py - Backup operations service
 Business logic for backup and restore operations.
 Integrates with existing backup.py and restore.py scripts.
 """
+import asyncio
 import logging
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 import sys
 import os
@@ -14,16 +16,78 @@ import os
 # Add python directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'python'))
 
+import metrics
+import tracing
+from lazy import oci
+from listing_index import DEFAULT_INDEX_DB, DEFAULT_PAGE_SIZE, ListingIndex, get_listing_index
+
 logger = logging.getLogger(__name__)
 
+# Job states that still hold a backup slot
+ACTIVE_STATES = ("pending", "running", "validating")
+
+# Size of the event loop's default executor that run_in_executor(None, ...) uses
+DEFAULT_EXECUTOR_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# How long a compartment's indexed backup listing is served before it is re-read
+INDEX_REFRESH_SECONDS = float(os.environ.get("OCI_BACKUP_INDEX_REFRESH_SECONDS", "300"))
+
+# Most instances one batch request may start jobs for
+MAX_BATCH_INSTANCES = int(os.environ.get("OCI_BACKUP_MAX_BATCH_INSTANCES", "500"))
+
+# How long finished jobs stay listed before they are dropped
+JOB_RETENTION_SECONDS = float(os.environ.get("OCI_BACKUP_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+JOBS_STARTED = metrics.counter("jobs_started", "Backup and restore jobs started through the API", ["type"])
+
 
 class BackupService:
     """Service for backup and restore operations"""
     
-    def __init__(self):
+    def __init__(self, index_db: str = DEFAULT_INDEX_DB):
         self.jobs = {}  # In-memory job tracking (use database in production)
+        self.batches = {}  # batch_id -> list of job_ids
+        self.index = get_listing_index(index_db)  # Paged backup listings
+        # Jobs only live in memory, so their listing index does too
+        self.job_index = ListingIndex(":memory:")
+        self._pruned_at = 0.0
+        self._lookups = metrics.WorkTracker("instance_lookup", DEFAULT_EXECUTOR_WORKERS)
+        metrics.register_collector("backup_jobs", self._collect_metrics)
         logger.info("BackupService initialized")
     
+    def _collect_metrics(self):
+        """Scrape-time job counts by type and status"""
+        counts: Dict[tuple, int] = {}
+        for job in list(self.jobs.values()):
+            key = (job["type"], job["status"])
+            counts[key] = counts.get(key, 0) + 1
+        yield (metrics.PREFIX + "jobs", "gauge", "Tracked jobs by type and status",
+               [({"type": t, "status": status}, n) for (t, status), n in sorted(counts.items())])
+        yield (metrics.PREFIX + "backups_in_flight", "gauge", "Backup jobs not yet finished",
+               [({}, sum(n for (t, status), n in counts.items() if t == "backup" and status in ACTIVE_STATES))])
+        yield (metrics.PREFIX + "batches", "gauge", "Tracked batch backups", [({}, len(self.batches))])
+    
+    def _new_backup_job(
+        self,
+        compartment_id: str,
+        instance_id: str,
+        policy_id: Optional[str] = None,
+        batch_id: Optional[str] = None
+    ) -> Dict:
+        """Build the tracking record for a backup job"""
+        job_id = f"backup-{uuid.uuid4().hex[:12]}"
+        return {
+            "job_id": job_id,
+            "type": "backup",
+            "compartment_id": compartment_id,
+            "instance_id": instance_id,
+            "policy_id": policy_id,
+            "batch_id": batch_id,
+            "status": "running",
+            "start_time": datetime.utcnow().isoformat(),
+            "progress": 0
+        }
+    
     async def start_backup(
         self,
         compartment_id: str,
@@ -39,19 +103,18 @@ class BackupService:
         2. Track job status in database
         3. Return job ID immediately
         """
-        job_id = f"backup-{uuid.uuid4().hex[:12]}"
+        job = self._new_backup_job(compartment_id, instance_id, policy_id)
+        job_id = job["job_id"]
         
-        # Store job info
-        self.jobs[job_id] = {
-            "job_id": job_id,
-            "type": "backup",
-            "compartment_id": compartment_id,
-            "instance_id": instance_id,
-            "policy_id": policy_id,
-            "status": "running",
-            "start_time": datetime.utcnow().isoformat(),
-            "progress": 0
-        }
+        with tracing.span("backup.queue", attributes={"backup.job_id": job_id, "oci.instance_id": instance_id}):
+            # Later stages (background validation) continue this trace
+            job["traceparent"] = tracing.current_traceparent()
+            
+            # Store job info
+            self._prune_jobs()
+            self.jobs[job_id] = job
+            self.job_index.upsert_jobs([job])
+            JOBS_STARTED.labels("backup").inc()
         
         logger.info(f"Started backup job {job_id} for instance {instance_id}")
         
@@ -60,6 +123,169 @@ class BackupService:
         
         return job_id
     
+    async def start_batch_backup(
+        self,
+        compartment_id: str,
+        instance_ids: List[str],
+        target_tags: Optional[Dict[str, str]] = None,
+        policy_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Start backup jobs for many instances in one request.
+        
+        Instances come from ``instance_ids`` or, when that is empty, from
+        the compartment filtered by ``target_tags``. All job records are
+        built first and then admitted together, so a batch is either fully
+        tracked or not tracked at all. Raises ValueError for a request
+        with neither instance_ids nor target_tags, since that would select
+        every running instance in the compartment, and for batches of more
+        than MAX_BATCH_INSTANCES instances.
+        """
+        if not instance_ids and not target_tags:
+            raise ValueError("Batch needs instance_ids or target_tags")
+        if len(instance_ids) > MAX_BATCH_INSTANCES:
+            raise ValueError(f"Batch lists {len(instance_ids)} instances; the limit is {MAX_BATCH_INSTANCES}")
+        if not instance_ids:
+            with tracing.span("backup.instance_lookup", attributes={"oci.compartment_id": compartment_id}):
+                instance_ids = await self._resolve_instances(compartment_id, target_tags or {})
+        
+        # Preserve request order but never start two jobs for one instance
+        instance_ids = list(dict.fromkeys(instance_ids))
+        if not instance_ids:
+            raise ValueError("No instances matched the batch request")
+        if len(instance_ids) > MAX_BATCH_INSTANCES:
+            raise ValueError(
+                f"Batch selects {len(instance_ids)} instances; the limit is {MAX_BATCH_INSTANCES}, narrow target_tags"
+            )
+        
+        batch_id = f"batch-{uuid.uuid4().hex[:12]}"
+        new_jobs = [
+            self._new_backup_job(compartment_id, instance_id, policy_id, batch_id)
+            for instance_id in instance_ids
+        ]
+        
+        # Admit the whole batch at once
+        with tracing.span("backup.queue", attributes={"backup.batch_id": batch_id, "backup.jobs": len(new_jobs)}):
+            traceparent = tracing.current_traceparent()
+            for job in new_jobs:
+                job["traceparent"] = traceparent
+            self._prune_jobs()
+            self.jobs.update((job["job_id"], job) for job in new_jobs)
+            self.batches[batch_id] = [job["job_id"] for job in new_jobs]
+            self.job_index.upsert_jobs(new_jobs)
+            JOBS_STARTED.labels("backup").inc(len(new_jobs))
+        
+        logger.info(f"Started batch {batch_id} with {len(new_jobs)} backup jobs")
+        
+        # TODO: Integrate with python/backup.py
+        
+        return await self.get_batch_status(batch_id)
+    
+    async def _resolve_instances(self, compartment_id: str, target_tags: Dict[str, str]) -> List[str]:
+        """Resolve a compartment/tag selector to running instance OCIDs"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, tracing.bind(self._lookups.track(self._list_matching_instances, compartment_id, target_tags))
+        )
+    
+    def _list_matching_instances(self, compartment_id: str, target_tags: Dict[str, str]) -> List[str]:
+        """List instances in a compartment whose freeform tags match"""
+        from backup import load_clients
+        
+        compute, _ = load_clients()
+        instances = oci.pagination.list_call_get_all_results(
+            compute.list_instances,
+            compartment_id=compartment_id,
+            lifecycle_state="RUNNING"
+        ).data
+        return [
+            instance.id for instance in instances
+            if all(instance.freeform_tags.get(k) == v for k, v in target_tags.items())
+        ]
+    
+    async def get_batch_status(self, batch_id: str) -> Dict:
+        """Get aggregate progress of a batch backup"""
+        if batch_id not in self.batches:
+            raise KeyError(f"Batch {batch_id} not found")
+        
+        jobs = [self.jobs[job_id] for job_id in self.batches[batch_id]]
+        status_counts: Dict[str, int] = {}
+        for job in jobs:
+            status_counts[job["status"]] = status_counts.get(job["status"], 0) + 1
+        
+        if status_counts.get("running") or status_counts.get("pending") or status_counts.get("validating"):
+            status = "running"
+        elif status_counts.get("failed") == len(jobs):
+            status = "failed"
+        elif status_counts.get("failed"):
+            status = "completed_with_errors"
+        else:
+            status = "completed"
+        
+        return {
+            "batch_id": batch_id,
+            "status": status,
+            "message": f"Batch tracks {len(jobs)} backup jobs",
+            "timestamp": datetime.utcnow().isoformat(),
+            "total_jobs": len(jobs),
+            "status_counts": status_counts,
+            "progress_percent": round(sum(job["progress"] for job in jobs) / len(jobs), 1),
+            "jobs": [
+                {
+                    "instance_id": job["instance_id"],
+                    "job_id": job["job_id"],
+                    "status": job["status"],
+                    "progress": job["progress"]
+                }
+                for job in jobs
+            ]
+        }
+    
+    async def validate_batch_async(self, batch_id: str):
+        """Validate every backup in a batch (background task)"""
+        for job_id in self.batches.get(batch_id, []):
+            await self.validate_backup_async(job_id)
+    
+    def update_job(self, job_id: str, **changes) -> Dict:
+        """
+        Apply status or progress changes to a tracked job.
+        
+        Every change to a job goes through here so the job listing index
+        never serves a stale status. A job reaching a finished state is
+        stamped with its end_time.
+        """
+        if job_id not in self.jobs:
+            raise KeyError(f"Job {job_id} not found")
+        job = self.jobs[job_id]
+        job.update(changes)
+        if job["status"] not in ACTIVE_STATES and not job.get("end_time"):
+            job["end_time"] = datetime.utcnow().isoformat()
+        self.job_index.upsert_jobs([job])
+        return job
+    
+    def _prune_jobs(self):
+        """Drop jobs finished more than JOB_RETENTION_SECONDS ago, whole batches at a time"""
+        # A full scan of the jobs; at most once a minute is plenty
+        if time.monotonic() - self._pruned_at < 60:
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = (datetime.utcnow() - timedelta(seconds=JOB_RETENTION_SECONDS)).isoformat()
+        expired = {
+            job_id for job_id, job in self.jobs.items()
+            if job["status"] not in ACTIVE_STATES and (job.get("end_time") or job["start_time"]) < cutoff
+        }
+        if not expired:
+            return
+        for batch_id, job_ids in list(self.batches.items()):
+            if expired.issuperset(job_ids):
+                del self.batches[batch_id]
+            else:
+                expired.difference_update(job_ids)  # Batches are kept or dropped whole
+        for job_id in expired:
+            del self.jobs[job_id]
+        self.job_index.remove_jobs(expired)
+        logger.info(f"Pruned {len(expired)} finished jobs")
+    
     async def get_job_status(self, job_id: str) -> Dict:
         """Get status of a backup job"""
         if job_id not in self.jobs:
@@ -70,11 +296,84 @@ class BackupService:
     async def list_backups(
         self,
         compartment_id: str,
-        limit: int = 100,
-        backup_type: Optional[str] = None
-    ) -> List[Dict]:
+        limit: int = DEFAULT_PAGE_SIZE,
+        backup_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort: str = "created",
+        order: str = "desc",
+        instance: Optional[str] = None,
+        state: Optional[str] = None,
+        min_size_gb: Optional[float] = None,
+        max_size_gb: Optional[float] = None,
+        min_age_days: Optional[float] = None,
+        max_age_days: Optional[float] = None
+    ) -> Dict:
+        """
+        One page of a compartment's backups from the listing index.
+        
+        The compartment's listing is re-read into the index when it is
+        older than INDEX_REFRESH_SECONDS. Returns {"backups", "count",
+        "next_cursor"}; raises ValueError for bad paging arguments.
+        """
+        synced_at = self.index.backups_synced_at(compartment_id)
+        if synced_at is None or time.time() - synced_at > INDEX_REFRESH_SECONDS:
+            backups = await self._fetch_backups(compartment_id)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.index.replace_backups, compartment_id, backups)
+        
+        page = self.index.page_backups(
+            compartment_id, limit, cursor, sort, order,
+            backup_type=backup_type, instance=instance, state=state,
+            min_size_gb=min_size_gb, max_size_gb=max_size_gb,
+            min_age_days=min_age_days, max_age_days=max_age_days
+        )
+        return {"backups": page["items"], "count": len(page["items"]), "next_cursor": page["next_cursor"]}
+    
+    async def list_jobs(
+        self,
+        compartment_id: str,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        sort: str = "started",
+        order: str = "desc",
+        job_type: Optional[str] = None,
+        instance: Optional[str] = None,
+        state: Optional[str] = None,
+        max_age_days: Optional[float] = None
+    ) -> Dict:
+        """
+        One page of a compartment's backup and restore jobs, newest first by default.
+        
+        ``instance`` matches and sorts on the job's instance OCID; restore
+        jobs have no instance and only match without the filter. Items
+        are shaped for the dashboard by _job_item.
+        """
+        page = self.job_index.page_jobs(
+            compartment_id, limit, cursor, sort, order,
+            job_type=job_type, instance=instance, state=state, max_age_days=max_age_days
+        )
+        jobs = [self._job_item(job) for job in page["items"]]
+        return {"jobs": jobs, "count": len(jobs), "next_cursor": page["next_cursor"]}
+    
+    @staticmethod
+    def _job_item(job: Dict) -> Dict:
+        """Job record plus the display fields the dashboard reads"""
+        end_time = job.get("end_time")
+        duration = None
+        if end_time:
+            elapsed = datetime.fromisoformat(end_time) - datetime.fromisoformat(job["start_time"])
+            duration = round(elapsed.total_seconds())
+        return {
+            **job,
+            "instance_name": job.get("instance_name") or job.get("instance_id"),
+            "progress_percent": job.get("progress", 0),
+            "end_time": end_time,
+            "duration_seconds": duration
+        }
+    
+    async def _fetch_backups(self, compartment_id: str) -> List[Dict]:
         """
-        List backups in a compartment.
+        Every backup in a compartment, for the listing index.
         
         TODO: Integrate with OCI SDK to list actual backups
         """
@@ -105,6 +404,7 @@ class BackupService:
         TODO: Integrate with OCI SDK
         """
         logger.info(f"Deleting backup {backup_id}")
+        self.index.remove_backup(backup_id)
         return {"message": f"Backup {backup_id} deleted successfully"}
     
     async def start_restore(
@@ -123,7 +423,7 @@ class BackupService:
         """
         job_id = f"restore-{uuid.uuid4().hex[:12]}"
         
-        self.jobs[job_id] = {
+        job = {
             "job_id": job_id,
             "type": "restore",
             "compartment_id": compartment_id,
@@ -132,6 +432,10 @@ class BackupService:
             "start_time": datetime.utcnow().isoformat(),
             "progress": 0
         }
+        self._prune_jobs()
+        self.jobs[job_id] = job
+        self.job_index.upsert_jobs([job])
+        JOBS_STARTED.labels("restore").inc()
         
         logger.info(f"Started restore job {job_id} from backup {boot_backup_id}")
         
@@ -146,6 +450,8 @@ class BackupService:
     
     async def validate_backup_async(self, job_id: str):
         """Validate backup after completion (background task)"""
-        logger.info(f"Validating backup for job {job_id}")
-        # TODO: Call validator.py
-        pass
+        job = self.jobs.get(job_id, {})
+        parent = tracing.parse_traceparent(job.get("traceparent"))
+        with tracing.span("backup.validate", parent=parent, attributes={"backup.job_id": job_id}):
+            logger.info(f"Validating backup for job {job_id}")
+            # TODO: Call validator.py
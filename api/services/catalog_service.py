@@ -0,0 +1,41 @@
+"""
+catalog_service.py - File catalog search service
+
+Business logic for file-level search across backups, backed by the
+catalog database that catalog.py builds. Queries are index lookups that
+take milliseconds, so they run inline like the policy store reads.
+"""
+import logging
+from typing import List, Dict, Optional
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'python'))
+
+from catalog import DEFAULT_CATALOG_DB, FileCatalog
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogService:
+    """Service for file catalog queries"""
+    
+    def __init__(self, db_path: str = DEFAULT_CATALOG_DB):
+        self.catalog = FileCatalog(db_path)
+        logger.info("CatalogService initialized")
+    
+    async def search(self, prefix: str, limit: int = 100) -> List[Dict]:
+        """Files whose path starts with a prefix"""
+        return self.catalog.search(prefix, limit)
+    
+    async def history(self, path: str) -> List[Dict]:
+        """Versions of one file and the backups containing each"""
+        return self.catalog.history(path)
+    
+    async def list_files(self, backup_id: str, prefix: str = "/", limit: int = 1000) -> List[Dict]:
+        """Files under a prefix in one backup"""
+        return self.catalog.list_files(backup_id, prefix, limit)
+    
+    async def list_backups(self, series: Optional[str] = None) -> List[Dict]:
+        """Cataloged backups"""
+        return self.catalog.list_backups(series)
@@ -39,43 +39,6 @@ class MetricsService:
             }
         }
     
-    async def get_recent_jobs(self, compartment_id: str, limit: int = 10) -> List[Dict]:
-        """Get recent backup jobs"""
-        # Mock data for demo
-        jobs = [
-            {
-                "job_id": "backup-abc123",
-                "instance_id": "ocid1.instance.oc1..prod-web-01",
-                "instance_name": "prod-web-01",
-                "status": "completed",
-                "start_time": (datetime.utcnow() - timedelta(minutes=5)).isoformat(),
-                "end_time": datetime.utcnow().isoformat(),
-                "duration_seconds": 120,
-                "progress_percent": 100
-            },
-            {
-                "job_id": "backup-def456",
-                "instance_id": "ocid1.instance.oc1..prod-db-01",
-                "instance_name": "prod-db-01",
-                "status": "running",
-                "start_time": (datetime.utcnow() - timedelta(minutes=2)).isoformat(),
-                "end_time": None,
-                "duration_seconds": None,
-                "progress_percent": 45
-            },
-            {
-                "job_id": "backup-ghi789",
-                "instance_id": "ocid1.instance.oc1..prod-app-01",
-                "instance_name": "prod-app-01",
-                "status": "completed",
-                "start_time": (datetime.utcnow() - timedelta(minutes=15)).isoformat(),
-                "end_time": (datetime.utcnow() - timedelta(minutes=13)).isoformat(),
-                "duration_seconds": 120,
-                "progress_percent": 100
-            }
-        ]
-        return jobs[:limit]
-    
     async def get_storage_trends(self, compartment_id: str, days: int = 7) -> List[Dict]:
         """Get storage usage trends"""
         # Mock trend data
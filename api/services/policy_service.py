@@ -10,44 +10,77 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'python'))
 
+from policy_manager import PolicyManager, BulkMode, parse_policy
+
 logger = logging.getLogger(__name__)
 
+# Policy store shared with the policy_manager.py CLI
+DEFAULT_POLICY_FILE = os.environ.get("OCI_BACKUP_POLICY_FILE", "/etc/oci-backup/policies.json")
+
 
 class PolicyService:
     """Service for policy management"""
     
-    def __init__(self):
+    def __init__(self, config_path: str = DEFAULT_POLICY_FILE):
+        self.manager = PolicyManager(config_path=config_path)
         logger.info("PolicyService initialized")
     
+    @property
+    def revision(self) -> int:
+        """Changes whenever the policy set does; keys cached policy responses"""
+        return self.manager.revision
+    
     async def list_policies(self, enabled_only: bool = False) -> List[Dict]:
         """List all policies"""
-        # TODO: Integrate with policy_manager.py
-        return []
+        return [p.to_dict() for p in self.manager.list_policies(enabled_only=enabled_only)]
     
     async def get_policy(self, policy_id: str) -> Optional[Dict]:
         """Get a specific policy"""
-        # TODO: Integrate with policy_manager.py
-        return None
+        policy = self.manager.get_policy(policy_id)
+        return policy.to_dict() if policy else None
     
-    async def create_policy(self, request: Dict) -> Dict:
+    async def create_policy(self, request) -> Dict:
         """Create a new policy"""
-        # TODO: Integrate with policy_manager.py
-        logger.info(f"Creating policy: {request.get('name')}")
-        return request
+        data = request.dict() if hasattr(request, "dict") else dict(request)
+        logger.info(f"Creating policy: {data.get('name')}")
+        policy = self.manager.create_policy(parse_policy(self._plain(data)))
+        return policy.to_dict()
     
     async def update_policy(self, policy_id: str, updates: Dict) -> Dict:
         """Update a policy"""
-        # TODO: Integrate with policy_manager.py
         logger.info(f"Updating policy: {policy_id}")
-        return updates
+        result = self.manager.bulk_apply([{**updates, "policy_id": policy_id}], BulkMode.UPDATE)
+        if not result["applied"]:
+            raise ValueError(result["results"][0]["error"])
+        return self.manager.get_policy(policy_id).to_dict()
     
     async def delete_policy(self, policy_id: str):
         """Delete a policy"""
-        # TODO: Integrate with policy_manager.py
         logger.info(f"Deleting policy: {policy_id}")
+        self.manager.delete_policy(policy_id)
+    
+    async def bulk_apply(self, entries: List[Dict], mode: str = "upsert") -> Dict:
+        """Create, update or upsert many policies in one transaction"""
+        logger.info(f"Bulk {mode} of {len(entries)} policies")
+        return self.manager.bulk_apply([self._plain(e) for e in entries], BulkMode(mode))
+    
+    async def bulk_assign(
+        self,
+        policy_ids: List[str],
+        target_compartments: List[str],
+        target_tags: Dict[str, str]
+    ) -> Dict:
+        """Add compartments and tags to many policies in one transaction"""
+        logger.info(f"Bulk assign to {len(policy_ids)} policies")
+        return self.manager.bulk_assign(policy_ids, target_compartments, target_tags)
     
     async def enforce_policy(self, policy_id: str, compartment_id: str) -> Dict:
         """Enforce retention policy"""
         # TODO: Integrate with policy_manager.py
         logger.info(f"Enforcing policy {policy_id} for compartment {compartment_id}")
         return {"deleted_count": 0}
+    
+    @staticmethod
+    def _plain(data: Dict) -> Dict:
+        """Unwrap API enum members to the plain values the policy store expects"""
+        return {k: getattr(v, "value", v) for k, v in data.items()}
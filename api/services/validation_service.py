@@ -3,23 +3,58 @@ validation_service.py - Backup validation service
 
 Business logic for backup validation and compliance reporting.
 """
+import asyncio
 import logging
+import os
+import tempfile
 import uuid
-from typing import Optional, Dict
+from datetime import datetime
+from typing import AsyncIterator, Optional, Dict
 import sys
-import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'python'))
 
+import metrics
+import tracing
+
 logger = logging.getLogger(__name__)
 
+# Where streamed NDJSON reports are written while validation runs
+DEFAULT_REPORT_DIR = os.environ.get(
+    "OCI_BACKUP_REPORT_DIR",
+    os.path.join(tempfile.gettempdir(), "oci-backup-reports")
+)
+
 
 class ValidationService:
     """Service for backup validation"""
     
-    def __init__(self):
+    def __init__(self, report_dir: str = DEFAULT_REPORT_DIR, snapshot_dir: Optional[str] = None):
+        from report_diff import SnapshotStore, DEFAULT_SNAPSHOT_DIR
+        
         self.reports = {}  # In-memory storage (use database in production)
+        self.report_dir = report_dir
+        self.snapshots = SnapshotStore(snapshot_dir or DEFAULT_SNAPSHOT_DIR)
+        self._validator = None
+        self._tasks = {}
+        self._work = metrics.WorkTracker("validation", min(32, (os.cpu_count() or 1) + 4))
         logger.info("ValidationService initialized")
+        metrics.register_collector("validation_jobs", self._collect_metrics)
+    
+    def _collect_metrics(self):
+        """Scrape-time validation job counts by status"""
+        counts: Dict[str, int] = {}
+        for report in list(self.reports.values()):
+            counts[report["status"]] = counts.get(report["status"], 0) + 1
+        yield (metrics.PREFIX + "validation_jobs", "gauge", "Tracked compartment validation jobs by status",
+               [({"status": status}, n) for status, n in sorted(counts.items())])
+    
+    def _get_validator(self):
+        """Create the OCI-backed validator on first use"""
+        if self._validator is None:
+            from validator import BackupValidator
+            self._validator = BackupValidator()
+        return self._validator
     
     async def validate_backup(self, backup_id: str, backup_type: str) -> Dict:
         """Validate a single backup"""
@@ -38,23 +73,117 @@ class ValidationService:
     async def start_compartment_validation(self, compartment_id: str) -> str:
         """Start validation of all backups in a compartment"""
         job_id = f"validation-{uuid.uuid4().hex[:12]}"
+        os.makedirs(self.report_dir, exist_ok=True)
         
         self.reports[job_id] = {
             "job_id": job_id,
             "compartment_id": compartment_id,
             "status": "running",
-            "progress": 0
+            "progress": 0,
+            "validated": 0,
+            "start_time": datetime.utcnow().isoformat(),
+            "report_file": os.path.join(self.report_dir, f"{job_id}.ndjson")
         }
         
         logger.info(f"Started validation job {job_id} for compartment {compartment_id}")
         
-        # TODO: Run validation in background
-        # - Call validator.py validate_compartment_backups()
-        # - Generate compliance report
-        # - Store results
+        loop = asyncio.get_running_loop()
+        self._tasks[job_id] = loop.run_in_executor(
+            None, tracing.bind(self._work.track(self._run_compartment_validation, job_id, compartment_id))
+        )
         
         return job_id
     
+    @tracing.traced("validation.compartment")
+    def _run_compartment_validation(self, job_id: str, compartment_id: str):
+        """Validate a compartment, streaming NDJSON to the job's report file"""
+        from validator import ComplianceReportBuilder, iter_compliance_report
+        from report_diff import ReportSnapshot
+        
+        job = self.reports[job_id]
+        builder = ComplianceReportBuilder()
+        snapshot = ReportSnapshot(snapshot_id=job_id, compartment_id=compartment_id)
+        span = tracing.current_span()
+        span.set_attribute("validation.job_id", job_id)
+        try:
+            results = snapshot.record(self._get_validator().iter_compartment_backups(compartment_id))
+            with open(job["report_file"], "w") as f:
+                for chunk in iter_compliance_report(results, "ndjson", builder):
+                    f.write(chunk)
+                    f.flush()
+                    job["validated"] = builder.total
+            
+            summary = builder.summary()
+            # The report's COMPLIANT/NON_COMPLIANT verdict must not replace the job status
+            summary["compliance_status"] = summary.pop("status")
+            job.update(summary)
+            self.snapshots.save(snapshot)
+            job["progress"] = 100
+            # Status goes last: readers (and the report cache) treat a
+            # finished status as a final, complete report
+            job["end_time"] = datetime.utcnow().isoformat()
+            job["status"] = "completed"
+            logger.info(f"Validation job {job_id} completed: {builder.total} backups")
+        except Exception as e:
+            logger.error(f"Validation job {job_id} failed: {e}")
+            job["error"] = str(e)
+            job["end_time"] = datetime.utcnow().isoformat()
+            job["status"] = "failed"
+            span.record_exception(e)
+        finally:
+            self._tasks.pop(job_id, None)
+            span.set_attribute("validation.backups", builder.total)
+    
     async def get_report(self, job_id: str) -> Optional[Dict]:
         """Get validation report"""
         return self.reports.get(job_id)
+    
+    async def diff_report(self, job_id: str, baseline_job_id: Optional[str] = None) -> Dict:
+        """
+        Compare a completed validation job with an earlier one.
+        
+        Defaults to the run immediately before ``job_id`` for the same
+        compartment. Raises KeyError if either snapshot does not exist.
+        """
+        from report_diff import diff_snapshots
+        
+        job = self.reports.get(job_id)
+        if job is None or job["status"] != "completed":
+            raise KeyError(f"No completed validation job {job_id}")
+        
+        compartment_id = job["compartment_id"]
+        baseline_job_id = baseline_job_id or self.snapshots.previous(compartment_id, job_id)
+        if baseline_job_id is None:
+            raise KeyError(f"No earlier validation run for compartment {compartment_id}")
+        
+        return diff_snapshots(
+            self.snapshots.load(compartment_id, baseline_job_id),
+            self.snapshots.load(compartment_id, job_id)
+        )
+    
+    async def stream_report(self, job_id: str, poll_interval: float = 0.5) -> AsyncIterator[bytes]:
+        """
+        Stream a job's NDJSON report, following the file while validation runs.
+        
+        Reads in fixed-size blocks so memory stays flat regardless of how
+        many backups the report covers.
+        """
+        job = self.reports[job_id]
+        while not os.path.exists(job["report_file"]):
+            if job["status"] != "running":
+                return
+            await asyncio.sleep(poll_interval)
+        
+        with open(job["report_file"], "rb") as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if chunk:
+                    yield chunk
+                elif job["status"] == "running":
+                    await asyncio.sleep(poll_interval)
+                else:
+                    # Drain anything written between the last read and completion
+                    rest = f.read()
+                    if rest:
+                        yield rest
+                    return
@@ -196,7 +196,7 @@ export default function Dashboard() {
                 >
                   <Box sx={{ flex: 1 }}>
                     <Typography variant="body1" fontWeight="bold">
-                      {job.instance_name}
+                      {job.instance_name || `Restore from ${job.boot_backup_id}`}
                     </Typography>
                     <Typography variant="caption" color="textSecondary">
                       Started: {new Date(job.start_time).toLocaleString()}
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+api_bench.py - Throughput benchmark for the API's large JSON responses
+
+Measures requests per second for the list and report endpoints with a
+large, seeded payload (policies, backups and a validation report with
+--items entries each; backup listings return their largest page).
+Requests are driven through ASGI in-process, so the numbers show the
+API's own work (routing, validation, encoding) without a server or
+network in between. Each mode runs in a fresh interpreter:
+
+  baseline     standard FastAPI path: response_model validation,
+               jsonable_encoder and stdlib json (OCI_BACKUP_FAST_JSON=off)
+  fast         orjson encoding without re-validation, cache disabled
+  fast+cache   fast path serving cached pre-encoded bodies
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from listing_index import MAX_PAGE_SIZE
+from policy_manager import BackupFrequency, BackupPolicy, RetentionClass
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(PYTHON_DIR)
+
+MODES = {
+    "baseline": {"OCI_BACKUP_FAST_JSON": "off"},
+    "fast": {"OCI_BACKUP_FAST_JSON": "on", "OCI_BACKUP_RESPONSE_CACHE_ENTRIES": "0"},
+    "fast+cache": {"OCI_BACKUP_FAST_JSON": "on"},
+}
+REPORT_JOB_ID = "validation-benchmark"
+DEFAULT_PATHS = [
+    "/api/v1/policies",
+    "/api/v1/backup/list?compartment_id=ocid1.compartment.oc1..bench&limit={page_size}",
+    f"/api/v1/validation/report/{REPORT_JOB_ID}",
+]
+
+_PROBE = """
+import asyncio, json, sys, time
+sys.path.insert(0, {root!r})
+from api.main import app, backup_service, validation_service
+
+items, requests, paths = {items}, {requests}, {paths!r}
+
+async def fetch_backups(compartment_id):
+    return [
+        {{"backup_id": f"ocid1.volumebackup.oc1..bench{{i:06d}}", "type": "block_volume",
+          "instance_name": f"bench-{{i % 100:03d}}", "created": "2025-01-06T02:00:00Z",
+          "size_gb": 50 + i % 500, "status": "AVAILABLE"}}
+        for i in range(items)
+    ]
+
+async def get(path):
+    path, _, query = path.partition("?")
+    messages = []
+    async def receive():
+        return {{"type": "http.request", "body": b"", "more_body": False}}
+    async def send(message):
+        messages.append(message)
+    await app({{
+        "type": "http", "asgi": {{"version": "3.0"}}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [], "server": ("bench", 80), "client": ("bench", 1)
+    }}, receive, send)
+    return messages[0]["status"], sum(len(m.get("body", b"")) for m in messages[1:])
+
+async def main():
+    results = {{}}
+    async with app.router.lifespan_context(app):
+        backup_service.get()._fetch_backups = fetch_backups
+        validation_service.get().reports[{job_id!r}] = {{
+            "job_id": {job_id!r}, "compartment_id": "ocid1.compartment.oc1..bench",
+            "status": "completed", "progress": 100, "validated": items,
+            "start_time": "2025-01-06T02:00:00", "end_time": "2025-01-06T02:10:00",
+            "summary": {{"total_backups": items, "passed": 0, "failed": items, "warnings": 0,
+                        "compliance_rate": "0.0%"}},
+            "failed_backups": [
+                {{"backup_id": f"ocid1.volumebackup.oc1..bench{{i:06d}}", "backup_type": "volume",
+                  "errors": ["Backup is older than the retention policy allows"],
+                  "warnings": [], "checks": {{"exists": "passed", "age": "failed"}}}}
+                for i in range(items)
+            ],
+            "recommendations": []
+        }}
+        for path in paths:
+            status, size = await get(path)  # Warm-up; fills the cache in fast+cache mode
+            started = time.perf_counter()
+            for _ in range(requests):
+                await get(path)
+            elapsed = time.perf_counter() - started
+            results[path] = {{"status": status, "bytes": size, "rps": requests / elapsed,
+                             "ms_per_request": elapsed / requests * 1000}}
+    return results
+
+print(json.dumps(asyncio.run(main())))
+"""
+
+
+def write_policy_file(path: str, count: int):
+    """Policy store with ``count`` policies for the API to load"""
+    policies = [
+        BackupPolicy(
+            policy_id=f"bench-{i:06d}",
+            name=f"Benchmark policy {i}",
+            description="Seeded by api_bench.py",
+            frequency=BackupFrequency.DAILY,
+            retention_days=30,
+            retention_class=RetentionClass.STANDARD,
+            target_compartments=[f"ocid1.compartment.oc1..bench{i % 50:03d}"],
+            target_tags={"env": "bench", "tier": str(i % 3)}
+        ).to_dict()
+        for i in range(count)
+    ]
+    with open(path, "w") as f:
+        json.dump({"policies": policies}, f)
+
+
+def bench_mode(mode: str, paths: List[str], items: int, requests: int, policy_file: str) -> Dict[str, dict]:
+    """Requests per second for each path in a fresh interpreter configured for ``mode``"""
+    code = _PROBE.format(root=REPO_ROOT, items=items, requests=requests, paths=paths, job_id=REPORT_JOB_ID)
+    env = {**os.environ, **MODES[mode], "OCI_BACKUP_POLICY_FILE": policy_file, "OCI_BACKUP_TRACING": "off",
+           "OCI_BACKUP_INDEX_DB": os.path.join(os.path.dirname(policy_file), f"listings-{mode}.db")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_results(results: Dict[str, Dict[str, dict]], paths: List[str]):
+    modes = [m for m in MODES if m in results]
+    print(f"\n{'Endpoint':<48}" + "".join(f"{m + ' req/s':>18}" for m in modes) + f"{'speedup':>10}")
+    print("-" * (58 + 18 * len(modes)))
+    for path in paths:
+        rps = [results[m][path]["rps"] for m in modes]
+        speedup = f"{rps[-1] / rps[0]:.1f}x" if len(rps) > 1 and rps[0] else ""
+        print(f"{path.split('?')[0]:<48}" + "".join(f"{r:>18.1f}" for r in rps) + f"{speedup:>10}")
+    sizes = {path: results[modes[-1]][path]["bytes"] for path in paths}
+    print("\nResponse sizes: " + ", ".join(f"{p.split('?')[0]} {b / 1024:.0f} KiB" for p, b in sizes.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput benchmark for large API JSON responses")
+    parser.add_argument("--items", type=int, default=10000, help="Items per seeded list or report")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per endpoint and mode")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated modes ({', '.join(MODES)})")
+    parser.add_argument("--output", help="Save results as JSON")
+    args = parser.parse_args(argv)
+    
+    paths = [p.format(page_size=min(args.items, MAX_PAGE_SIZE)) for p in DEFAULT_PATHS]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="api-bench-") as tmp:
+        policy_file = os.path.join(tmp, "policies.json")
+        write_policy_file(policy_file, args.items)
+        for mode in args.modes.split(","):
+            if mode not in MODES:
+                parser.error(f"Unknown mode {mode}")
+            logging.info("Benchmarking %s (%d items, %d requests per endpoint)", mode, args.items, args.requests)
+            results[mode] = bench_mode(mode, paths, args.items, args.requests, policy_file)
+    print_results(results, paths)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "timestamp": time.time(), "items": args.items,
+                       "results": results}, f, indent=2)
+        logging.info("Saved results to %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
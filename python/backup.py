@@ -5,26 +5,30 @@ backup.py - Backup for OCI VMs using OCI Python SDK
 import argparse
 import logging
 from datetime import datetime
-import oci
+from lazy import oci
+
+import metrics
+import profiling
+import tracing
+from clients import get_client_pool
+from waiter import DEFAULT_POLL_INTERVAL, wait_for_backups
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
-def load_clients(profile=None):
-    try:
-        config = oci.config.from_file(profile_name=profile) if profile else oci.config.from_file()
-        oci.config.validate_config(config)
-        compute = oci.core.ComputeClient(config)
-        block = oci.core.BlockstorageClient(config)
-        logging.info("Using OCI config file authentication")
-        return compute, block
-    except Exception as e:
-        logging.error(f"Failed to load OCI config: {e}")
-        logging.info("Attempting instance principals authentication...")
-        signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-        compute = oci.core.ComputeClient(config={}, signer=signer)
-        block = oci.core.BlockstorageClient(config={}, signer=signer)
-        return compute, block
+BACKUPS_CREATED = metrics.counter("backups_created", "Volume backups requested", ["kind"])
+BACKUP_STAGE_SECONDS = metrics.histogram(
+    "backup_stage_duration_seconds", "Time spent in each stage of an instance backup", ["stage"],
+    buckets=metrics.JOB_BUCKETS
+)
+BACKUP_OUTCOMES = metrics.counter("backup_outcomes", "Waited-for backups by final outcome", ["outcome"])
+
+def load_clients(profile=None, region=None):
+    pool = get_client_pool(profile)
+    compute = pool.get(oci.core.ComputeClient, region)
+    block = pool.get(oci.core.BlockstorageClient, region)
+    return compute, block
 
+@tracing.traced("backup.boot_volume")
 def backup_boot_volume(block, compute, compartment_id, instance_id, prefix="oci-backup"):
     # Get boot volume attachments to find boot volume ID
     boot_vol_atts = compute.list_boot_volume_attachments(
@@ -43,9 +47,11 @@ def backup_boot_volume(block, compute, compartment_id, instance_id, prefix="oci-
         display_name=f"{prefix}-boot-{ts}"
     )
     resp = block.create_boot_volume_backup(details)
+    BACKUPS_CREATED.labels("boot").inc()
     logging.info("Created boot volume backup %s", resp.data.id)
     return resp.data
 
+@tracing.traced("backup.block_volumes")
 def backup_block_volumes(block, compute, compartment_id, instance_id, prefix="oci-backup"):
     atts = compute.list_volume_attachments(
         compartment_id=compartment_id,
@@ -59,26 +65,51 @@ def backup_block_volumes(block, compute, compartment_id, instance_id, prefix="oc
                 volume_id=att.volume_id,
                 display_name=f"{prefix}-vol-{ts}"
             )
-            resp = block.create_volume_backup(details)
+            with tracing.span("backup.create_volume_backup", attributes={"oci.volume_id": att.volume_id}):
+                resp = block.create_volume_backup(details)
+            BACKUPS_CREATED.labels("block").inc()
             backups.append(resp.data)
             logging.info("Created block volume backup %s", resp.data.id)
     return backups
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("--compartment", "-c", required=True)
     parser.add_argument("--instance", "-i", required=True)
     parser.add_argument("--profile", "-p")
-    args = parser.parse_args()
+    parser.add_argument("--region", "-r", help="Region to operate in (default: config region)")
+    parser.add_argument("--wait", action="store_true", help="Wait until all backups are AVAILABLE")
+    parser.add_argument("--wait-timeout", type=float, default=None, help="Seconds to wait before giving up")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    metrics.add_metrics_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics.write_on_exit(args.metrics_file)
+    profiling.profile_until_exit(args.profile_out)
 
-    compute, block = load_clients(args.profile)
+    compute, block = load_clients(args.profile, args.region)
     instance = compute.get_instance(args.instance).data
-    boot_backup = backup_boot_volume(block, compute, args.compartment, args.instance)
-    vol_backups = backup_block_volumes(block, compute, args.compartment, args.instance)
+    with BACKUP_STAGE_SECONDS.labels("boot_volume").time():
+        boot_backup = backup_boot_volume(block, compute, args.compartment, args.instance)
+    with BACKUP_STAGE_SECONDS.labels("block_volumes").time():
+        vol_backups = backup_block_volumes(block, compute, args.compartment, args.instance)
 
     logging.info("Boot backup: %s", boot_backup.id)
     for vb in vol_backups:
         logging.info("Volume backup: %s", vb.id)
 
+    if args.wait:
+        pending = [(boot_backup, "boot_volume_backup")] + [(vb, "volume_backup") for vb in vol_backups]
+        with BACKUP_STAGE_SECONDS.labels("wait_available").time():
+            outcomes = wait_for_backups(block, pending, args.wait_timeout, args.poll_interval)
+        failed = [o for o in outcomes if isinstance(o, Exception)]
+        BACKUP_OUTCOMES.labels("available").inc(len(outcomes) - len(failed))
+        BACKUP_OUTCOMES.labels("failed").inc(len(failed))
+        for error in failed:
+            logging.error("Backup did not become available: %s", error)
+        if failed:
+            raise SystemExit(1)
+        logging.info("All %d backups AVAILABLE", len(outcomes))
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+catalog.py - File-level catalog of backed-up filesystems
+
+Walks the filesystem of an exported image (a mounted image or any
+directory tree) and records path, size, mtime and SHA-256 of every regular
+file per backup, so single files can be found and restored without
+restoring whole VMs. The index is a SQLite database:
+
+- paths are stored once and searched by prefix on their B-tree index
+- file versions are intervals of backups in a series (one volume or
+  instance); a backup only adds rows for files that changed, and extends
+  the interval of every file that did not
+- files whose size and mtime match the previous backup reuse its hash
+  instead of being read again
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_CATALOG_DB = os.environ.get(
+    "OCI_BACKUP_CATALOG_DB",
+    os.path.expanduser("~/.oci-backup/catalog.db")
+)
+DEFAULT_HASH_WORKERS = 8
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Upper bound for prefix range scans: sorts after any path with the prefix
+_PREFIX_END = "\U0010ffff"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS backups (
+    seq INTEGER PRIMARY KEY,
+    backup_id TEXT UNIQUE NOT NULL,
+    series_id INTEGER NOT NULL REFERENCES series(id),
+    created_at TEXT NOT NULL,
+    files INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    new_versions INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS backups_series ON backups(series_id, seq);
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    path_id INTEGER NOT NULL,
+    series_id INTEGER NOT NULL,
+    first_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 BLOB NOT NULL,
+    PRIMARY KEY (path_id, series_id, first_seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS versions_open ON versions(series_id, last_seq);
+"""
+
+
+def walk_files(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Regular files under ``root`` as ("/relative/path", stat).
+    
+    Does not follow symlinks or cross into other mounted filesystems.
+    """
+    root_dev = os.lstat(root).st_dev
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            logging.warning("Skipping %s: %s", directory, e)
+            continue
+        for entry in entries:
+            try:
+                info = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if info.st_dev == root_dev:
+                    stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield "/" + os.path.relpath(entry.path, root).replace(os.sep, "/"), info
+
+
+def hash_file(path: str) -> Optional[bytes]:
+    """SHA-256 of a file, or None if it vanished or cannot be read"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError as e:
+        logging.warning("Cannot hash %s: %s", path, e)
+        return None
+    return digest.digest()
+
+
+@contextmanager
+def mounted_image(image: str, offset: int = 0):
+    """
+    Mount a raw filesystem image read-only and yield its mount point.
+    
+    ``offset`` is the byte offset of the filesystem (partition start) in
+    the image. Needs root and a loop device.
+    """
+    mount_point = tempfile.mkdtemp(prefix="oci-backup-catalog-")
+    options = f"ro,loop,offset={offset}"
+    try:
+        subprocess.run(["mount", "-o", options, image, mount_point], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        os.rmdir(mount_point)
+        detail = e.stderr.decode().strip() if isinstance(e, subprocess.CalledProcessError) else e
+        raise RuntimeError(f"Cannot mount {image} (offset {offset}): {detail}")
+    try:
+        yield mount_point
+    finally:
+        subprocess.run(["umount", mount_point], check=False)
+        os.rmdir(mount_point)
+
+
+class FileCatalog:
+    """SQLite-backed file index across backups; safe to share between threads"""
+    
+    def __init__(self, db_path: str = DEFAULT_CATALOG_DB):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+    
+    def close(self):
+        self._db.close()
+    
+    def _series_id(self, name: str) -> int:
+        self._db.execute("INSERT OR IGNORE INTO series(name) VALUES (?)", (name,))
+        return self._db.execute("SELECT id FROM series WHERE name = ?", (name,)).fetchone()[0]
+    
+    def add_backup(
+        self,
+        backup_id: str,
+        root: str,
+        series: str,
+        created_at: Optional[str] = None,
+        hash_workers: int = DEFAULT_HASH_WORKERS,
+        rehash: bool = False
+    ) -> dict:
+        """
+        Catalog the filesystem at ``root`` as the newest backup of ``series``.
+        
+        Backups of a series must be added oldest first. Unless ``rehash`` is
+        set, files with the same size and mtime as in the previous backup
+        keep its hash without being read.
+        """
+        started = time.monotonic()
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM backups WHERE backup_id = ?", (backup_id,)).fetchone():
+                raise ValueError(f"Backup {backup_id} is already cataloged")
+            series_id = self._series_id(series)
+            row = self._db.execute("SELECT MAX(seq) FROM backups WHERE series_id = ?", (series_id,)).fetchone()
+            previous_seq = row[0]
+            previous: Dict[str, Tuple[int, int, bytes]] = {}
+            if previous_seq is not None:
+                previous = {
+                    path: (size, mtime_ns, sha256)
+                    for path, size, mtime_ns, sha256 in self._db.execute(
+                        "SELECT p.path, v.size, v.mtime_ns, v.sha256 FROM versions v JOIN paths p ON p.id = v.path_id "
+                        "WHERE v.series_id = ? AND v.last_seq = ?", (series_id, previous_seq))
+                }
+        
+        files: List[Tuple[str, int, int, Optional[bytes]]] = []
+        to_hash = []
+        for path, info in walk_files(root):
+            known = previous.get(path)
+            if not rehash and known and known[:2] == (info.st_size, info.st_mtime_ns):
+                files.append((path, info.st_size, info.st_mtime_ns, known[2]))
+            else:
+                to_hash.append(len(files))
+                files.append((path, info.st_size, info.st_mtime_ns, None))
+        with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+            digests = pool.map(lambda index: hash_file(os.path.join(root, files[index][0].lstrip("/"))), to_hash)
+            for index, digest in zip(to_hash, digests):
+                files[index] = files[index][:3] + (digest,)
+        files = [f for f in files if f[3] is not None]
+        
+        with self._lock, self._db:
+            seq = self._db.execute(
+                "INSERT INTO backups(backup_id, series_id, created_at) VALUES (?, ?, ?)",
+                (backup_id, series_id, created_at or datetime.utcnow().isoformat())
+            ).lastrowid
+            self._db.execute("CREATE TEMP TABLE current (path TEXT PRIMARY KEY, size INTEGER, "
+                             "mtime_ns INTEGER, sha256 BLOB) WITHOUT ROWID")
+            try:
+                self._db.executemany("INSERT INTO current VALUES (?, ?, ?, ?)", files)
+                self._db.execute("INSERT OR IGNORE INTO paths(path) SELECT path FROM current")
+                # Same content as in the previous backup: extend the version
+                extended = self._db.execute(
+                    "UPDATE versions SET last_seq = :seq, mtime_ns = c.mtime_ns "
+                    "FROM current c JOIN paths p ON p.path = c.path "
+                    "WHERE versions.path_id = p.id AND versions.series_id = :series AND versions.last_seq = :previous "
+                    "AND versions.size = c.size AND versions.sha256 = c.sha256",
+                    {"seq": seq, "series": series_id, "previous": previous_seq}
+                ).rowcount if previous_seq is not None else 0
+                added = self._db.execute(
+                    "INSERT INTO versions SELECT p.id, :series, :seq, :seq, c.size, c.mtime_ns, c.sha256 "
+                    "FROM current c JOIN paths p ON p.path = c.path "
+                    "WHERE NOT EXISTS (SELECT 1 FROM versions v WHERE v.path_id = p.id "
+                    "AND v.series_id = :series AND v.last_seq = :seq)",
+                    {"seq": seq, "series": series_id}
+                ).rowcount
+            finally:
+                self._db.execute("DROP TABLE temp.current")
+            total_bytes = sum(f[1] for f in files)
+            self._db.execute("UPDATE backups SET files = ?, bytes = ?, new_versions = ? WHERE seq = ?",
+                             (len(files), total_bytes, added, seq))
+        
+        elapsed = time.monotonic() - started
+        stats = {
+            "backup_id": backup_id,
+            "series": series,
+            "files": len(files),
+            "bytes": total_bytes,
+            "unchanged_files": extended,
+            "new_versions": added,
+            "removed_files": len(previous) - sum(1 for f in files if f[0] in previous),
+            "files_hashed": len(to_hash),
+            "duration_seconds": round(elapsed, 3)
+        }
+        logging.info("Cataloged %s (%s): %d files, %d new versions, %d hashed in %.1fs",
+                     backup_id, series, len(files), added, len(to_hash), elapsed)
+        return stats
+    
+    def _query(self, sql: str, params=()) -> List[dict]:
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _version(row: dict) -> dict:
+        row["sha256"] = row["sha256"].hex()
+        row["mtime"] = datetime.utcfromtimestamp(row.pop("mtime_ns") / 1e9).isoformat()
+        return row
+    
+    def search(self, prefix: str, limit: int = 100) -> List[dict]:
+        """Paths starting with ``prefix``, with their newest cataloged version"""
+        rows = self._query(
+            "SELECT p.path, v.size, v.mtime_ns, v.sha256, b.backup_id AS last_backup, s.name AS series, "
+            "(SELECT COUNT(*) FROM versions v2 WHERE v2.path_id = p.id) AS versions "
+            "FROM (SELECT id, path FROM paths WHERE path >= ? AND path < ? ORDER BY path LIMIT ?) p "
+            "JOIN versions v ON v.path_id = p.id AND v.last_seq = "
+            "(SELECT MAX(last_seq) FROM versions WHERE path_id = p.id) "
+            "JOIN backups b ON b.seq = v.last_seq JOIN series s ON s.id = v.series_id ORDER BY p.path",
+            (prefix, prefix + _PREFIX_END, limit)
+        )
+        return [self._version(row) for row in rows]
+    
+    def history(self, path: str) -> List[dict]:
+        """
+        Every version of one path, oldest first.
+        
+        Each version names the backup it first appeared in (``changed_in``),
+        the last backup that still had it, and every backup containing it.
+        """
+        rows = self._query(
+            "SELECT s.name AS series, v.series_id, v.first_seq, v.last_seq, v.size, v.mtime_ns, v.sha256, "
+            "fb.backup_id AS changed_in, lb.backup_id AS last_seen_in "
+            "FROM versions v JOIN paths p ON p.id = v.path_id JOIN series s ON s.id = v.series_id "
+            "JOIN backups fb ON fb.seq = v.first_seq JOIN backups lb ON lb.seq = v.last_seq "
+            "WHERE p.path = ? ORDER BY v.first_seq",
+            (path,)
+        )
+        for row in rows:
+            row["backups"] = [r["backup_id"] for r in self._query(
+                "SELECT backup_id FROM backups WHERE series_id = ? AND seq BETWEEN ? AND ? ORDER BY seq",
+                (row.pop("series_id"), row.pop("first_seq"), row.pop("last_seq"))
+            )]
+            self._version(row)
+        return rows
+    
+    def backups_containing(self, path: str) -> List[str]:
+        """Backups that contain ``path``, oldest first"""
+        return [backup for version in self.history(path) for backup in version["backups"]]
+    
+    def list_files(self, backup_id: str, prefix: str = "/", limit: int = 1000) -> List[dict]:
+        """Files under ``prefix`` as they were in one backup"""
+        backup = self._query("SELECT seq, series_id FROM backups WHERE backup_id = ?", (backup_id,))
+        if not backup:
+            raise KeyError(f"Backup {backup_id} not found in catalog")
+        rows = self._query(
+            "SELECT p.path, v.size, v.mtime_ns, v.sha256 FROM paths p JOIN versions v ON v.path_id = p.id "
+            "WHERE p.path >= ? AND p.path < ? AND v.series_id = ? AND ? BETWEEN v.first_seq AND v.last_seq "
+            "ORDER BY p.path LIMIT ?",
+            (prefix, prefix + _PREFIX_END, backup[0]["series_id"], backup[0]["seq"], limit)
+        )
+        return [self._version(row) for row in rows]
+    
+    def list_backups(self, series: Optional[str] = None) -> List[dict]:
+        sql = ("SELECT b.backup_id, s.name AS series, b.created_at, b.files, b.bytes, b.new_versions "
+               "FROM backups b JOIN series s ON s.id = b.series_id")
+        if series:
+            return self._query(sql + " WHERE s.name = ? ORDER BY b.seq", (series,))
+        return self._query(sql + " ORDER BY b.seq")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="File-level catalog of backed-up filesystems")
+    parser.add_argument("action", choices=["index", "search", "history", "ls", "backups"],
+                        help="Action to perform")
+    parser.add_argument("--db", default=DEFAULT_CATALOG_DB, help="Catalog database")
+    parser.add_argument("--backup-id", "-b", help="Backup to index or list")
+    parser.add_argument("--series", "-s", help="Volume or instance the backup belongs to (index)")
+    parser.add_argument("--root", help="Mounted filesystem or directory to index")
+    parser.add_argument("--image", "-i", help="Raw filesystem image to mount read-only and index (needs root)")
+    parser.add_argument("--offset", type=int, default=0, help="Filesystem byte offset within --image")
+    parser.add_argument("--created-at", help="Backup time (ISO 8601, default: now)")
+    parser.add_argument("--hash-workers", type=int, default=DEFAULT_HASH_WORKERS)
+    parser.add_argument("--rehash", action="store_true", help="Hash every file, even if size and mtime match")
+    parser.add_argument("--path", help="Path or path prefix to look up")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+    
+    catalog = FileCatalog(args.db)
+    if args.action == "index":
+        if not args.backup_id or not args.series or not (args.root or args.image):
+            parser.error("index requires --backup-id, --series and --root or --image")
+        if args.image:
+            with mounted_image(args.image, args.offset) as root:
+                result = catalog.add_backup(args.backup_id, root, args.series, args.created_at,
+                                            args.hash_workers, args.rehash)
+        else:
+            result = catalog.add_backup(args.backup_id, args.root, args.series, args.created_at,
+                                        args.hash_workers, args.rehash)
+    elif args.action == "search":
+        result = catalog.search(args.path or "/", args.limit)
+    elif args.action == "history":
+        if not args.path:
+            parser.error("history requires --path")
+        result = catalog.history(args.path)
+    elif args.action == "ls":
+        if not args.backup_id:
+            parser.error("ls requires --backup-id")
+        result = catalog.list_files(args.backup_id, args.path or "/", args.limit)
+    else:
+        result = catalog.list_backups(args.series)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
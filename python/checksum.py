@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+checksum.py - Parallel block-hash manifests for exported backup images
+
+Hashes an image (file or block device) in fixed-size blocks through
+memory-mapped reads spread across a thread pool, producing a compact
+block-hash manifest that can later verify a restore or export block by
+block. hashlib releases the GIL on large buffers, so hashing scales with
+cores instead of running at single-threaded hashlib speed.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_ALGORITHM = "sha256"
+DEFAULT_MAX_WORKERS = os.cpu_count() or 4
+
+# Blocks hashed per task; one mmap window covers a whole task
+BLOCKS_PER_TASK = 8
+
+MANIFEST_MAGIC = b"OCIBHM1\n"
+
+
+def image_size(path: str) -> int:
+    """Size of a file or block device in bytes"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class BlockManifest:
+    """Per-block digests of an image, stored as one packed byte string"""
+    image_size: int
+    block_size: int = DEFAULT_BLOCK_SIZE
+    algorithm: str = DEFAULT_ALGORITHM
+    digests: bytes = b""
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    
+    @property
+    def digest_size(self) -> int:
+        return hashlib.new(self.algorithm).digest_size
+    
+    @property
+    def block_count(self) -> int:
+        return -(-self.image_size // self.block_size)
+    
+    def block_digest(self, index: int) -> bytes:
+        """Digest of block ``index``"""
+        size = self.digest_size
+        return self.digests[index * size:(index + 1) * size]
+    
+    def root_digest(self) -> str:
+        """Single hex digest identifying the whole image"""
+        return hashlib.new(self.algorithm, self.digests).hexdigest()
+    
+    def changed_blocks(self, other: 'BlockManifest') -> List[int]:
+        """
+        Indices of blocks that differ from ``other``.
+        
+        Blocks beyond the end of the shorter image count as changed.
+        """
+        if (self.block_size, self.algorithm) != (other.block_size, other.algorithm):
+            raise ValueError("Manifests use different block sizes or algorithms")
+        size = self.digest_size
+        return [
+            index for index in range(max(self.block_count, other.block_count))
+            if self.digests[index * size:(index + 1) * size] != other.digests[index * size:(index + 1) * size]
+        ]
+    
+    def header(self) -> dict:
+        """Manifest metadata without the digests"""
+        return {
+            "image_size": self.image_size,
+            "block_size": self.block_size,
+            "algorithm": self.algorithm,
+            "block_count": self.block_count,
+            "root_digest": self.root_digest(),
+            "created_at": self.created_at
+        }
+    
+    def to_bytes(self) -> bytes:
+        """Serialize as magic line, JSON header line, then raw digests"""
+        return MANIFEST_MAGIC + json.dumps(self.header()).encode() + b"\n" + self.digests
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BlockManifest':
+        """Parse a serialized manifest, checking its root digest"""
+        if not data.startswith(MANIFEST_MAGIC):
+            raise ValueError("Not a block-hash manifest")
+        header_end = data.index(b"\n", len(MANIFEST_MAGIC))
+        header = json.loads(data[len(MANIFEST_MAGIC):header_end])
+        manifest = cls(
+            image_size=header["image_size"],
+            block_size=header["block_size"],
+            algorithm=header["algorithm"],
+            digests=data[header_end + 1:],
+            created_at=header["created_at"]
+        )
+        if manifest.root_digest() != header["root_digest"]:
+            raise ValueError("Manifest digests do not match its root digest")
+        return manifest
+    
+    def save(self, path: str):
+        """Write the manifest atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'BlockManifest':
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def _hash_span(fd: int, start: int, length: int, block_size: int, algorithm: str) -> bytes:
+    """Hash the blocks in [start, start + length) through one mmap window"""
+    with mmap.mmap(fd, length, access=mmap.ACCESS_READ, offset=start) as window:
+        view = memoryview(window)
+        try:
+            return b"".join(
+                hashlib.new(algorithm, view[offset:offset + block_size]).digest()
+                for offset in range(0, length, block_size)
+            )
+        finally:
+            view.release()
+
+
+def compute_manifest(
+    path: str,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    algorithm: str = DEFAULT_ALGORITHM,
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> BlockManifest:
+    """Hash every block of an image in parallel and return its manifest"""
+    if block_size <= 0 or block_size % mmap.ALLOCATIONGRANULARITY:
+        raise ValueError(f"block_size must be a positive multiple of {mmap.ALLOCATIONGRANULARITY}")
+    hashlib.new(algorithm)  # Fail fast on unknown algorithms
+    
+    size = image_size(path)
+    span = block_size * BLOCKS_PER_TASK
+    started = time.monotonic()
+    
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_hash_span, fd, start, min(span, size - start), block_size, algorithm)
+                for start in range(0, size, span)
+            ]
+            digests = b"".join(future.result() for future in futures)
+    finally:
+        os.close(fd)
+    
+    elapsed = time.monotonic() - started
+    logging.info("Hashed %s (%.1f GiB) in %.1fs (%.0f MiB/s)", path, size / 2 ** 30, elapsed,
+                 size / 2 ** 20 / elapsed if elapsed else 0)
+    return BlockManifest(image_size=size, block_size=block_size, algorithm=algorithm, digests=digests)
+
+
+def verify_image(path: str, manifest: BlockManifest, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Verify an image (a restore target or export source) against a manifest.
+    
+    Returns ``ok``, the mismatched block indices and the verify throughput.
+    """
+    started = time.monotonic()
+    actual = compute_manifest(path, manifest.block_size, manifest.algorithm, max_workers)
+    elapsed = time.monotonic() - started
+    mismatched = actual.changed_blocks(manifest)
+    return {
+        "ok": not mismatched and actual.image_size == manifest.image_size,
+        "image_size": actual.image_size,
+        "expected_size": manifest.image_size,
+        "blocks": manifest.block_count,
+        "mismatched_blocks": mismatched,
+        "root_digest": actual.root_digest(),
+        "duration_seconds": round(elapsed, 3),
+        "throughput_mib_s": round(actual.image_size / 2 ** 20 / elapsed, 1) if elapsed else None
+    }
+
+
+def integrity_check(path: str, manifest_path: str, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """INTEGRITY_CHECKSUM entry for ValidationResult.checks"""
+    try:
+        manifest = BlockManifest.load(manifest_path)
+        result = verify_image(path, manifest, max_workers)
+    except (OSError, ValueError) as e:
+        return {"status": "failed", "message": f"Integrity check could not run: {e}", "details": {}}
+    
+    mismatched = result["mismatched_blocks"]
+    details = {**result, "mismatched_blocks": mismatched[:100], "mismatched_count": len(mismatched)}
+    if result["ok"]:
+        return {"status": "passed", "message": f"All {manifest.block_count} blocks match manifest",
+                "details": details}
+    return {"status": "failed",
+            "message": f"{len(mismatched)} of {manifest.block_count} blocks differ from manifest",
+            "details": details}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Block-hash manifests for backup images")
+    parser.add_argument("action", choices=["create", "verify"], help="Action to perform")
+    parser.add_argument("--image", "-i", required=True, help="Image file or block device")
+    parser.add_argument("--manifest", "-m", required=True, help="Manifest file")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--algorithm", default=DEFAULT_ALGORITHM)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    args = parser.parse_args(argv)
+    
+    if args.action == "create":
+        manifest = compute_manifest(args.image, args.block_size, args.algorithm, args.max_workers)
+        manifest.save(args.manifest)
+        logging.info("Wrote manifest %s: %d blocks, root %s",
+                     args.manifest, manifest.block_count, manifest.root_digest())
+    else:
+        result = verify_image(args.image, BlockManifest.load(args.manifest), args.max_workers)
+        if result["ok"]:
+            logging.info("Image matches manifest (%d blocks)", result["blocks"])
+        else:
+            logging.error("Image differs from manifest: %d mismatched blocks, size %d (expected %d)",
+                          len(result["mismatched_blocks"]), result["image_size"], result["expected_size"])
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
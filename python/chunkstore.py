@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+chunkstore.py - Content-defined chunking deduplication store for images
+
+Splits exported images into variable-size chunks with a gear rolling hash
+(FastCDC normalized cut points bounded by min/max sizes), addresses each chunk
+by its SHA-256 and stores only chunks the store has not seen before, plus
+a per-backup recipe listing the chunks in order. Consecutive exports of
+the same volume then cost roughly their changed data.
+
+Chunking and hashing run across processes, one image segment each; numpy
+is used to vectorize the rolling hash when it is installed.
+"""
+import argparse
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from checksum import image_size
+from export import add_store_arguments, open_store, read_range
+from objectstore import ObjectStore
+from restore_reader import Extent, RestorePlan, RestoreReader, add_restore_arguments, reader_from_args
+
+try:
+    import numpy
+except ImportError:  # Pure-Python rolling hash fallback
+    numpy = None
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_PREFIX = "dedupe/"
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_WORKERS = os.cpu_count() or 4
+
+# Gear table: one fixed pseudo-random 32-bit value per byte value. Must
+# never change, or existing chunks stop deduplicating against new exports.
+_gear_rng = random.Random(0x47454152)
+GEAR = tuple(_gear_rng.getrandbits(32) for _ in range(256))
+WINDOW = 32  # With a 32-bit shift-left hash, only the last 32 bytes matter
+_MASK32 = 0xFFFFFFFF
+NORMALIZATION = 2  # FastCDC normalization level: mask bits added below, removed above the average
+
+
+@dataclass(frozen=True)
+class ChunkingParams:
+    """
+    Chunk size bounds; the cut masks are derived from the average size.
+    
+    As in FastCDC's normalized chunking, a cut before ``avg_size`` must
+    match the stricter ``mask_small`` and a cut after it the looser
+    ``mask_large``, which pulls chunk sizes in towards the average.
+    """
+    min_size: int = 256 * 1024
+    avg_size: int = 1024 * 1024
+    max_size: int = 4 * 1024 * 1024
+    
+    @property
+    def _bits(self) -> int:
+        return max(1, self.avg_size.bit_length() - 1)
+    
+    @staticmethod
+    def _high_bits(bits: int) -> int:
+        bits = min(32, max(1, bits))
+        return ((1 << bits) - 1) << (32 - bits)
+    
+    @property
+    def mask_small(self) -> int:
+        """Mask for cuts between min_size and avg_size (cuts 2**NORMALIZATION times rarer)"""
+        return self._high_bits(self._bits + NORMALIZATION)
+    
+    @property
+    def mask_large(self) -> int:
+        """Mask for cuts between avg_size and max_size (cuts 2**NORMALIZATION times more often)"""
+        return self._high_bits(self._bits - NORMALIZATION)
+
+
+def _cut_points_python(data: bytes, params: ChunkingParams) -> List[int]:
+    """Chunk end offsets using the rolling hash in pure Python"""
+    gear, n = GEAR, len(data)
+    mask_small, mask_large = params.mask_small, params.mask_large
+    cuts, start = [], 0
+    while start < n:
+        limit = min(start + params.max_size, n)
+        first = start + params.min_size
+        normal = start + params.avg_size
+        cut = limit
+        if first < limit:
+            # Prime the hash with the window ending just before ``first``
+            h = 0
+            for b in data[max(0, first - WINDOW):first]:
+                h = ((h << 1) + gear[b]) & _MASK32
+            for j in range(first, limit):
+                h = ((h << 1) + gear[data[j]]) & _MASK32
+                if not h & (mask_small if j < normal else mask_large):
+                    cut = j + 1
+                    break
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def _cut_points_numpy(data: bytes, params: ChunkingParams, block: int = 16 * 1024 * 1024) -> List[int]:
+    """Chunk end offsets with the rolling hash vectorized over all positions"""
+    gear = numpy.array(GEAR, dtype=numpy.uint32)
+    mask_small, mask_large = numpy.uint32(params.mask_small), numpy.uint32(params.mask_large)
+    # mask_large's bits are a subset of mask_small's, so strict candidates
+    # are also loose ones
+    strict, loose = [], []
+    for base in range(0, len(data), block):
+        lead = min(base, WINDOW - 1)
+        values = gear[numpy.frombuffer(data, dtype=numpy.uint8, count=min(block, len(data) - base) + lead,
+                                       offset=base - lead)]
+        # Window doubling: h_2w[i] = h_w[i] + (h_w[i - w] << w), 5 passes for 32 bytes
+        h = values
+        width = 1
+        while width < WINDOW:
+            h[width:] += h[:-width] << numpy.uint32(width)
+            width *= 2
+        h = h[lead:]
+        hits = numpy.flatnonzero((h & mask_large) == 0)
+        loose.extend((hits + base).tolist())
+        strict.extend((hits[(h[hits] & mask_small) == 0] + base).tolist())
+    
+    n, cuts, start = len(data), [], 0
+    while start < n:
+        limit = min(start + params.max_size, n)
+        normal = min(start + params.avg_size, limit)
+        cut = limit
+        index = bisect.bisect_left(strict, start + params.min_size)
+        if index < len(strict) and strict[index] < normal:
+            cut = strict[index] + 1
+        else:
+            index = bisect.bisect_left(loose, max(start + params.min_size, normal))
+            if index < len(loose) and loose[index] < limit:
+                cut = loose[index] + 1
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def cut_points(data: bytes, params: ChunkingParams = ChunkingParams()) -> List[int]:
+    """Content-defined chunk end offsets for ``data`` (both paths agree exactly)"""
+    if numpy is not None:
+        return _cut_points_numpy(data, params)
+    return _cut_points_python(data, params)
+
+
+def _chunk_segment(path: str, offset: int, length: int, params: ChunkingParams) -> List[Tuple[int, int, str]]:
+    """Chunk and hash one image segment (runs in a worker process)"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        data = read_range(fd, offset, length)
+    finally:
+        os.close(fd)
+    chunks, start = [], 0
+    for end in cut_points(data, params):
+        chunks.append((offset + start, end - start, hashlib.sha256(data[start:end]).hexdigest()))
+        start = end
+    return chunks
+
+
+class ChunkStore:
+    """Deduplicating chunk store on top of an object store"""
+    
+    def __init__(self, store: ObjectStore, params: ChunkingParams = ChunkingParams(), prefix: str = DEFAULT_PREFIX):
+        self.store = store
+        self.params = params
+        self.prefix = prefix
+        self._known: Optional[Set[str]] = None
+        self._lock = threading.Lock()
+    
+    def chunk_name(self, digest: str) -> str:
+        return f"{self.prefix}chunks/{digest[:2]}/{digest}"
+    
+    def recipe_name(self, backup_id: str) -> str:
+        return f"{self.prefix}recipes/{backup_id}.json.gz"
+    
+    def known_chunks(self) -> Set[str]:
+        """Digests already in the store (listed once, then tracked locally)"""
+        with self._lock:
+            if self._known is None:
+                names = self.store.list_objects(f"{self.prefix}chunks/")
+                self._known = {name.rsplit("/", 1)[1] for name in names}
+            return self._known
+    
+    def _claim(self, digest: str) -> bool:
+        """True if the caller should upload this chunk (first sighting)"""
+        known = self.known_chunks()
+        with self._lock:
+            if digest in known:
+                return False
+            known.add(digest)
+            return True
+    
+    def put_image(
+        self,
+        path: str,
+        backup_id: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        upload_workers: int = 8,
+        segment_size: int = DEFAULT_SEGMENT_SIZE
+    ) -> dict:
+        """
+        Store an image and its recipe, uploading only chunks not seen before.
+        
+        Segments are chunked and hashed in parallel processes. Chunk cuts are
+        forced at segment boundaries, which costs at most one extra chunk per
+        segment in dedupe efficiency.
+        """
+        size = image_size(path)
+        segments = [(offset, min(segment_size, size - offset)) for offset in range(0, size, segment_size)]
+        recipe: List[Tuple[str, int]] = []
+        counters = {"new_chunks": 0, "new_bytes": 0}
+        counter_lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(upload_workers * 2)
+        fd = os.open(path, os.O_RDONLY)
+        
+        def upload(offset: int, length: int, digest: str):
+            try:
+                self.store.put_object(self.chunk_name(digest), read_range(fd, offset, length))
+                with counter_lock:
+                    counters["new_chunks"] += 1
+                    counters["new_bytes"] += length
+            except Exception:
+                # Let a later export upload it instead of referencing a missing chunk
+                with self._lock:
+                    self._known.discard(digest)
+                raise
+            finally:
+                in_flight.release()
+        
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=upload_workers) as uploads:
+                pending = []
+                for chunks in self._chunk_segments(path, segments, max_workers):
+                    for offset, length, digest in chunks:
+                        recipe.append((digest, length))
+                        if self._claim(digest):
+                            # Bounded queue keeps memory at a few chunks per upload worker
+                            in_flight.acquire()
+                            pending.append(uploads.submit(upload, offset, length, digest))
+                for future in pending:
+                    future.result()
+        finally:
+            os.close(fd)
+        elapsed = time.monotonic() - started
+        
+        stats = {
+            "logical_bytes": size,
+            "chunks": len(recipe),
+            "new_chunks": counters["new_chunks"],
+            "new_bytes": counters["new_bytes"],
+            "dedupe_ratio": round(size / counters["new_bytes"], 2) if counters["new_bytes"] else None,
+            "duration_seconds": round(elapsed, 3),
+            "throughput_mib_s": round(size / 2 ** 20 / elapsed, 1) if elapsed else None
+        }
+        self.put_recipe(backup_id, {
+            "backup_id": backup_id,
+            "source": path,
+            "image_size": size,
+            "created_at": datetime.utcnow().isoformat(),
+            "params": asdict(self.params),
+            "chunks": recipe,
+            "stats": stats
+        })
+        logging.info("Stored %s as %s: %d chunks, %d new (%.1f MiB), dedupe ratio %s",
+                     path, backup_id, len(recipe), counters["new_chunks"],
+                     counters["new_bytes"] / 2 ** 20, stats["dedupe_ratio"] or "all duplicate")
+        return stats
+    
+    def _chunk_segments(self, path: str, segments: List[Tuple[int, int]], max_workers: int):
+        """Yield each segment's chunks in image order"""
+        if max_workers <= 1 or len(segments) <= 1:
+            for offset, length in segments:
+                yield _chunk_segment(path, offset, length, self.params)
+            return
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_chunk_segment, path, offset, length, self.params)
+                       for offset, length in segments]
+            for future in futures:
+                yield future.result()
+    
+    def put_recipe(self, backup_id: str, recipe: dict):
+        self.store.put_object(self.recipe_name(backup_id), gzip.compress(json.dumps(recipe).encode()))
+    
+    def get_recipe(self, backup_id: str) -> dict:
+        return json.loads(gzip.decompress(self.store.get_object(self.recipe_name(backup_id))))
+    
+    def list_backups(self) -> List[str]:
+        names = self.store.list_objects(f"{self.prefix}recipes/")
+        return [name.rsplit("/", 1)[1][:-len(".json.gz")] for name in names]
+    
+    def restore_plan(self, backup_id: str) -> RestorePlan:
+        """Restore plan for one backup: its chunks in image order"""
+        recipe = self.get_recipe(backup_id)
+        extents, offset = [], 0
+        for digest, length in recipe["chunks"]:
+            extents.append(Extent(offset, length, digest, self.chunk_name(digest)))
+            offset += length
+        return RestorePlan(f"dedupe:{backup_id}@{recipe['created_at']}", recipe["image_size"], extents)
+    
+    def restore_image(self, backup_id: str, target: str, reader: Optional[RestoreReader] = None,
+                      state_path: Optional[str] = None) -> dict:
+        """Rebuild an image from its recipe, verifying every chunk; see RestoreReader"""
+        return (reader or RestoreReader(self.store)).restore(self.restore_plan(backup_id), target, state_path)
+    
+    def stats(self) -> dict:
+        """Store-wide dedupe ratio across every recipe"""
+        logical = 0
+        stored: Dict[str, int] = {}
+        backups = self.list_backups()
+        for backup_id in backups:
+            recipe = self.get_recipe(backup_id)
+            logical += recipe["image_size"]
+            stored.update((digest, length) for digest, length in recipe["chunks"])
+        physical = sum(stored.values())
+        return {
+            "backups": len(backups),
+            "logical_bytes": logical,
+            "unique_chunks": len(stored),
+            "stored_bytes": physical,
+            "dedupe_ratio": round(logical / physical, 2) if physical else None
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deduplicating chunk store for backup images")
+    parser.add_argument("action", choices=["put", "get", "stats"], help="Action to perform")
+    parser.add_argument("--image", "-i", help="Image file or block device (put)")
+    parser.add_argument("--target", "-t", help="Restore target file or device (get)")
+    parser.add_argument("--backup-id", "-b", help="Backup identifier")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Processes chunking and hashing segments")
+    parser.add_argument("--state-file", help="Restore resume state file (default: under ~/.oci-backup/restores)")
+    add_restore_arguments(parser)
+    add_store_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    chunk_store = ChunkStore(open_store(args))
+    if args.action == "put":
+        if not args.image or not args.backup_id:
+            parser.error("put requires --image and --backup-id")
+        print(json.dumps(chunk_store.put_image(args.image, args.backup_id, args.max_workers), indent=2))
+    elif args.action == "get":
+        if not args.target or not args.backup_id:
+            parser.error("get requires --target and --backup-id")
+        stats = chunk_store.restore_image(args.backup_id, args.target,
+                                          reader_from_args(chunk_store.store, args), args.state_file)
+        print(json.dumps(stats, indent=2))
+    else:
+        print(json.dumps(chunk_store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+cli.py - Single entry point for the backup tools, with an optional daemon
+
+``cli.py <command> [args]`` runs one of the tools (backup, restore,
+validate, policy, ...). Only the selected command's module is imported,
+so listing commands or running one that never calls OCI stays fast.
+
+``cli.py daemon start`` launches a resident process on a UNIX socket that
+has already imported every command and the OCI SDK and built the OCI
+clients. While it runs, later invocations hand their arguments, working
+directory, environment and terminal (stdin/stdout/stderr, passed as file
+descriptors) to it; it forks a warm child that runs the command straight
+on the caller's terminal and reports the exit code back. Each command
+still runs in its own process, so commands are isolated and may run
+concurrently. Use --no-daemon or OCI_BACKUP_NO_DAEMON=1 to bypass it.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Command -> (module providing main(argv), summary)
+COMMANDS = {
+    "backup": ("backup", "Back up an instance's boot and block volumes"),
+    "restore": ("restore", "Restore an instance from boot and block volume backups"),
+    "validate": ("validator", "Validate backups and build compliance reports"),
+    "policy": ("policy_manager", "Manage backup policies and enforce retention"),
+    "inventory": ("inventory", "Inventory backups across compartments and regions"),
+    "snapshot": ("inventory_snapshot", "Analyze columnar inventory snapshots"),
+    "export": ("export", "Export and restore images through Object Storage"),
+    "chunks": ("chunkstore", "Deduplicated chunk store for exported images"),
+    "catalog": ("catalog", "Index and search files inside backups"),
+    "checksum": ("checksum", "Build and verify block-hash manifests"),
+}
+
+DEFAULT_SOCKET = os.environ.get(
+    "OCI_BACKUP_DAEMON_SOCKET",
+    os.path.expanduser("~/.oci-backup/daemon.sock")
+)
+DEFAULT_DAEMON_LOG = os.path.expanduser("~/.oci-backup/daemon.log")
+NO_DAEMON = os.environ.get("OCI_BACKUP_NO_DAEMON", "").lower() in ("1", "true", "yes")
+
+# Settings read into module constants at import time; a daemon started
+# with different values would run commands with stale configuration
+_ENV_PREFIXES = ("OCI_", "OCI_BACKUP_")
+
+# OCI clients built up front by the daemon
+WARM_CLIENTS = (("core", "ComputeClient"), ("core", "BlockstorageClient"), ("identity", "IdentityClient"))
+MAX_MESSAGE = 1024 * 1024
+# Seconds an interrupted command gets to clean up before it is killed
+INTERRUPT_GRACE_SECONDS = 30
+
+
+def run_command(command: str, argv: List[str]) -> int:
+    """Import a command's module and run its main(); returns the exit code"""
+    module_name, _ = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    # argparse names the program after argv[0]
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {command}", *argv]
+    try:
+        module.main(argv)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    return 0
+
+
+def _config_env(env) -> dict:
+    return {k: v for k, v in env.items() if k.startswith(_ENV_PREFIXES)}
+
+
+def _send(conn: socket.socket, message: dict):
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def _recv(conn: socket.socket) -> Optional[dict]:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+    return json.loads(data)
+
+
+# ============================================================================
+# Client side
+# ============================================================================
+
+def run_via_daemon(command: str, argv: List[str], socket_path: str = DEFAULT_SOCKET) -> Optional[int]:
+    """
+    Run a command in the daemon; returns its exit code, or None if the
+    daemon is not running or cannot run it (the caller then runs it locally).
+    """
+    if not os.path.exists(socket_path):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        request = json.dumps({
+            "command": command,
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+            "prog": os.path.basename(sys.argv[0])
+        }).encode() + b"\n"
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(conn, [request], [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+        # The daemon may fail to answer (e.g. killed mid-run); treat that as a failure
+        reply = _recv(conn) or {"exit_code": 1}
+    except KeyboardInterrupt:
+        # Closing the connection interrupts the command in the daemon
+        return 130
+    except (ConnectionError, FileNotFoundError, OSError):
+        return None
+    finally:
+        conn.close()
+    if "fallback" in reply:
+        logging.debug("Daemon declined command: %s", reply["fallback"])
+        return None
+    return reply["exit_code"]
+
+
+def _control(action: str, socket_path: str) -> Optional[dict]:
+    """Send a control request (status, stop) to a running daemon"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        _send(conn, {"control": action})
+        return _recv(conn)
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# Daemon side
+# ============================================================================
+
+class Daemon:
+    """Resident process that forks warm children to run commands"""
+    
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, profiles: Optional[List[str]] = None):
+        self.socket_path = socket_path
+        self.profiles = profiles or [None]
+        self.env = _config_env(os.environ)
+        self.started = time.time()
+        self.served = 0
+        self.children = set()
+        self._running = True
+    
+    def warm(self):
+        """Import every command and the OCI SDK, and build OCI clients per profile"""
+        started = time.perf_counter()
+        for module_name, _ in COMMANDS.values():
+            try:
+                importlib.import_module(module_name)
+            except ImportError as e:
+                logging.warning("Daemon could not preload %s: %s", module_name, e)
+        try:
+            from lazy import oci
+            from clients import get_client_pool
+            
+            for profile in self.profiles:
+                pool = get_client_pool(profile)
+                for package, name in WARM_CLIENTS:
+                    pool.get(getattr(getattr(oci, package), name))
+        except Exception as e:
+            # Commands still run warm-imported; they build clients themselves
+            logging.warning("Daemon could not prebuild OCI clients: %s", e)
+        logging.info("Daemon warmed up in %.2fs", time.perf_counter() - started)
+    
+    def serve(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if _control("status", self.socket_path):
+                raise SystemExit(f"Daemon already running on {self.socket_path}")
+            os.remove(self.socket_path)  # Left over from a daemon that died
+        
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)  # Socket usable by this user only
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        server.listen(64)
+        server.settimeout(1.0)
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        logging.info("Daemon %d listening on %s", os.getpid(), self.socket_path)
+        
+        try:
+            while self._running:
+                self._reap()
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                try:
+                    self._handle(conn)
+                except Exception as e:
+                    logging.error("Daemon request failed: %s", e)
+                finally:
+                    conn.close()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            logging.info("Daemon stopped after serving %d commands", self.served)
+    
+    def stop(self):
+        self._running = False
+    
+    def _reap(self):
+        for pid in list(self.children):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                self.children.discard(pid)
+    
+    def _handle(self, conn: socket.socket):
+        conn.settimeout(10)
+        data, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE, 3)
+        try:
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(MAX_MESSAGE)
+                if not chunk:
+                    return
+                data += chunk
+            request = json.loads(data)
+            
+            if "control" in request:
+                if request["control"] == "stop":
+                    self.stop()
+                _send(conn, {
+                    "pid": os.getpid(),
+                    "socket": self.socket_path,
+                    "uptime_seconds": round(time.time() - self.started, 1),
+                    "served": self.served,
+                    "running": len(self.children),
+                    "profiles": self.profiles
+                })
+                return
+            
+            if request.get("command") not in COMMANDS:
+                _send(conn, {"fallback": "unknown command"})
+                return
+            if _config_env(request["env"]) != self.env or len(fds) != 3:
+                _send(conn, {"fallback": "environment differs from the daemon's"})
+                return
+            
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                self._run_child(conn, request, fds)  # Never returns
+            self.children.add(pid)
+            self.served += 1
+        finally:
+            for fd in fds:
+                os.close(fd)
+    
+    @staticmethod
+    def _watch_caller(conn: socket.socket, finished: threading.Event):
+        """
+        Interrupt the command when its caller goes away.
+        
+        The child is not in the terminal's foreground process group, so
+        Ctrl-C only reaches the client; the client then closes the
+        connection. The command gets KeyboardInterrupt, as it would when
+        run directly, and is killed if it has not exited after
+        INTERRUPT_GRACE_SECONDS.
+        """
+        def watch():
+            try:
+                gone = not conn.recv(1)
+            except OSError:
+                gone = True
+            if gone and not finished.is_set():
+                os.kill(os.getpid(), signal.SIGINT)
+                time.sleep(INTERRUPT_GRACE_SECONDS)
+                os._exit(130)
+        
+        threading.Thread(target=watch, name="caller-watch", daemon=True).start()
+    
+    @staticmethod
+    def _run_child(conn: socket.socket, request: dict, fds: List[int]):
+        """Run one command on the caller's terminal and report its exit code"""
+        code = 1
+        finished = threading.Event()
+        try:
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            conn.settimeout(None)
+            Daemon._watch_caller(conn, finished)
+            sys.argv = [request.get("prog", "cli.py")]
+            code = run_command(request["command"], request["argv"])
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException as e:
+            logging.error("%s failed: %s", request.get("command"), e)
+        finally:
+            try:
+                finished.set()
+                # Flush metrics/profile files registered by the command
+                import atexit
+                atexit._run_exitfuncs()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                _send(conn, {"exit_code": code})
+            finally:
+                os._exit(code)
+
+
+def start_daemon(socket_path: str, profiles: List[str], log_path: str = DEFAULT_DAEMON_LOG) -> int:
+    """Launch the daemon in the background and wait until it answers"""
+    if _control("status", socket_path):
+        print(f"Daemon already running on {socket_path}")
+        return 0
+    os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+    command = [sys.executable, os.path.abspath(__file__), "daemon", "run", "--socket", socket_path]
+    for profile in profiles:
+        command += ["--profile", profile]
+    with open(log_path, "a") as log:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                                   start_new_session=True)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status = _control("status", socket_path)
+        if status:
+            print(f"Daemon {status['pid']} listening on {socket_path} (log: {log_path})")
+            return 0
+        if process.poll() is not None:
+            print(f"Daemon exited during startup; see {log_path}", file=sys.stderr)
+            return 1
+        time.sleep(0.1)
+    print(f"Daemon did not start within 60s; see {log_path}", file=sys.stderr)
+    return 1
+
+
+def daemon_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} daemon",
+                                     description="Resident process that keeps commands warm")
+    parser.add_argument("action", choices=["start", "stop", "status", "run"],
+                        help="run stays in the foreground (for systemd and containers)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="UNIX socket path")
+    parser.add_argument("--profile", action="append", default=[],
+                        help="OCI config profile to prebuild clients for (repeatable; default profile if omitted)")
+    parser.add_argument("--log", default=DEFAULT_DAEMON_LOG, help="Log file for start")
+    args = parser.parse_args(argv)
+    
+    if args.action == "run":
+        daemon = Daemon(args.socket, args.profile or None)
+        daemon.warm()
+        daemon.serve()
+        return 0
+    if args.action == "start":
+        return start_daemon(args.socket, args.profile, args.log)
+    
+    status = _control(args.action, args.socket)
+    if status is None:
+        print("Daemon is not running")
+        return 1 if args.action == "status" else 0
+    if args.action == "stop":
+        print(f"Stopping daemon {status['pid']}")
+    else:
+        print(json.dumps(status, indent=2))
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        description="OCI backup tools",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<12}{summary}" for name, (_, summary) in COMMANDS.items())
+               + f"\n  {'daemon':<12}Start, stop or inspect the resident daemon"
+    )
+    parser.add_argument("--no-daemon", action="store_true", default=NO_DAEMON,
+                        help="Run in this process even if the daemon is running")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Daemon UNIX socket path")
+    parser.add_argument("command", choices=[*COMMANDS, "daemon"], metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the command")
+    args = parser.parse_args(argv)
+    
+    if args.command == "daemon":
+        raise SystemExit(daemon_main(args.args))
+    if not args.no_daemon:
+        code = run_via_daemon(args.command, args.args, args.socket)
+        if code is not None:
+            raise SystemExit(code)
+    raise SystemExit(run_command(args.command, args.args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+clients.py - Region-aware OCI client pool and multi-region fan-out
+
+Resolves authentication once per profile and hands out cached service
+clients per (client type, region), so one process can work across a set of
+regions concurrently instead of being bound to the config's home region.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from lazy import oci
+
+from metrics import record_cache
+from resilience import get_resilience
+from throttling import get_controller
+from tracing import bind
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Comma-separated default region set, e.g. "us-ashburn-1,us-phoenix-1"
+DEFAULT_REGIONS = os.environ.get("OCI_BACKUP_REGIONS", "")
+
+
+def parse_regions(value: Optional[str]) -> List[str]:
+    """Split a comma-separated region list, dropping blanks and duplicates"""
+    regions = [r.strip() for r in (value or "").split(",")]
+    return list(dict.fromkeys(r for r in regions if r))
+
+
+class ClientPool:
+    """Cache of throttled, retrying OCI service clients keyed by client class and region"""
+    
+    def __init__(self, profile: str = None, instance_principals_first: bool = False):
+        self.profile = profile
+        self.config, self.signer = self._resolve_auth(profile, instance_principals_first)
+        self._clients: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _resolve_auth(profile: str, instance_principals_first: bool):
+        """
+        Resolve config and signer.
+        
+        By default the config file (optionally a named profile) is tried
+        first with instance principals as fallback. With
+        ``instance_principals_first`` a named profile is used as-is, and
+        otherwise instance principals are tried before the default config.
+        """
+        def from_config():
+            config = oci.config.from_file(profile_name=profile) if profile else oci.config.from_file()
+            oci.config.validate_config(config)
+            logging.info("Using OCI config file authentication")
+            return config, None
+        
+        def from_instance_principals():
+            signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+            logging.info("Using instance principals authentication")
+            return {}, signer
+        
+        if instance_principals_first and profile:
+            return from_config()
+        first, second = (
+            (from_instance_principals, from_config) if instance_principals_first
+            else (from_config, from_instance_principals)
+        )
+        try:
+            return first()
+        except Exception as e:
+            logging.info("Falling back to alternate OCI authentication: %s", e)
+            return second()
+    
+    @property
+    def home_region(self) -> Optional[str]:
+        """Region clients use when none is requested"""
+        if self.config.get("region"):
+            return self.config["region"]
+        return getattr(self.signer, "region", None)
+    
+    def get(self, client_class, region: Optional[str] = None):
+        """Return a shared client of ``client_class`` for ``region`` (home region if None)"""
+        key = (client_class, region)
+        with self._lock:
+            client = self._clients.get(key)
+            record_cache("oci_clients", client is not None)
+            if client is None:
+                # Retries are handled by the resilience layer, not the SDK
+                client = client_class(
+                    self.config, signer=self.signer, retry_strategy=oci.retry.NoneRetryStrategy()
+                )
+                if region:
+                    client.base_client.set_region(region)
+                # Every call made through pooled clients shares AIMD limits;
+                # retries wrap the limiter so each attempt takes its own slot
+                # and backoff sleeps do not hold one
+                client = get_controller().wrap(client, region)
+                client = get_resilience().wrap(client, client.family)
+                self._clients[key] = client
+            return client
+
+
+_pools: Dict[tuple, ClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_client_pool(profile: str = None, instance_principals_first: bool = False) -> ClientPool:
+    """Process-wide client pool for a profile, created on first use"""
+    key = (profile, instance_principals_first)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ClientPool(profile, instance_principals_first)
+        return _pools[key]
+
+
+@dataclass
+class RegionRun:
+    """Outcome of running an operation in one region"""
+    region: str
+    status: str = "pending"  # pending, completed, failed
+    duration_seconds: float = 0.0
+    result: Any = None
+    error: Optional[str] = None
+    
+    def summary(self) -> dict:
+        """Per-region entry for merged reports (without the payload)"""
+        return {
+            "region": self.region,
+            "status": self.status,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "error": self.error
+        }
+
+
+def iter_regions(
+    regions: Iterable[str],
+    operation: Callable[[str], Any],
+    max_workers: Optional[int] = None
+) -> Iterator[RegionRun]:
+    """
+    Run ``operation(region)`` in every region concurrently.
+    
+    Yields each RegionRun as its region finishes. A failing region is
+    recorded on its run and does not stop the others.
+    """
+    regions = list(regions)
+    
+    def timed(region: str) -> RegionRun:
+        run = RegionRun(region=region)
+        started = time.monotonic()
+        try:
+            run.result = operation(region)
+            run.status = "completed"
+        except Exception as e:
+            run.status = "failed"
+            run.error = str(e)
+        run.duration_seconds = time.monotonic() - started
+        return run
+    
+    with ThreadPoolExecutor(max_workers=max_workers or len(regions) or 1) as pool:
+        futures = [pool.submit(bind(timed, region)) for region in regions]
+        for future in as_completed(futures):
+            run = future.result()
+            if run.status == "failed":
+                logging.error("Region %s failed after %.1fs: %s", run.region, run.duration_seconds, run.error)
+            else:
+                logging.info("Region %s done in %.1fs", run.region, run.duration_seconds)
+            yield run
@@ -0,0 +1,159 @@
+"""
+compartments.py - Compartment tree discovery and bounded fan-out
+
+Discovers nested compartments through the Identity API and runs a
+per-compartment operation (validation, inventory sync, retention) across
+the subtree with bounded concurrency, recording per-compartment timings.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+from lazy import oci
+
+from tracing import bind
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_MAX_WORKERS = 8
+
+
+@dataclass
+class CompartmentNode:
+    """A compartment in the discovered tree"""
+    id: str
+    name: str
+    parent_id: Optional[str] = None
+    depth: int = 0
+
+
+@dataclass
+class CompartmentRun:
+    """Outcome of running an operation against one compartment"""
+    compartment: CompartmentNode
+    status: str = "pending"  # pending, completed, failed
+    duration_seconds: float = 0.0
+    result: Any = None
+    error: Optional[str] = None
+    items: int = 0
+    
+    def summary(self) -> dict:
+        """Per-compartment entry for merged reports (without the payload)"""
+        return {
+            "compartment_id": self.compartment.id,
+            "name": self.compartment.name,
+            "depth": self.compartment.depth,
+            "status": self.status,
+            "items": self.items,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "error": self.error
+        }
+
+
+def discover_compartments(
+    identity_client,
+    root_id: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    include_root: bool = True
+) -> List[CompartmentNode]:
+    """
+    Discover all active compartments below ``root_id``.
+    
+    Walks the tree level by level, listing the children of every
+    compartment in a level concurrently.
+    """
+    root = CompartmentNode(id=root_id, name=root_id, depth=0)
+    try:
+        root.name = identity_client.get_compartment(root_id).data.name
+    except Exception as e:
+        # Tenancy OCIDs and restricted roots still have listable children
+        logging.debug("Could not read root compartment name: %s", e)
+    
+    found = [root] if include_root else []
+    frontier = [root]
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while frontier:
+            futures = [pool.submit(bind(_list_children, identity_client, node)) for node in frontier]
+            frontier = []
+            for future in futures:
+                frontier.extend(future.result())
+            found.extend(frontier)
+    
+    logging.info("Discovered %d compartments under %s", len(found), root_id)
+    return found
+
+
+def _list_children(identity_client, parent: CompartmentNode) -> List[CompartmentNode]:
+    """List the direct active children of a compartment"""
+    children = oci.pagination.list_call_get_all_results(
+        identity_client.list_compartments,
+        compartment_id=parent.id,
+        lifecycle_state="ACTIVE"
+    ).data
+    return [
+        CompartmentNode(id=c.id, name=c.name, parent_id=parent.id, depth=parent.depth + 1)
+        for c in children
+    ]
+
+
+def _count_items(result) -> int:
+    """Number of items an operation produced, for progress logging"""
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+def iter_fan_out(
+    compartments: Iterable[CompartmentNode],
+    operation: Callable[[CompartmentNode], Any],
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> Iterator[CompartmentRun]:
+    """
+    Run ``operation`` for every compartment with at most ``max_workers`` in flight.
+    
+    Yields each CompartmentRun as soon as its compartment finishes, so
+    callers can merge results and report progress incrementally. A failure
+    in one compartment is recorded on its run and never stops the others.
+    """
+    compartments = list(compartments)
+    total = len(compartments)
+    
+    def timed(node: CompartmentNode) -> CompartmentRun:
+        run = CompartmentRun(compartment=node)
+        started = time.monotonic()
+        try:
+            run.result = operation(node)
+            run.items = _count_items(run.result)
+            run.status = "completed"
+        except Exception as e:
+            run.status = "failed"
+            run.error = str(e)
+        run.duration_seconds = time.monotonic() - started
+        return run
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(bind(timed, node)) for node in compartments]
+        for done, future in enumerate(as_completed(futures), start=1):
+            run = future.result()
+            if run.status == "failed":
+                logging.error("[%d/%d] %s failed after %.1fs: %s",
+                              done, total, run.compartment.name, run.duration_seconds, run.error)
+            else:
+                logging.info("[%d/%d] %s done in %.1fs (%d items)",
+                             done, total, run.compartment.name, run.duration_seconds, run.items)
+            yield run
+
+
+def fan_out(
+    compartments: Iterable[CompartmentNode],
+    operation: Callable[[CompartmentNode], Any],
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> List[CompartmentRun]:
+    """Run ``operation`` across compartments and return all runs in tree order"""
+    compartments = list(compartments)
+    position = {node.id: i for i, node in enumerate(compartments)}
+    runs = list(iter_fan_out(compartments, operation, max_workers))
+    return sorted(runs, key=lambda run: position[run.compartment.id])
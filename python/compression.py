@@ -0,0 +1,156 @@
+"""
+compression.py - Pluggable compression stage for backup data pipelines
+
+A small codec registry (zstd when the ``zstandard`` package is installed,
+plus zlib, lzma and an uncompressed passthrough) and a thread-safe
+Compressor used by the export and restore pipelines. The codecs release
+the GIL while they work, so frames compressed from a thread pool use all
+cores. Frames that do not compress are stored as-is, decided by a cheap
+probe on a sample of each frame, and the Compressor keeps the ratio and
+CPU time needed to tune codec and level per workload.
+"""
+import logging
+import lzma
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Falls back to zlib as the default codec
+    zstandard = None
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Frames whose probe compresses to more than this fraction are stored raw
+DEFAULT_SKIP_THRESHOLD = 0.9
+PROBE_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Codec:
+    """A named compression algorithm with its level range"""
+    name: str
+    compress: Callable[[bytes, int], bytes]
+    decompress: Callable[[bytes], bytes]
+    default_level: int = 0
+    fast_level: int = 0
+    max_level: int = 0
+
+
+CODECS: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec):
+    """Make a codec available by name to every pipeline"""
+    CODECS[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown or unavailable compression codec: {name} "
+                         f"(available: {', '.join(sorted(CODECS))})")
+
+
+register_codec(Codec("none", lambda data, level: data, lambda data: data))
+register_codec(Codec("zlib", zlib.compress, zlib.decompress, default_level=6, fast_level=1, max_level=9))
+register_codec(Codec(
+    "lzma",
+    lambda data, level: lzma.compress(data, preset=level),
+    lzma.decompress,
+    default_level=6, fast_level=0, max_level=9
+))
+
+if zstandard is not None:
+    # Compressor objects are not thread-safe; keep one per thread and level
+    _zstd_local = threading.local()
+    
+    def _zstd_compress(data: bytes, level: int) -> bytes:
+        compressors = _zstd_local.__dict__.setdefault("compressors", {})
+        if level not in compressors:
+            compressors[level] = zstandard.ZstdCompressor(level=level)
+        return compressors[level].compress(data)
+    
+    def _zstd_decompress(data: bytes) -> bytes:
+        if not hasattr(_zstd_local, "decompressor"):
+            _zstd_local.decompressor = zstandard.ZstdDecompressor()
+        return _zstd_local.decompressor.decompress(data)
+    
+    register_codec(Codec("zstd", _zstd_compress, _zstd_decompress, default_level=3, fast_level=1, max_level=22))
+
+DEFAULT_CODEC = "zstd" if "zstd" in CODECS else "zlib"
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """Decompress a frame stored with ``codec``"""
+    return get_codec(codec).decompress(data)
+
+
+class Compressor:
+    """
+    Compresses frames with one codec and level, skipping incompressible data.
+    
+    Safe to share between threads; every call updates the running totals
+    reported by stats().
+    """
+    
+    def __init__(
+        self,
+        codec: str = DEFAULT_CODEC,
+        level: Optional[int] = None,
+        skip_threshold: float = DEFAULT_SKIP_THRESHOLD
+    ):
+        self.codec = get_codec(codec)
+        self.level = self.codec.default_level if level is None else level
+        if not 0 <= self.level <= self.codec.max_level:
+            raise ValueError(f"{codec} level must be between 0 and {self.codec.max_level}")
+        self.skip_threshold = skip_threshold
+        self._lock = threading.Lock()
+        self._totals = {"frames": 0, "skipped": 0, "raw_bytes": 0, "stored_bytes": 0, "cpu_seconds": 0.0}
+    
+    def _worth_compressing(self, data: bytes) -> bool:
+        """Probe a sample at the codec's fastest level"""
+        if len(data) <= PROBE_SIZE:
+            return True
+        middle = len(data) // 2
+        sample = data[middle:middle + PROBE_SIZE]
+        return len(self.codec.compress(sample, self.codec.fast_level)) <= len(sample) * self.skip_threshold
+    
+    def compress(self, data: bytes) -> Tuple[str, bytes]:
+        """Return (codec name, payload); the codec is "none" for skipped frames"""
+        started = time.thread_time()
+        codec, payload = "none", data
+        if self.codec.name != "none" and self._worth_compressing(data):
+            compressed = self.codec.compress(data, self.level)
+            if len(compressed) < len(data):
+                codec, payload = self.codec.name, compressed
+        cpu = time.thread_time() - started
+        with self._lock:
+            totals = self._totals
+            totals["frames"] += 1
+            totals["skipped"] += codec == "none"
+            totals["raw_bytes"] += len(data)
+            totals["stored_bytes"] += len(payload)
+            totals["cpu_seconds"] += cpu
+        return codec, payload
+    
+    def stats(self) -> dict:
+        """Codec settings, compression ratio and CPU seconds per GiB so far"""
+        with self._lock:
+            totals = dict(self._totals)
+        raw, stored = totals["raw_bytes"], totals["stored_bytes"]
+        return {
+            "codec": self.codec.name,
+            "level": self.level,
+            "frames": totals["frames"],
+            "frames_skipped": totals["skipped"],
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "ratio": round(raw / stored, 3) if stored else None,
+            "cpu_seconds": round(totals["cpu_seconds"], 3),
+            "cpu_seconds_per_gib": round(totals["cpu_seconds"] / (raw / 2 ** 30), 3) if raw else None
+        }
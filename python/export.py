@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+export.py - Parallel multipart export of volume images to Object Storage
+
+Streams a volume image (a file or block device) into an Object Storage
+multipart upload. The image is cut into fixed-size frames that a thread
+pool reads and compresses in parallel (see compression.py); frames are
+packed in order into parts, which a second pool uploads, so only a bounded
+number of frames and parts are held in memory at once. Progress is kept in
+a local state file, so an interrupted export resumes after the parts that
+already landed instead of starting over.
+
+Incremental exports compare the block-hash manifest of the previous export
+in a chain with the current image and upload only the changed blocks.
+Restores resolve the chain back to its full export, so any point in it can
+be rebuilt; a full export is forced every ``full_every`` exports to bound
+how many objects a restore has to read.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from checksum import BlockManifest, compute_manifest, image_size
+from compression import CODECS, DEFAULT_CODEC, Compressor
+from objectstore import DEFAULT_BACKUP_BUCKET, LocalObjectStore, ObjectStore, OCIObjectStore
+from restore_reader import Extent, RestorePlan, RestoreReader, add_restore_arguments, reader_from_args
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_FRAME_SIZE = 4 * 1024 * 1024  # Matches the block-hash manifest block size
+DEFAULT_COMPRESS_WORKERS = os.cpu_count() or 4
+
+# OCI multipart limits
+MIN_PART_SIZE = 10 * 1024 * 1024
+MAX_PARTS = 10000
+
+MANIFEST_SUFFIX = ".manifest.json"
+BLOCKS_SUFFIX = ".blocks"
+
+# Exports per chain, counting the full export that starts it
+DEFAULT_FULL_EVERY = 7
+
+DEFAULT_STATE_DIR = os.environ.get(
+    "OCI_BACKUP_EXPORT_STATE_DIR",
+    os.path.expanduser("~/.oci-backup/exports")
+)
+
+
+@dataclass
+class ExportState:
+    """Resumable progress of one multipart export"""
+    object_name: str
+    upload_id: str
+    source: str
+    image_size: int
+    part_size: int
+    frame_size: int = DEFAULT_FRAME_SIZE
+    codec: str = "none"
+    level: int = 0
+    base: Optional[str] = None
+    parts: Dict[int, dict] = field(default_factory=dict)  # part number -> {etag, stored_length, frames}
+    started_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    
+    def save(self, path: str):
+        """Write the state file: a header line, then one line per finished part"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = {k: v for k, v in asdict(self).items() if k != "parts"}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(header) + "\n")
+            for number, part in sorted(self.parts.items()):
+                f.write(json.dumps({"part": number, **part}) + "\n")
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def record_part(path: str, number: int, part: dict):
+        """Append one finished part (O(1) per part, unlike rewriting the file)"""
+        with open(path, "a") as f:
+            f.write(json.dumps({"part": number, **part}) + "\n")
+    
+    @classmethod
+    def load(cls, path: str) -> Optional['ExportState']:
+        try:
+            with open(path) as f:
+                lines = [json.loads(line) for line in f if line.endswith("\n")]
+        except FileNotFoundError:
+            return None
+        if not lines:
+            return None
+        state = cls(**lines[0])
+        for line in lines[1:]:
+            state.parts[line.pop("part")] = line
+        return state
+
+
+def choose_part_size(size: int, part_size: int = DEFAULT_PART_SIZE) -> int:
+    """Part size within OCI limits (at least 10 MiB, at most 10,000 parts)"""
+    part_size = max(part_size, MIN_PART_SIZE)
+    while -(-size // part_size) > MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+
+def read_range(fd: int, offset: int, length: int) -> bytes:
+    """Read exactly ``length`` bytes at ``offset`` (pread, safe across threads)"""
+    chunks = []
+    while length:
+        chunk = os.pread(fd, length, offset)
+        if not chunk:
+            raise EOFError(f"Unexpected end of image at offset {offset}")
+        chunks.append(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+    return b"".join(chunks)
+
+
+def ordered_map(pool: ThreadPoolExecutor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    Like pool.map, but with at most ``window`` calls submitted ahead of the
+    result being consumed, so memory stays bounded on large images.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def export_image(
+    source: str,
+    store: ObjectStore,
+    object_name: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    state_path: Optional[str] = None,
+    compressor: Optional[Compressor] = None,
+    frame_size: int = DEFAULT_FRAME_SIZE,
+    compress_workers: int = DEFAULT_COMPRESS_WORKERS,
+    blocks: Optional[Iterable[int]] = None,
+    base: Optional[str] = None
+) -> dict:
+    """
+    Upload an image as one multipart object plus a JSON export manifest.
+    
+    Frames of ``frame_size`` bytes are compressed by ``compressor`` (by
+    default the default codec at its default level) and packed into parts
+    of at least ``part_size`` stored bytes. Progress is journaled to
+    ``state_path`` (by default a file under DEFAULT_STATE_DIR named after
+    the object), so a rerun after an interruption reuses the same upload
+    and continues after the longest run of parts the store already has.
+    Returns the manifest, including compression and throughput statistics.
+    
+    ``blocks`` limits the export to those frame indices, on top of the
+    export named by ``base``; see export_incremental().
+    """
+    size = image_size(source)
+    part_size = choose_part_size(size, part_size)
+    compressor = compressor or Compressor()
+    state_path = state_path or os.path.join(
+        DEFAULT_STATE_DIR, hashlib.sha1(object_name.encode()).hexdigest() + ".json"
+    )
+    settings = (object_name, size, part_size, frame_size, compressor.codec.name, compressor.level, base)
+    chain_length = load_export_manifest(store, base).get("chain_length", 1) + 1 if base else 1
+    
+    state = ExportState.load(state_path)
+    if state and (state.object_name, state.image_size, state.part_size,
+                  state.frame_size, state.codec, state.level, state.base) == settings:
+        try:
+            # The store is the source of truth for which parts landed. Parts
+            # are packed in image order, so only a contiguous prefix is reusable.
+            uploaded = store.list_parts(object_name, state.upload_id)
+            parts = {}
+            for number in range(1, len(state.parts) + 1):
+                part = state.parts.get(number)
+                if not part or "frames" not in part or uploaded.get(number) != part["etag"]:
+                    break
+                parts[number] = part
+            state.parts = parts
+            state.save(state_path)  # Drop journal entries past the reusable prefix
+            logging.info("Resuming export of %s: %d parts already uploaded", object_name, len(parts))
+        except Exception as e:
+            # Upload expired or was aborted; start a new one
+            if not (isinstance(e, KeyError) or getattr(e, "status", None) == 404):
+                raise
+            state = None
+    else:
+        state = None
+    if state is None:
+        state = ExportState(object_name, store.create_multipart_upload(object_name), source, size, part_size,
+                            frame_size, compressor.codec.name, compressor.level, base)
+        state.save(state_path)
+    
+    lock = threading.Lock()
+    counters = {"bytes": 0, "parts": 0}
+    resumed_parts = len(state.parts)
+    done = {frame["offset"] for part in state.parts.values() for frame in part["frames"]}
+    selected = range(0, size, frame_size) if blocks is None else sorted(index * frame_size for index in blocks)
+    offsets = [offset for offset in selected if offset not in done]
+    # Bounds parts packed but not yet uploaded
+    in_flight = threading.BoundedSemaphore(max_workers)
+    fd = os.open(source, os.O_RDONLY)
+    
+    def compress_frame(offset: int):
+        data = read_range(fd, offset, min(frame_size, size - offset))
+        codec, payload = compressor.compress(data)
+        frame = {"offset": offset, "length": len(data), "stored_length": len(payload),
+                 "codec": codec, "sha256": hashlib.sha256(data).hexdigest()}
+        return frame, payload
+    
+    def upload(number: int, payload: bytes, frames: List[dict]):
+        try:
+            etag = store.upload_part(object_name, state.upload_id, number, payload)
+            part = {"etag": etag, "stored_length": len(payload), "frames": frames}
+            with lock:
+                state.parts[number] = part
+                counters["bytes"] += sum(frame["length"] for frame in frames)
+                counters["parts"] += 1
+                ExportState.record_part(state_path, number, part)
+        finally:
+            in_flight.release()
+    
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=compress_workers) as compress_pool, \
+                ThreadPoolExecutor(max_workers=max_workers) as upload_pool:
+            pending = []
+            number = resumed_parts + 1
+            payloads, frames, buffered = [], [], 0
+            
+            def flush():
+                nonlocal number, payloads, frames, buffered
+                in_flight.acquire()
+                pending.append(upload_pool.submit(upload, number, b"".join(payloads), frames))
+                number += 1
+                payloads, frames, buffered = [], [], 0
+            
+            for frame, payload in ordered_map(compress_pool, compress_frame, offsets, compress_workers * 2):
+                payloads.append(payload)
+                frames.append(frame)
+                buffered += len(payload)
+                if buffered >= part_size:
+                    flush()
+            if frames or number == 1:
+                flush()  # Last (possibly short) part; an empty image still needs one
+            for future in pending:
+                future.result()
+    finally:
+        os.close(fd)
+    elapsed = time.monotonic() - started
+    
+    store.commit_multipart_upload(object_name, state.upload_id, {n: p["etag"] for n, p in state.parts.items()})
+    
+    manifest_frames, stored_offset = [], 0
+    for number in sorted(state.parts):
+        for frame in state.parts[number]["frames"]:
+            manifest_frames.append({**frame, "stored_offset": stored_offset})
+            stored_offset += frame["stored_length"]
+    manifest = {
+        "object_name": object_name,
+        "source": source,
+        "image_size": size,
+        "part_size": part_size,
+        "frame_size": frame_size,
+        "exported_at": datetime.utcnow().isoformat(),
+        "base": base,
+        "chain_length": chain_length,
+        "compression": {
+            **compressor.stats(),
+            "stored_size": stored_offset,
+            "ratio": round(size / stored_offset, 3) if stored_offset else None
+        },
+        "parts": [{"part": n, "stored_length": p["stored_length"], "frames": len(p["frames"])}
+                  for n, p in sorted(state.parts.items())],
+        "frames": manifest_frames,
+        "stats": {
+            "parts_uploaded": counters["parts"],
+            "parts_resumed": resumed_parts,
+            "bytes_uploaded": counters["bytes"],
+            "duration_seconds": round(elapsed, 3),
+            "throughput_mib_s": round(counters["bytes"] / 2 ** 20 / elapsed, 1) if elapsed else None
+        }
+    }
+    store.put_object(object_name + MANIFEST_SUFFIX, json.dumps(manifest).encode())
+    os.remove(state_path)
+    
+    logging.info("Exported %s to %s: %d parts (%d resumed), %s ratio %s, %.0f MiB/s",
+                 source, object_name, len(state.parts), resumed_parts, compressor.codec.name,
+                 manifest["compression"]["ratio"], manifest["stats"]["throughput_mib_s"] or 0)
+    return manifest
+
+
+def latest_export(store: ObjectStore, prefix: str, before: Optional[str] = None) -> Optional[str]:
+    """
+    Last export under ``prefix`` (sorting before ``before``, if given).
+    
+    Names in a chain must sort chronologically, e.g. end in a timestamp.
+    """
+    names = [name[:-len(MANIFEST_SUFFIX)] for name in store.list_objects(prefix) if name.endswith(MANIFEST_SUFFIX)]
+    names = [name for name in names if before is None or name < before]
+    return max(names) if names else None
+
+
+def export_incremental(
+    source: str,
+    store: ObjectStore,
+    object_name: str,
+    base: Optional[str] = None,
+    full_every: int = DEFAULT_FULL_EVERY,
+    **kwargs
+) -> dict:
+    """
+    Export only the blocks that changed since ``base``.
+    
+    ``base`` defaults to the latest export next to ``object_name`` (same
+    prefix up to the last "/"). The export is full when there is no usable
+    base, or when the chain already holds ``full_every`` exports. Either
+    way the image's block-hash manifest is stored beside the export for the
+    next incremental. Other arguments are passed to export_image().
+    """
+    frame_size = kwargs.pop("frame_size", DEFAULT_FRAME_SIZE)
+    current = compute_manifest(source, block_size=frame_size)
+    if base is None:
+        base = latest_export(store, object_name.rsplit("/", 1)[0] + "/" if "/" in object_name else "", object_name)
+    
+    previous = None
+    if base and base != object_name:
+        try:
+            if load_export_manifest(store, base).get("chain_length", 1) < full_every:
+                previous = BlockManifest.from_bytes(store.get_object(base + BLOCKS_SUFFIX))
+            else:
+                logging.info("Chain ending at %s has %d exports; starting a new full export", base, full_every)
+        except (KeyError, ValueError) as e:
+            logging.warning("Cannot use %s as incremental base (%s); exporting in full", base, e)
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
+                raise
+            logging.warning("Cannot use %s as incremental base (not found); exporting in full", base)
+    if previous is not None and (previous.block_size, previous.algorithm) != (current.block_size, current.algorithm):
+        logging.warning("Block manifest of %s uses a different block size; exporting in full", base)
+        previous = None
+    
+    if previous is None:
+        manifest = export_image(source, store, object_name, frame_size=frame_size, **kwargs)
+    else:
+        changed = [index for index in current.changed_blocks(previous) if index < current.block_count]
+        logging.info("%d of %d blocks changed since %s", len(changed), current.block_count, base)
+        manifest = export_image(source, store, object_name, frame_size=frame_size,
+                                blocks=changed, base=base, **kwargs)
+    store.put_object(object_name + BLOCKS_SUFFIX, current.to_bytes())
+    return manifest
+
+
+def load_export_manifest(store: ObjectStore, object_name: str) -> dict:
+    """Fetch the export manifest written next to an exported object"""
+    return json.loads(store.get_object(object_name + MANIFEST_SUFFIX))
+
+
+def manifest_frames(manifest: dict) -> List[dict]:
+    """
+    Frames of an export manifest in image order.
+    
+    Manifests written before compression was added list raw parts only;
+    those are returned as uncompressed frames.
+    """
+    if "frames" in manifest:
+        return manifest["frames"]
+    return [{"offset": p["offset"], "length": p["length"], "stored_offset": p["offset"],
+             "stored_length": p["length"], "codec": "none", "sha256": p["sha256"]}
+            for p in manifest["parts"]]
+
+
+def resolve_frames(store: ObjectStore, object_name: str) -> Tuple[dict, List[Tuple[str, dict]]]:
+    """
+    Manifest of an export and the (object name, frame) pairs that rebuild it.
+    
+    Walks incremental exports back to their full export, taking each frame
+    from the newest export in the chain that has it.
+    """
+    manifest = load_export_manifest(store, object_name)
+    size = manifest["image_size"]
+    sources: Dict[int, Tuple[str, dict]] = {}
+    name, current = object_name, manifest
+    while True:
+        for frame in manifest_frames(current):
+            if frame["length"] and frame["offset"] < size and frame["offset"] not in sources:
+                sources[frame["offset"]] = (name, frame)
+        if not current.get("base"):
+            break
+        name = current["base"]
+        current = load_export_manifest(store, name)
+    
+    frames, covered = [sources[offset] for offset in sorted(sources)], 0
+    for _, frame in frames:
+        if frame["offset"] != covered:
+            break
+        covered += frame["length"]
+    if covered != size:
+        raise ValueError(f"Export chain of {object_name} does not cover the image (stops at offset {covered})")
+    return manifest, frames
+
+
+def restore_plan(store: ObjectStore, object_name: str) -> RestorePlan:
+    """Restore plan for an export (full or any incremental)"""
+    manifest, frames = resolve_frames(store, object_name)
+    extents = [
+        Extent(frame["offset"], frame["length"], frame["sha256"], name,
+               (frame["stored_offset"], frame["stored_offset"] + frame["stored_length"] - 1), frame["codec"])
+        for name, frame in frames
+    ]
+    return RestorePlan(f"export:{object_name}@{manifest['exported_at']}", manifest["image_size"], extents)
+
+
+def restore_export(store: ObjectStore, object_name: str, target: str, reader: Optional[RestoreReader] = None,
+                   state_path: Optional[str] = None) -> dict:
+    """Write an exported image back to a file or device; see RestoreReader"""
+    return (reader or RestoreReader(store)).restore(restore_plan(store, object_name), target, state_path)
+
+
+def open_store(args) -> ObjectStore:
+    """Object store selected by CLI arguments (local directory or OCI bucket)"""
+    if args.local_store:
+        return LocalObjectStore(args.local_store, latency=args.local_latency)
+    from clients import get_client_pool
+    return OCIObjectStore.from_pool(get_client_pool(args.profile), args.bucket, args.region)
+
+
+def add_store_arguments(parser: argparse.ArgumentParser):
+    """Options shared by CLIs that read or write exported images"""
+    parser.add_argument("--bucket", default=DEFAULT_BACKUP_BUCKET, help="Object Storage bucket")
+    parser.add_argument("--local-store", help="Use a local directory instead of Object Storage")
+    parser.add_argument("--local-latency", type=float, default=0.0,
+                        help="Simulated per-request latency (seconds) for --local-store")
+    parser.add_argument("--profile", "-p")
+    parser.add_argument("--region", "-r", help="Region to operate in (default: config region)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a volume image to Object Storage")
+    parser.add_argument("action", nargs="?", choices=["export", "restore"], default="export",
+                        help="Action to perform")
+    parser.add_argument("--source", "-s", help="Image file or block device (export)")
+    parser.add_argument("--target", "-t", help="Restore target file or device (restore)")
+    parser.add_argument("--object", "-o", required=True, help="Exported object name")
+    parser.add_argument("--part-size-mb", type=int, default=DEFAULT_PART_SIZE // 2 ** 20)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--state-file", help="Resume state file (default: under ~/.oci-backup)")
+    parser.add_argument("--compression", choices=sorted(CODECS), default=DEFAULT_CODEC,
+                        help=f"Compression codec (default: {DEFAULT_CODEC})")
+    parser.add_argument("--compression-level", type=int, help="Codec level (default: codec default)")
+    parser.add_argument("--compress-workers", type=int, default=DEFAULT_COMPRESS_WORKERS,
+                        help="Threads compressing frames")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Upload only blocks changed since the previous export")
+    parser.add_argument("--base", help="Previous export (default: latest export under the object's prefix)")
+    parser.add_argument("--full-every", type=int, default=DEFAULT_FULL_EVERY,
+                        help="Maximum exports per incremental chain, including its full export")
+    add_restore_arguments(parser)
+    add_store_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    if args.action == "restore":
+        if not args.target:
+            parser.error("restore requires --target")
+        store = open_store(args)
+        print(json.dumps(restore_export(store, args.object, args.target, reader_from_args(store, args),
+                                        args.state_file), indent=2))
+        return
+    
+    if not args.source:
+        parser.error("export requires --source")
+    options = {
+        "part_size": args.part_size_mb * 2 ** 20,
+        "max_workers": args.max_workers,
+        "state_path": args.state_file,
+        "compressor": Compressor(args.compression, args.compression_level),
+        "compress_workers": args.compress_workers
+    }
+    if args.incremental:
+        manifest = export_incremental(args.source, open_store(args), args.object, args.base,
+                                      args.full_every, **options)
+    else:
+        manifest = export_image(args.source, open_store(args), args.object, **options)
+    print(json.dumps({"base": manifest["base"], "chain_length": manifest["chain_length"],
+                      "compression": manifest["compression"], **manifest["stats"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
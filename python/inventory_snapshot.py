@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+inventory_snapshot.py - Columnar snapshots of the backup inventory
+
+Stores each inventory sync as a columnar snapshot, either an Arrow IPC file
+(the default) or Parquet, in a local directory and optionally in the
+backup_metadata bucket. Arrow snapshots are written uncompressed so that
+loading them memory-maps the file and references its buffers zero-copy.
+Cost, trend and compliance analytics then scan only the columns they need,
+with Arrow compute kernels instead of re-listing OCI.
+
+Requires the optional ``pyarrow`` package.
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from objectstore import DEFAULT_METADATA_BUCKET, ObjectStore
+
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Snapshots are unavailable without pyarrow
+    pyarrow = None
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get(
+    "OCI_BACKUP_INVENTORY_SNAPSHOT_DIR",
+    os.path.expanduser("~/.oci-backup/inventory-snapshots")
+)
+BUCKET_PREFIX = "inventory/snapshots/"
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# Age buckets (days) for size-by-age analytics
+AGE_BUCKETS = [(0, "0-7d"), (8, "8-30d"), (31, "31-90d"), (91, "91-365d"), (366, ">1y")]
+
+# Columns from inventory.BackupRecord, plus the policy resolved at snapshot time
+COLUMNS = [
+    ("backup_id", "string"),
+    ("backup_type", "category"),
+    ("compartment_id", "category"),
+    ("display_name", "string"),
+    ("lifecycle_state", "category"),
+    ("size_in_gbs", "float64"),
+    ("time_created", "timestamp"),
+    ("source_volume_id", "category"),
+    ("kms_key_id", "category"),
+    ("region", "category"),
+    ("policy_id", "category")
+]
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Columnar inventory snapshots need pyarrow (pip install pyarrow)")
+
+
+def _arrow_type(kind: str):
+    return {
+        "string": pyarrow.string(),
+        "category": pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+        "float64": pyarrow.float64(),
+        "timestamp": pyarrow.timestamp("us", tz="UTC")
+    }[kind]
+
+
+def snapshot_schema():
+    _require_pyarrow()
+    return pyarrow.schema([(name, _arrow_type(kind)) for name, kind in COLUMNS])
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _parse_times(values: List[Optional[str]]):
+    """ISO 8601 strings as a UTC timestamp array"""
+    try:
+        # OCI times carry a zone offset, which Arrow parses in one vectorized cast
+        return pc.cast(pyarrow.array(values, pyarrow.string()), _arrow_type("timestamp"))
+    except pyarrow.ArrowInvalid:
+        # Naive times (treated as UTC) need the slower per-value path
+        return pyarrow.array([_parse_time(value) for value in values], _arrow_type("timestamp"))
+
+
+def records_to_table(
+    records: Iterable[dict],
+    policies_by_compartment: Optional[Dict[str, str]] = None,
+    snapshot_time: Optional[datetime] = None
+):
+    """
+    Build a snapshot table from inventory record dicts.
+    
+    ``policies_by_compartment`` maps compartment OCIDs to the policy that
+    governs them, which becomes the ``policy_id`` column.
+    """
+    _require_pyarrow()
+    policies_by_compartment = policies_by_compartment or {}
+    columns: Dict[str, list] = {name: [] for name, _ in COLUMNS}
+    for record in records:
+        for name, kind in COLUMNS:
+            if name == "policy_id":
+                value = policies_by_compartment.get(record.get("compartment_id"))
+            else:
+                value = record.get(name)
+            columns[name].append(value)
+    
+    arrays = []
+    for name, kind in COLUMNS:
+        if kind == "category":
+            arrays.append(pyarrow.array(columns[name], pyarrow.string()).dictionary_encode())
+        elif kind == "timestamp":
+            arrays.append(_parse_times(columns[name]))
+        else:
+            arrays.append(pyarrow.array(columns[name], _arrow_type(kind)))
+    snapshot_time = snapshot_time or datetime.now(timezone.utc)
+    metadata = {"snapshot_time": snapshot_time.isoformat(), "rows": str(len(arrays[0]))}
+    return pyarrow.Table.from_arrays(arrays, schema=snapshot_schema().with_metadata(metadata))
+
+
+def policies_by_compartment(policy_manager) -> Dict[str, str]:
+    """Compartment OCID -> id of the first enabled policy targeting it"""
+    mapping = {}
+    for policy in policy_manager.list_policies(enabled_only=True):
+        for compartment_id in policy.target_compartments:
+            mapping.setdefault(compartment_id, policy.policy_id)
+    return mapping
+
+
+def write_table(table, path: str, fmt: str = "arrow"):
+    """Write a snapshot file atomically"""
+    _require_pyarrow()
+    tmp_path = f"{path}.tmp"
+    if fmt == "arrow":
+        # Uncompressed IPC file: loadable zero-copy through a memory map
+        with pyarrow.OSFile(tmp_path, "wb") as sink, pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=1024 * 1024)
+    elif fmt == "parquet":
+        pyarrow.parquet.write_table(table, tmp_path, compression="zstd")
+    else:
+        raise ValueError(f"Unknown snapshot format: {fmt}")
+    os.replace(tmp_path, path)
+
+
+def load_table(path: str, columns: Optional[List[str]] = None):
+    """
+    Load a snapshot file.
+    
+    Arrow files are memory-mapped and not copied; the table stays valid as
+    long as it is referenced. Parquet files are decoded into memory.
+    """
+    _require_pyarrow()
+    if path.endswith(FORMATS["parquet"]):
+        return pyarrow.parquet.read_table(path, columns=columns, memory_map=True)
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(path, "r")).read_all()
+    return table.select(columns) if columns else table
+
+
+class InventorySnapshotStore:
+    """
+    Inventory snapshots in a local directory, mirrored to a bucket.
+    
+    Snapshot names start with a UTC timestamp, so listings are in time
+    order. With a bucket, snapshots missing locally are downloaded on load.
+    """
+    
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR, store: Optional[ObjectStore] = None):
+        self.root = root
+        self.store = store
+        os.makedirs(root, exist_ok=True)
+    
+    def save(self, table, fmt: str = "arrow") -> str:
+        """Write a snapshot (and upload it when a bucket is set); returns its name"""
+        snapshot_time = datetime.fromisoformat(table.schema.metadata[b"snapshot_time"].decode())
+        name = f"inventory-{snapshot_time.strftime('%Y%m%dT%H%M%SZ')}{FORMATS[fmt]}"
+        path = os.path.join(self.root, name)
+        write_table(table, path, fmt)
+        if self.store is not None:
+            with open(path, "rb") as f:
+                self.store.put_object(BUCKET_PREFIX + name, f.read())
+        logging.info("Saved inventory snapshot %s (%d rows, %.1f MiB)",
+                     name, table.num_rows, os.path.getsize(path) / 2 ** 20)
+        return name
+    
+    def list_snapshots(self) -> List[str]:
+        """Snapshot names, oldest first"""
+        names = {n for n in os.listdir(self.root) if n.startswith("inventory-") and n.endswith(tuple(FORMATS.values()))}
+        if self.store is not None:
+            names.update(n[len(BUCKET_PREFIX):] for n in self.store.list_objects(BUCKET_PREFIX))
+        return sorted(names)
+    
+    def load(self, name: Optional[str] = None, columns: Optional[List[str]] = None):
+        """Load a snapshot (default: the latest), downloading it first if needed"""
+        if name is None:
+            names = self.list_snapshots()
+            if not names:
+                raise KeyError("No inventory snapshots found")
+            name = names[-1]
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            if self.store is None:
+                raise KeyError(f"Snapshot {name} not found")
+            tmp_path = f"{path}.download"
+            with open(tmp_path, "wb") as f:
+                f.write(self.store.get_object(BUCKET_PREFIX + name))
+            os.replace(tmp_path, path)
+        return load_table(path, columns)
+
+
+def _grouped(table, key: str, top: Optional[int] = None) -> List[dict]:
+    """Backup count and total size per value of ``key``, largest first"""
+    grouped = table.select([key, "size_in_gbs"]).group_by(key).aggregate([("size_in_gbs", "sum"), ([], "count_all")])
+    # Sort and cut in Arrow, so only the returned rows become Python objects
+    grouped = grouped.sort_by([("size_in_gbs_sum", "descending")])
+    if top:
+        grouped = grouped.slice(0, top)
+    return [{key: row[key], "backups": row["count_all"], "size_gb": round(row["size_in_gbs_sum"] or 0, 1)}
+            for row in grouped.to_pylist()]
+
+
+def analyze(table, now: Optional[datetime] = None, stale_hours: int = 24, top: int = 20) -> dict:
+    """
+    Cost and compliance summary of one snapshot.
+    
+    Size by age, policy, type, region and source volume, plus volumes
+    whose newest available backup is older than ``stale_hours`` (an RPO
+    breach) and volumes not covered by any policy.
+    """
+    _require_pyarrow()
+    now = now or datetime.fromisoformat(table.schema.metadata[b"snapshot_time"].decode())
+    now_us = int(now.timestamp() * 1e6)
+    created_us = pc.cast(table["time_created"], pyarrow.int64())
+    age_days = pc.divide(pc.subtract(pyarrow.scalar(now_us), created_us), 86400 * 10 ** 6)
+    # Bucket index = number of bucket edges the age has passed
+    bucket = pc.cast(pyarrow.scalar(0), pyarrow.int8())
+    for edge, _ in AGE_BUCKETS[1:]:
+        bucket = pc.add(bucket, pc.cast(pc.greater_equal(age_days, edge), pyarrow.int8()))
+    labels = [label for _, label in AGE_BUCKETS]
+    by_age = _grouped(table.append_column("age", pc.take(pyarrow.array(labels), bucket)), "age")
+    by_age.sort(key=lambda row: labels.index(row["age"]) if row["age"] else len(labels))
+    
+    volumes = table.select(["source_volume_id", "time_created", "lifecycle_state"])
+    available = volumes.filter(pc.equal(volumes["lifecycle_state"], pyarrow.scalar("AVAILABLE")))
+    newest = available.group_by("source_volume_id").aggregate([("time_created", "max")])
+    stale_cutoff = pyarrow.scalar(now_us - stale_hours * 3600 * 10 ** 6, pyarrow.int64())
+    stale = newest.filter(pc.less(pc.cast(newest["time_created_max"], pyarrow.int64()), stale_cutoff))
+    unprotected = pc.sum(pc.is_null(table["policy_id"])).as_py()
+    
+    sizes = table["size_in_gbs"]
+    return {
+        "snapshot_time": now.isoformat(),
+        "backups": table.num_rows,
+        "total_size_gb": round(pc.sum(sizes).as_py() or 0, 1),
+        "by_age": by_age,
+        "by_policy": _grouped(table, "policy_id"),
+        "by_type": _grouped(table, "backup_type"),
+        "by_region": _grouped(table, "region"),
+        "by_state": _grouped(table, "lifecycle_state"),
+        "top_volumes": _grouped(table, "source_volume_id", top),
+        "compliance": {
+            "volumes": volumes.group_by("source_volume_id").aggregate([]).num_rows,
+            "stale_volumes": stale.num_rows,
+            "stale_hours": stale_hours,
+            "stale_volume_ids": stale["source_volume_id"].to_pylist()[:top],
+            "backups_without_policy": unprotected
+        }
+    }
+
+
+def trend(snapshots: InventorySnapshotStore, names: Optional[List[str]] = None) -> List[dict]:
+    """Backup count and total size per snapshot, oldest first"""
+    rows = []
+    for name in names or snapshots.list_snapshots():
+        table = snapshots.load(name, columns=["size_in_gbs"])
+        rows.append({"snapshot": name, "backups": table.num_rows,
+                     "total_size_gb": round(pc.sum(table["size_in_gbs"]).as_py() or 0, 1)})
+    return rows
+
+
+def read_ndjson(path: str) -> Iterable[dict]:
+    """Records from an inventory.py NDJSON file"""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def open_snapshot_store(args) -> InventorySnapshotStore:
+    """Snapshot store selected by CLI arguments"""
+    store = None
+    if args.snapshot_bucket:
+        from clients import get_client_pool
+        from objectstore import OCIObjectStore
+        store = OCIObjectStore.from_pool(get_client_pool(args.profile), args.snapshot_bucket)
+    return InventorySnapshotStore(args.snapshot_dir, store)
+
+
+def add_snapshot_arguments(parser: argparse.ArgumentParser):
+    """Options shared by CLIs that write or read inventory snapshots"""
+    parser.add_argument("--snapshot-dir", default=DEFAULT_SNAPSHOT_DIR, help="Local snapshot directory")
+    parser.add_argument("--snapshot-bucket", nargs="?", const=DEFAULT_METADATA_BUCKET,
+                        help=f"Also store snapshots in this bucket (default when given: {DEFAULT_METADATA_BUCKET})")
+    parser.add_argument("--snapshot-format", choices=sorted(FORMATS), default="arrow")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar backup inventory snapshots")
+    parser.add_argument("action", choices=["import", "list", "analyze", "trend"], help="Action to perform")
+    parser.add_argument("--input", "-i", help="Inventory NDJSON written by inventory.py (import)")
+    parser.add_argument("--snapshot", help="Snapshot name (analyze; default: latest)")
+    parser.add_argument("--policy-file", help="Policy store used to fill in policy_id (import)")
+    parser.add_argument("--stale-hours", type=int, default=24, help="RPO threshold for compliance (analyze)")
+    parser.add_argument("--profile", "-p")
+    add_snapshot_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    snapshots = open_snapshot_store(args)
+    if args.action == "import":
+        if not args.input:
+            parser.error("import requires --input")
+        policies = {}
+        if args.policy_file:
+            from policy_manager import PolicyManager
+            policies = policies_by_compartment(PolicyManager(config_path=args.policy_file))
+        table = records_to_table(read_ndjson(args.input), policies)
+        print(snapshots.save(table, args.snapshot_format))
+    elif args.action == "list":
+        print("\n".join(snapshots.list_snapshots()))
+    elif args.action == "analyze":
+        print(json.dumps(analyze(snapshots.load(args.snapshot), stale_hours=args.stale_hours), indent=2))
+    else:
+        print(json.dumps(trend(snapshots), indent=2))
+
+
+if __name__ == "__main__":
+    main()
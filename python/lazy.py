@@ -0,0 +1,48 @@
+"""
+lazy.py - Deferred imports for the OCI SDK and other heavy packages
+
+Importing the OCI SDK loads hundreds of service modules and takes around
+a second, which every CLI run and API cold start paid even when it never
+made an OCI call. Modules import ``oci`` from here instead; the name is a
+stand-in that imports the real SDK the first time one of its attributes
+is used. A missing SDK therefore only fails the commands that need it.
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Optional
+
+_lock = threading.Lock()
+
+
+class LazyModule(ModuleType):
+    """Stand-in for a module that imports it on first attribute access"""
+    
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module: Optional[ModuleType] = None
+    
+    def _load(self) -> ModuleType:
+        # Locked so threads racing on first use do not import twice
+        with _lock:
+            if self._module is None:
+                self._module = importlib.import_module(self.__name__)
+            return self._module
+    
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        # Later lookups of the same attribute skip __getattr__
+        setattr(self, attr, value)
+        return value
+    
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Module ``name``, imported when one of its attributes is first used"""
+    return LazyModule(name)
+
+
+oci = lazy_import("oci")
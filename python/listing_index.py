@@ -0,0 +1,295 @@
+"""
+listing_index.py - Indexed, paginated backup and job listings
+
+Keeps the backups of each compartment and the API's jobs in SQLite so
+listings can be filtered, sorted and paged on the server. Backup listings
+persist in a database file; jobs are only tracked in memory, so their
+index is opened with db_path=":memory:" and lives as long as they do.
+Pages use keyset pagination: a page ends with an opaque cursor holding the
+sort value and id of its last row, and the next page seeks past that key
+on a B-tree index. Every page therefore costs one index seek plus the rows
+it returns, however deep into the listing it is, and rows added or
+removed between requests never shift items across pages.
+"""
+import base64
+import binascii
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_INDEX_DB = os.environ.get(
+    "OCI_BACKUP_INDEX_DB",
+    os.path.expanduser("~/.oci-backup/listings.db")
+)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# API sort name -> indexed column, per listing
+BACKUP_SORTS = {"created": "created_at", "size": "size_gb", "instance": "instance_name"}
+JOB_SORTS = {"started": "start_time", "instance": "instance_name"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    backup_id TEXT PRIMARY KEY,
+    compartment_id TEXT NOT NULL,
+    instance_name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    size_gb REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS backups_created ON backups(compartment_id, created_at, backup_id);
+CREATE INDEX IF NOT EXISTS backups_size ON backups(compartment_id, size_gb, backup_id);
+CREATE INDEX IF NOT EXISTS backups_instance ON backups(compartment_id, instance_name, created_at, backup_id);
+CREATE INDEX IF NOT EXISTS backups_instance_sort ON backups(compartment_id, instance_name, backup_id);
+CREATE INDEX IF NOT EXISTS backups_instance_size ON backups(compartment_id, instance_name, size_gb, backup_id);
+CREATE INDEX IF NOT EXISTS backups_type ON backups(compartment_id, type, created_at, backup_id);
+CREATE INDEX IF NOT EXISTS backups_state ON backups(compartment_id, state, created_at, backup_id);
+CREATE TABLE IF NOT EXISTS backup_syncs (
+    compartment_id TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    compartment_id TEXT NOT NULL,
+    instance_name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_started ON jobs(compartment_id, start_time, job_id);
+CREATE INDEX IF NOT EXISTS jobs_instance ON jobs(compartment_id, instance_name, start_time, job_id);
+CREATE INDEX IF NOT EXISTS jobs_instance_sort ON jobs(compartment_id, instance_name, job_id);
+CREATE INDEX IF NOT EXISTS jobs_type ON jobs(compartment_id, type, start_time, job_id);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(compartment_id, state, start_time, job_id);
+"""
+
+
+class InvalidCursor(ValueError):
+    """A cursor that is malformed or belongs to a different sort order"""
+
+
+def encode_cursor(sort: str, order: str, value, row_id: str) -> str:
+    """Opaque cursor: URL-safe base64 of the last row's (sort key, id)"""
+    raw = json.dumps([sort, order, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    """(sort value, id) from a cursor made for the same sort and order"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, row_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise InvalidCursor(f"Cursor was issued for sort={cursor_sort}&order={cursor_order}")
+    return value, row_id
+
+
+def _utc_iso(value) -> str:
+    """Timestamps as UTC ISO strings, so they compare correctly as text"""
+    if not value:
+        return ""
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return str(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # The API records naive UTC times
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _age_cutoff(days: float) -> str:
+    return _utc_iso(datetime.now(timezone.utc) - timedelta(days=days))
+
+
+class ListingIndex:
+    """SQLite index of backup and job listings; safe to share between threads"""
+    
+    def __init__(self, db_path: str = DEFAULT_INDEX_DB):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+    
+    def close(self):
+        self._db.close()
+    
+    def replace_backups(self, compartment_id: str, backups: Iterable[dict]):
+        """
+        Make ``backups`` the compartment's complete listing.
+        
+        Items use the API's backup fields (backup_id, type, instance_name,
+        created, size_gb, status); backups no longer listed are removed.
+        """
+        rows = [
+            (b["backup_id"], compartment_id, b.get("instance_name") or "", b.get("type") or "",
+             b.get("status") or "", _utc_iso(b.get("created")), float(b.get("size_gb") or 0),
+             json.dumps(b, default=str))
+            for b in backups
+        ]
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM backups WHERE compartment_id = ?", (compartment_id,))
+            self._db.executemany("INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("INSERT OR REPLACE INTO backup_syncs VALUES (?, ?)", (compartment_id, time.time()))
+        logging.debug("Indexed %d backups for %s", len(rows), compartment_id)
+    
+    def remove_backup(self, backup_id: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM backups WHERE backup_id = ?", (backup_id,))
+    
+    def backups_synced_at(self, compartment_id: str) -> Optional[float]:
+        """When the compartment's listing was last replaced (epoch seconds), if ever"""
+        with self._lock:
+            row = self._db.execute("SELECT synced_at FROM backup_syncs WHERE compartment_id = ?",
+                                   (compartment_id,)).fetchone()
+        return row[0] if row else None
+    
+    def upsert_jobs(self, jobs: Iterable[dict]):
+        """Add or refresh job records (job_id, type, compartment_id, instance_name or instance_id, status, start_time)"""
+        rows = [
+            (j["job_id"], j.get("compartment_id") or "", j.get("instance_name") or j.get("instance_id") or "",
+             j.get("type") or "", j.get("status") or "", _utc_iso(j.get("start_time")),
+             json.dumps({k: v for k, v in j.items() if k != "traceparent"}, default=str))
+            for j in jobs
+        ]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    
+    def remove_jobs(self, job_ids: Iterable[str]):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+    
+    def _page(
+        self,
+        table: str,
+        id_column: str,
+        sort_column: str,
+        sort: str,
+        order: str,
+        where: List[str],
+        params: list,
+        limit: int,
+        cursor: Optional[str]
+    ) -> dict:
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        where, params = list(where), list(params)
+        if cursor:
+            value, row_id = decode_cursor(cursor, sort, order)
+            op = '<' if order == 'desc' else '>'
+            if f"{sort_column} = ?" in where:
+                # Sort column pinned by a filter: seeking on the id alone keeps
+                # the planner on the sort index instead of a temp B-tree
+                where.append(f"{id_column} {op} ?")
+                params.append(row_id)
+            else:
+                where.append(f"({sort_column}, {id_column}) {op} (?, ?)")
+                params += [value, row_id]
+        # One row past the page tells whether another page exists
+        sql = (f"SELECT {sort_column}, {id_column}, data FROM {table} WHERE {' AND '.join(where)} "
+               f"ORDER BY {sort_column} {order}, {id_column} {order} LIMIT ?")
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit + 1]).fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(sort, order, rows[-1][0], rows[-1][1])
+        return {"items": [json.loads(row[2]) for row in rows], "next_cursor": next_cursor}
+    
+    def page_backups(
+        self,
+        compartment_id: str,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort: str = "created",
+        order: str = "desc",
+        backup_type: Optional[str] = None,
+        instance: Optional[str] = None,
+        state: Optional[str] = None,
+        min_size_gb: Optional[float] = None,
+        max_size_gb: Optional[float] = None,
+        min_age_days: Optional[float] = None,
+        max_age_days: Optional[float] = None
+    ) -> dict:
+        """
+        One page of a compartment's backups: {"items": [...], "next_cursor": str or None}.
+        
+        Filters combine with AND; ages are measured from now to each
+        backup's creation time. Pass the returned cursor, with the same
+        sort and order, to get the following page.
+        """
+        if sort not in BACKUP_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(BACKUP_SORTS)}")
+        where, params = ["compartment_id = ?"], [compartment_id]
+        for column, value in (("type", backup_type), ("instance_name", instance), ("state", state)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if min_size_gb is not None:
+            where.append("size_gb >= ?")
+            params.append(min_size_gb)
+        if max_size_gb is not None:
+            where.append("size_gb <= ?")
+            params.append(max_size_gb)
+        if min_age_days is not None:
+            where.append("created_at <= ?")
+            params.append(_age_cutoff(min_age_days))
+        if max_age_days is not None:
+            where.append("created_at >= ?")
+            params.append(_age_cutoff(max_age_days))
+        return self._page("backups", "backup_id", BACKUP_SORTS[sort], sort, order, where, params, limit, cursor)
+    
+    def page_jobs(
+        self,
+        compartment_id: str,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort: str = "started",
+        order: str = "desc",
+        job_type: Optional[str] = None,
+        instance: Optional[str] = None,
+        state: Optional[str] = None,
+        max_age_days: Optional[float] = None
+    ) -> dict:
+        """One page of a compartment's jobs, newest first by default; see page_backups"""
+        if sort not in JOB_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(JOB_SORTS)}")
+        where, params = ["compartment_id = ?"], [compartment_id]
+        for column, value in (("type", job_type), ("instance_name", instance), ("state", state)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if max_age_days is not None:
+            where.append("start_time >= ?")
+            params.append(_age_cutoff(max_age_days))
+        return self._page("jobs", "job_id", JOB_SORTS[sort], sort, order, where, params, limit, cursor)
+
+
+_indexes: Dict[str, ListingIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_listing_index(db_path: str = DEFAULT_INDEX_DB) -> ListingIndex:
+    """Process-wide index for a database file, opened on first use"""
+    with _indexes_lock:
+        if db_path not in _indexes:
+            _indexes[db_path] = ListingIndex(db_path)
+        return _indexes[db_path]
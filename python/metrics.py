@@ -0,0 +1,380 @@
+"""
+metrics.py - Prometheus metrics for the API, services and CLIs
+
+A small, dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format. The API serves it at
+/metrics; the CLIs write it to a textfile (for node_exporter's textfile
+collector) when run with --metrics-file. Values that already live
+elsewhere, like the AIMD limits or job tables, are read by collectors at
+scrape time instead of being copied on every change.
+"""
+import atexit
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+PREFIX = "oci_backup_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers single API calls through multi-minute backup waits
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0)
+
+DEFAULT_METRICS_FILE = os.environ.get("OCI_BACKUP_METRICS_FILE")
+
+# (labels, value) pairs produced by collectors; suffixed samples use a
+# "__name__" label ("_bucket", "_sum", ...) appended to the family name
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def set(self, value: float):
+        with self._lock:
+            self.value = float(value)
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+    
+    @contextmanager
+    def track_inprogress(self):
+        """Count the enclosed block while it runs"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+    
+    @contextmanager
+    def time(self):
+        """Observe the wall time of the enclosed block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Metric:
+    """
+    A metric family with optional labels.
+    
+    Labelled metrics hand out one child per label combination through
+    labels(); unlabelled metrics forward inc/set/observe to their only child.
+    """
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values, **labels):
+        """Child for one combination of label values (positional or by name)"""
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+    
+    def _children_items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+    
+    def samples(self) -> List[Sample]:
+        return [({**dict(zip(self.labelnames, key)), "__name__": "_total"}, child.value)
+                for key, child in self._children_items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def set(self, value: float):
+        self._default.set(value)
+    
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+    
+    def track_inprogress(self):
+        return self._default.track_inprogress()
+    
+    def samples(self) -> List[Sample]:
+        return [(dict(zip(self.labelnames, key)), child.value) for key, child in self._children_items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self._default.observe(value)
+    
+    def time(self):
+        return self._default.time()
+    
+    def samples(self) -> List[Sample]:
+        samples = []
+        for key, child in self._children_items():
+            labels = dict(zip(self.labelnames, key))
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(({**labels, "le": _format_value(bound), "__name__": "_bucket"}, cumulative))
+            samples.append(({**labels, "__name__": "_sum"}, total))
+            samples.append(({**labels, "__name__": "_count"}, cumulative))
+        return samples
+
+
+# A collector returns (name, kind, documentation, samples) families at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric: Metric) -> Metric:
+        """Add ``metric``, or return the already registered one of the same name and type"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def register_collector(self, name: str, collector: Collector):
+        """Add or replace the collector registered under ``name``"""
+        with self._lock:
+            self._collectors[name] = collector
+    
+    def unregister_collector(self, name: str):
+        with self._lock:
+            self._collectors.pop(name, None)
+    
+    def collect(self) -> Iterable[Tuple[str, str, str, List[Sample]]]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        for metric in metrics:
+            yield metric.name, metric.kind, metric.documentation, metric.samples()
+        for name, collector in collectors:
+            try:
+                yield from collector()
+            except Exception as e:
+                # One broken collector must not take the whole scrape down
+                logging.warning("Metrics collector %s failed: %s", name, e)
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, kind, documentation, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                suffix = labels.pop("__name__", "")
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+    
+    def write_textfile(self, path: str):
+        """Atomically write the rendered metrics, e.g. for node_exporter's textfile collector"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Process-wide counter ``oci_backup_<name>_total``"""
+    return REGISTRY.register(Counter(PREFIX + name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    """Process-wide gauge ``oci_backup_<name>``"""
+    return REGISTRY.register(Gauge(PREFIX + name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Process-wide histogram ``oci_backup_<name>``"""
+    return REGISTRY.register(Histogram(PREFIX + name, documentation, labelnames, buckets))
+
+
+def register_collector(name: str, collector: Collector):
+    REGISTRY.register_collector(name, collector)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# Shared by everything that caches: hit rate = hit / (hit + miss) per cache
+CACHE_REQUESTS = counter("cache_requests", "Cache lookups by cache and result (hit or miss)", ["cache", "result"])
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+WORK_QUEUED = gauge("work_queue_depth", "Tasks submitted to a worker pool but not started", ["pool"])
+WORK_BUSY = gauge("workers_busy", "Workers of a pool currently running a task", ["pool"])
+WORK_CAPACITY = gauge("workers_capacity", "Maximum concurrent workers of a pool", ["pool"])
+WORK_SECONDS = histogram("work_duration_seconds", "Run time of tasks executed on a worker pool", ["pool"],
+                         buckets=JOB_BUCKETS)
+
+
+class WorkTracker:
+    """
+    Queue depth and utilization of a worker pool.
+    
+    Wrap callables with track() before submitting them; busy / capacity
+    is the pool's utilization.
+    """
+    
+    def __init__(self, pool: str, capacity: int):
+        self.queued = WORK_QUEUED.labels(pool)
+        self.busy = WORK_BUSY.labels(pool)
+        self.seconds = WORK_SECONDS.labels(pool)
+        WORK_CAPACITY.labels(pool).set(capacity)
+    
+    def track(self, fn: Callable, *args, **kwargs) -> Callable[[], object]:
+        """Mark a task queued now; the returned callable runs it as busy"""
+        self.queued.inc()
+        
+        def run():
+            self.queued.dec()
+            with self.busy.track_inprogress(), self.seconds.time():
+                return fn(*args, **kwargs)
+        
+        return run
+
+
+def add_metrics_arguments(parser):
+    """--metrics-file option shared by the CLIs"""
+    parser.add_argument("--metrics-file", default=DEFAULT_METRICS_FILE,
+                        help="Write Prometheus metrics to this file on exit "
+                             "(default: $OCI_BACKUP_METRICS_FILE)")
+
+
+def write_on_exit(path: Optional[str]):
+    """Write the registry to ``path`` when the process exits, including on errors"""
+    if not path:
+        return
+    
+    def write():
+        try:
+            REGISTRY.write_textfile(path)
+        except OSError as e:
+            logging.warning("Could not write metrics to %s: %s", path, e)
+    
+    atexit.register(write)
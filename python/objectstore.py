@@ -0,0 +1,260 @@
+"""
+objectstore.py - Object Storage access for backup exports
+
+A small object-store interface covering what the export, dedupe and
+restore pipelines need (objects, ranged reads, multipart uploads), with an
+OCI Object Storage implementation and a local directory stand-in so the
+pipelines can be exercised and benchmarked offline.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Bucket names follow terraform/storage.tf ("<prefix>-backup-storage", ...)
+DEFAULT_BACKUP_BUCKET = os.environ.get("OCI_BACKUP_STORAGE_BUCKET", "example-style-backup-backup-storage")
+DEFAULT_METADATA_BUCKET = os.environ.get("OCI_BACKUP_METADATA_BUCKET", "example-style-backup-metadata")
+
+
+class ObjectStore:
+    """Operations the backup data pipelines use; see subclasses"""
+    
+    def put_object(self, name: str, data: bytes):
+        raise NotImplementedError
+    
+    def get_object(self, name: str, byte_range: Optional[Tuple[int, int]] = None) -> bytes:
+        """Object contents, or ``byte_range`` = (start, end) inclusive"""
+        raise NotImplementedError
+    
+    def head_object(self, name: str) -> Optional[int]:
+        """Object size in bytes, or None if it does not exist"""
+        raise NotImplementedError
+    
+    def list_objects(self, prefix: str = "") -> List[str]:
+        raise NotImplementedError
+    
+    def delete_object(self, name: str):
+        raise NotImplementedError
+    
+    def create_multipart_upload(self, name: str) -> str:
+        """Start a multipart upload and return its upload id"""
+        raise NotImplementedError
+    
+    def upload_part(self, name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Upload one part (numbered from 1) and return its ETag"""
+        raise NotImplementedError
+    
+    def list_parts(self, name: str, upload_id: str) -> Dict[int, str]:
+        """Parts already uploaded: part number -> ETag"""
+        raise NotImplementedError
+    
+    def commit_multipart_upload(self, name: str, upload_id: str, parts: Dict[int, str]):
+        raise NotImplementedError
+    
+    def abort_multipart_upload(self, name: str, upload_id: str):
+        raise NotImplementedError
+
+
+class OCIObjectStore(ObjectStore):
+    """One OCI Object Storage bucket"""
+    
+    def __init__(self, client, namespace: str, bucket: str):
+        self.client = client
+        self.namespace = namespace
+        self.bucket = bucket
+    
+    @classmethod
+    def from_pool(cls, pool, bucket: str, region: Optional[str] = None) -> 'OCIObjectStore':
+        """Store backed by a pooled (throttled, retrying) Object Storage client"""
+        import oci
+        client = pool.get(oci.object_storage.ObjectStorageClient, region)
+        return cls(client, client.get_namespace().data, bucket)
+    
+    def put_object(self, name: str, data: bytes):
+        self.client.put_object(self.namespace, self.bucket, name, data)
+    
+    def get_object(self, name: str, byte_range: Optional[Tuple[int, int]] = None) -> bytes:
+        kwargs = {"range": f"bytes={byte_range[0]}-{byte_range[1]}"} if byte_range else {}
+        return self.client.get_object(self.namespace, self.bucket, name, **kwargs).data.content
+    
+    def head_object(self, name: str) -> Optional[int]:
+        try:
+            response = self.client.head_object(self.namespace, self.bucket, name)
+        except Exception as e:
+            if getattr(e, "status", None) == 404:
+                return None
+            raise
+        return int(response.headers["content-length"])
+    
+    def list_objects(self, prefix: str = "") -> List[str]:
+        names, start = [], None
+        while True:
+            kwargs = {"prefix": prefix, "start": start} if start else {"prefix": prefix}
+            data = self.client.list_objects(self.namespace, self.bucket, **kwargs).data
+            names.extend(o.name for o in data.objects)
+            start = data.next_start_with
+            if not start:
+                return names
+    
+    def delete_object(self, name: str):
+        self.client.delete_object(self.namespace, self.bucket, name)
+    
+    def create_multipart_upload(self, name: str) -> str:
+        import oci
+        details = oci.object_storage.models.CreateMultipartUploadDetails(object=name)
+        return self.client.create_multipart_upload(self.namespace, self.bucket, details).data.upload_id
+    
+    def upload_part(self, name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        response = self.client.upload_part(self.namespace, self.bucket, name, upload_id, part_number, data)
+        return response.headers["etag"]
+    
+    def list_parts(self, name: str, upload_id: str) -> Dict[int, str]:
+        import oci
+        parts = oci.pagination.list_call_get_all_results(
+            self.client.list_multipart_upload_parts, self.namespace, self.bucket, name, upload_id
+        ).data
+        return {p.part_number: p.etag for p in parts}
+    
+    def commit_multipart_upload(self, name: str, upload_id: str, parts: Dict[int, str]):
+        import oci
+        details = oci.object_storage.models.CommitMultipartUploadDetails(parts_to_commit=[
+            oci.object_storage.models.CommitMultipartUploadPartDetails(part_num=n, etag=etag)
+            for n, etag in sorted(parts.items())
+        ])
+        self.client.commit_multipart_upload(self.namespace, self.bucket, name, upload_id, details)
+    
+    def abort_multipart_upload(self, name: str, upload_id: str):
+        self.client.abort_multipart_upload(self.namespace, self.bucket, name, upload_id)
+
+
+class LocalObjectStore(ObjectStore):
+    """
+    Directory-backed stand-in for a bucket.
+    
+    ``latency`` adds a fixed delay per request, which makes the benefit of
+    parallel parts and prefetching measurable without a network.
+    """
+    
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = root
+        self.latency = latency
+        self._objects = os.path.join(root, "objects")
+        self._uploads = os.path.join(root, "uploads")
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._uploads, exist_ok=True)
+    
+    def _request(self):
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def _path(self, name: str) -> str:
+        path = os.path.normpath(os.path.join(self._objects, name))
+        if not path.startswith(self._objects + os.sep):
+            raise ValueError(f"Invalid object name: {name}")
+        return path
+    
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def put_object(self, name: str, data: bytes):
+        self._request()
+        self._write(self._path(name), data)
+    
+    def get_object(self, name: str, byte_range: Optional[Tuple[int, int]] = None) -> bytes:
+        self._request()
+        try:
+            with open(self._path(name), "rb") as f:
+                if byte_range is None:
+                    return f.read()
+                f.seek(byte_range[0])
+                return f.read(byte_range[1] - byte_range[0] + 1)
+        except FileNotFoundError:
+            raise KeyError(f"Object {name} not found")
+    
+    def head_object(self, name: str) -> Optional[int]:
+        self._request()
+        try:
+            return os.path.getsize(self._path(name))
+        except FileNotFoundError:
+            return None
+    
+    def list_objects(self, prefix: str = "") -> List[str]:
+        self._request()
+        names = []
+        for directory, _, files in os.walk(self._objects):
+            for filename in files:
+                if filename.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(os.path.join(directory, filename), self._objects).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    names.append(name)
+        return sorted(names)
+    
+    def delete_object(self, name: str):
+        self._request()
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            raise KeyError(f"Object {name} not found")
+    
+    def _upload_dir(self, upload_id: str) -> str:
+        path = os.path.join(self._uploads, upload_id)
+        if not os.path.isdir(path):
+            raise KeyError(f"Multipart upload {upload_id} not found")
+        return path
+    
+    def create_multipart_upload(self, name: str) -> str:
+        self._request()
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self._uploads, upload_id)
+        os.makedirs(path)
+        with open(os.path.join(path, "upload.json"), "w") as f:
+            json.dump({"object": name}, f)
+        return upload_id
+    
+    def upload_part(self, name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        self._request()
+        path = os.path.join(self._upload_dir(upload_id), f"part-{part_number:05d}")
+        self._write(path, data)
+        return hashlib.md5(data).hexdigest()
+    
+    def list_parts(self, name: str, upload_id: str) -> Dict[int, str]:
+        self._request()
+        parts = {}
+        directory = self._upload_dir(upload_id)
+        for filename in os.listdir(directory):
+            if filename.startswith("part-") and not filename.endswith(".tmp"):
+                with open(os.path.join(directory, filename), "rb") as f:
+                    parts[int(filename[5:])] = hashlib.md5(f.read()).hexdigest()
+        return parts
+    
+    def commit_multipart_upload(self, name: str, upload_id: str, parts: Dict[int, str]):
+        self._request()
+        directory = self._upload_dir(upload_id)
+        uploaded = self.list_parts(name, upload_id)
+        for number, etag in parts.items():
+            if uploaded.get(number) != etag:
+                raise ValueError(f"Part {number} missing or ETag mismatch")
+        target = self._path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{upload_id}.tmp"
+        with open(tmp_path, "wb") as out:
+            for number in sorted(parts):
+                with open(os.path.join(directory, f"part-{number:05d}"), "rb") as part:
+                    shutil.copyfileobj(part, out, 1024 * 1024)
+        os.replace(tmp_path, target)
+        shutil.rmtree(directory)
+    
+    def abort_multipart_upload(self, name: str, upload_id: str):
+        self._request()
+        shutil.rmtree(self._upload_dir(upload_id))
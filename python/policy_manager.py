@@ -7,14 +7,29 @@ Demonstrates enterprise-grade policy automation.
 """
 import json
 import logging
-from datetime import datetime, timedelta
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
-import oci
+from lazy import oci
+
+import metrics
+import profiling
+from clients import DEFAULT_REGIONS, get_client_pool, iter_regions, parse_regions
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
+RETENTION_DELETIONS = metrics.counter(
+    "retention_deletions", "Expired backups removed by retention enforcement", ["kind", "outcome"]
+)
+RETENTION_SECONDS = metrics.histogram(
+    "retention_enforcement_duration_seconds", "Time to enforce retention for one compartment",
+    buckets=metrics.JOB_BUCKETS
+)
+
 
 class BackupFrequency(Enum):
     """Backup schedule frequency options"""
@@ -77,17 +92,72 @@ class BackupPolicy:
         return cls(**data)
 
 
+class BulkMode(Enum):
+    """How a bulk import treats existing policies"""
+    CREATE = "create"    # Every policy must be new
+    UPDATE = "update"    # Every policy must exist; entries are partial updates
+    UPSERT = "upsert"    # Create missing policies, update existing ones
+
+
+# Scalar fields checked before building a policy from untrusted input
+_POLICY_FIELD_TYPES = {
+    'policy_id': str,
+    'name': str,
+    'description': str,
+    'retention_days': int,
+    'enabled': bool,
+    'schedule': str,
+    'validate_backups': bool,
+    'encrypt_backups': bool,
+    'immutable_backups': bool,
+}
+
+
+def parse_policy(data: dict) -> BackupPolicy:
+    """Build a policy from untrusted input, raising ValueError on bad data"""
+    data = dict(data)
+    for field_name, field_type in _POLICY_FIELD_TYPES.items():
+        value = data.get(field_name)
+        if value is None:
+            continue
+        # bool is an int subclass; a retention of true days is not valid
+        if not isinstance(value, field_type) or (field_type is int and isinstance(value, bool)):
+            raise ValueError(f"{field_name} must be of type {field_type.__name__}")
+    targets = data.get('target_compartments')
+    if targets is not None and not (isinstance(targets, list) and all(isinstance(t, str) for t in targets)):
+        raise ValueError("target_compartments must be a list of strings")
+    tags = data.get('target_tags')
+    if tags is not None and not (isinstance(tags, dict) and all(isinstance(v, str) for v in tags.values())):
+        raise ValueError("target_tags must map tag names to strings")
+    if 'retention_days' in data and data['retention_days'] is None:
+        raise ValueError("retention_days is required")
+    try:
+        policy = BackupPolicy.from_dict(data)
+    except TypeError as e:
+        raise ValueError(f"Invalid policy fields: {e}")
+    except KeyError as e:
+        raise ValueError(f"Missing required field: {e}")
+    if not policy.policy_id:
+        raise ValueError("policy_id is required")
+    if policy.retention_days < 1 and policy.retention_class != RetentionClass.PERMANENT:
+        raise ValueError("retention_days must be >= 1 for non-permanent policies")
+    return policy
+
+
 class PolicyManager:
     """Manages backup policies and enforcement"""
     
     def __init__(self, config_path: str = "/etc/oci-backup/policies.json"):
         self.config_path = config_path
         self.policies: Dict[str, BackupPolicy] = {}
+        # Bumped on every load and save so readers can tell the set changed
+        self.revision = 0
         self.load_policies()
         logging.info("PolicyManager initialized with %d policies", len(self.policies))
     
     def load_policies(self):
         """Load policies from configuration file"""
+        self.revision += 1
         try:
             with open(self.config_path, 'r') as f:
                 data = json.load(f)
@@ -104,13 +174,23 @@ class PolicyManager:
     
     def save_policies(self):
         """Save policies to configuration file"""
+        self.revision += 1
         try:
             data = {
                 'policies': [p.to_dict() for p in self.policies.values()],
                 'last_updated': datetime.utcnow().isoformat()
             }
-            with open(self.config_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Write to a temp file and swap it in so a crash never leaves
+            # a half-written policy file behind
+            directory = os.path.dirname(os.path.abspath(self.config_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".policies-", suffix=".json")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.config_path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
             logging.info("Saved %d policies to %s", len(self.policies), self.config_path)
         except Exception as e:
             logging.error("Error saving policies: %s", e)
@@ -141,6 +221,101 @@ class PolicyManager:
         logging.info("Updated policy: %s", policy_id)
         return policy
     
+    def bulk_apply(self, entries: List[dict], mode: BulkMode = BulkMode.UPSERT) -> dict:
+        """
+        Create and/or update many policies in one transaction.
+        
+        Every entry is validated against the current policy set before
+        anything changes. If all entries are valid they are applied and the
+        policy file is written once; otherwise nothing is applied. Returns
+        per-item results in input order.
+        """
+        staged: Dict[str, BackupPolicy] = {}
+        results = []
+        now = datetime.utcnow().isoformat()
+        
+        for index, entry in enumerate(entries):
+            policy_id = entry.get('policy_id') if isinstance(entry, dict) else None
+            result = {"index": index, "policy_id": policy_id, "action": None, "status": "ok", "error": None}
+            results.append(result)
+            try:
+                if not policy_id:
+                    raise ValueError("policy_id is required")
+                if policy_id in staged:
+                    raise ValueError(f"Policy {policy_id} appears more than once")
+                
+                existing = self.policies.get(policy_id)
+                if existing is None:
+                    if mode == BulkMode.UPDATE:
+                        raise ValueError(f"Policy {policy_id} not found")
+                    policy = parse_policy(entry)
+                    policy.created_at = policy.updated_at = now
+                    result["action"] = "created"
+                else:
+                    if mode == BulkMode.CREATE:
+                        raise ValueError(f"Policy {policy_id} already exists")
+                    unknown = set(entry) - set(existing.to_dict())
+                    if unknown:
+                        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+                    merged = existing.to_dict()
+                    merged.update(entry)
+                    merged['created_at'] = existing.created_at
+                    merged['updated_at'] = now
+                    policy = parse_policy(merged)
+                    result["action"] = "updated"
+                
+                staged[policy_id] = policy
+            except ValueError as e:
+                result["status"] = "error"
+                result["error"] = str(e)
+        
+        failed = sum(1 for r in results if r["status"] == "error")
+        if failed == 0 and staged:
+            previous = dict(self.policies)
+            self.policies.update(staged)
+            try:
+                self.save_policies()
+            except Exception:
+                self.policies = previous
+                raise
+            logging.info("Bulk %s applied %d policies", mode.value, len(staged))
+        elif failed:
+            logging.warning("Bulk %s rejected: %d of %d entries invalid", mode.value, failed, len(entries))
+        
+        return {
+            "mode": mode.value,
+            "applied": failed == 0,
+            "total": len(entries),
+            "succeeded": len(staged) if failed == 0 else 0,
+            "failed": failed,
+            "results": results
+        }
+    
+    def bulk_assign(
+        self,
+        policy_ids: List[str],
+        target_compartments: Optional[List[str]] = None,
+        target_tags: Optional[Dict[str, str]] = None
+    ) -> dict:
+        """Add compartments and tags to the targets of many policies at once"""
+        entries = []
+        for policy_id in policy_ids:
+            policy = self.policies.get(policy_id)
+            if policy is None:
+                # Reported as "not found" by the update path
+                entries.append({"policy_id": policy_id})
+                continue
+            compartments = list(policy.target_compartments)
+            compartments.extend(c for c in (target_compartments or []) if c not in compartments)
+            tags = dict(policy.target_tags)
+            tags.update(target_tags or {})
+            entries.append({
+                "policy_id": policy_id,
+                "target_compartments": compartments,
+                "target_tags": tags
+            })
+        return self.bulk_apply(entries, BulkMode.UPDATE)
+    
     def delete_policy(self, policy_id: str):
         """Delete a policy"""
         if policy_id not in self.policies:
@@ -189,75 +364,187 @@ class PolicyManager:
         }
         return retention_map.get(retention_class, 30)
     
-    def enforce_retention(self, compartment_id: str, profile: str = None):
-        """Enforce retention policies by cleaning up old backups"""
+    def enforce_retention(
+        self,
+        compartment_id: str,
+        profile: str = None,
+        policies: Optional[List[BackupPolicy]] = None,
+        block_storage=None
+    ) -> int:
+        """
+        Enforce retention policies by cleaning up old backups.
+        
+        ``policies`` defaults to the policies targeting the compartment.
+        Returns the number of backups deleted.
+        """
+        total_deleted = 0
+        started = time.perf_counter()
         try:
             # Load OCI clients
-            if profile:
-                config = oci.config.from_file(profile_name=profile)
-                signer = None
-            else:
-                try:
-                    signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-                    config = {}
-                except Exception:
-                    config = oci.config.from_file()
-                    signer = None
-            
-            block_storage = oci.core.BlockstorageClient(config, signer=signer)
+            if block_storage is None:
+                pool = get_client_pool(profile, instance_principals_first=True)
+                block_storage = pool.get(oci.core.BlockstorageClient)
             
             # Get policies for this compartment
-            policies = self.get_policies_for_compartment(compartment_id)
+            if policies is None:
+                policies = self.get_policies_for_compartment(compartment_id)
             logging.info("Enforcing retention for %d policies", len(policies))
-            
             for policy in policies:
                 if policy.retention_class == RetentionClass.PERMANENT:
                     logging.info("Skipping retention for permanent policy: %s", policy.name)
-                    continue
-                
-                retention_days = policy.retention_days
-                cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
-                
-                # List backups older than retention period
-                boot_backups = block_storage.list_boot_volume_backups(
-                    compartment_id=compartment_id
-                ).data
-                
-                volume_backups = block_storage.list_volume_backups(
-                    compartment_id=compartment_id
-                ).data
-                
+            policies = [p for p in policies if p.retention_class != RetentionClass.PERMANENT]
+            if not policies:
+                return 0
+            
+            # List every backup once, across all pages; each policy then
+            # works on what earlier policies left behind
+            boot_backups = oci.pagination.list_call_get_all_results(
+                block_storage.list_boot_volume_backups,
+                compartment_id=compartment_id
+            ).data
+            volume_backups = oci.pagination.list_call_get_all_results(
+                block_storage.list_volume_backups,
+                compartment_id=compartment_id
+            ).data
+            
+            for policy in policies:
+                # The SDK returns tz-aware UTC times
+                cutoff_date = datetime.now(timezone.utc) - timedelta(days=policy.retention_days)
                 deleted_count = 0
                 
                 # Delete old boot volume backups
+                kept = []
                 for backup in boot_backups:
                     backup_date = backup.time_created
-                    if backup_date < cutoff_date:
-                        try:
-                            block_storage.delete_boot_volume_backup(backup.id)
-                            logging.info("Deleted old boot backup: %s (created: %s)", 
-                                       backup.id, backup_date)
-                            deleted_count += 1
-                        except Exception as e:
-                            logging.error("Failed to delete boot backup %s: %s", backup.id, e)
+                    if backup_date < cutoff_date and self._delete_backup(
+                            block_storage.delete_boot_volume_backup, backup.id, "boot"):
+                        logging.info("Deleted old boot backup: %s (created: %s)", 
+                                   backup.id, backup_date)
+                        deleted_count += 1
+                    else:
+                        kept.append(backup)
+                boot_backups = kept
                 
                 # Delete old volume backups
+                kept = []
                 for backup in volume_backups:
                     backup_date = backup.time_created
-                    if backup_date < cutoff_date:
-                        try:
-                            block_storage.delete_volume_backup(backup.id)
-                            logging.info("Deleted old volume backup: %s (created: %s)", 
-                                       backup.id, backup_date)
-                            deleted_count += 1
-                        except Exception as e:
-                            logging.error("Failed to delete volume backup %s: %s", backup.id, e)
+                    if backup_date < cutoff_date and self._delete_backup(
+                            block_storage.delete_volume_backup, backup.id, "volume"):
+                        logging.info("Deleted old volume backup: %s (created: %s)", 
+                                   backup.id, backup_date)
+                        deleted_count += 1
+                    else:
+                        kept.append(backup)
+                volume_backups = kept
                 
                 logging.info("Policy %s: Deleted %d old backups", policy.name, deleted_count)
+                total_deleted += deleted_count
             
         except Exception as e:
             logging.error("Error enforcing retention: %s", e)
             raise
+        finally:
+            RETENTION_SECONDS.observe(time.perf_counter() - started)
+        
+        return total_deleted
+    
+    @staticmethod
+    def _delete_backup(delete, backup_id: str, label: str) -> bool:
+        """
+        Delete one backup, returning True once it is gone.
+        
+        Pooled clients already retry transient errors. A 404 on a retried
+        delete means an earlier attempt went through, so it counts as deleted.
+        """
+        try:
+            delete(backup_id)
+            RETENTION_DELETIONS.labels(label, "deleted").inc()
+            return True
+        except Exception as e:
+            if getattr(e, "status", None) == 404:
+                logging.info("%s backup %s already deleted", label.capitalize(), backup_id)
+                RETENTION_DELETIONS.labels(label, "already_deleted").inc()
+                return True
+            logging.error("Failed to delete %s backup %s: %s", label, backup_id, e)
+            RETENTION_DELETIONS.labels(label, "failed").inc()
+            return False
+    
+    def enforce_retention_tree(
+        self,
+        root_compartment_id: str,
+        profile: str = None,
+        max_workers: int = 8,
+        region: str = None,
+        inherit: bool = False
+    ) -> List[dict]:
+        """
+        Enforce retention across a compartment and all nested compartments.
+        
+        Each compartment is enforced with its own policies only. With
+        ``inherit``, compartments that have no policy of their own use the
+        root's policies instead. Returns a per-compartment summary with
+        deleted counts and timings.
+        """
+        from compartments import discover_compartments, fan_out
+        
+        pool = get_client_pool(profile, instance_principals_first=True)
+        block_storage = pool.get(oci.core.BlockstorageClient, region)
+        identity = pool.get(oci.identity.IdentityClient, region)
+        
+        inherited = self.get_policies_for_compartment(root_compartment_id) if inherit else []
+        
+        def enforce(node) -> int:
+            # Never merge policy sets: the shortest retention would win
+            policies = None
+            if inherit and not self.get_policies_for_compartment(node.id):
+                policies = inherited
+            return self.enforce_retention(node.id, policies=policies, block_storage=block_storage)
+        
+        compartments = discover_compartments(identity, root_compartment_id, max_workers)
+        runs = fan_out(compartments, enforce, max_workers)
+        summaries = []
+        for run in runs:
+            summary = run.summary()
+            summary["deleted"] = run.result or 0
+            summary["region"] = region
+            summaries.append(summary)
+        return summaries
+    
+    def enforce_retention_regions(
+        self,
+        compartment_id: str,
+        regions: List[str],
+        profile: str = None,
+        subtree: bool = False,
+        max_workers: int = 8,
+        inherit: bool = False
+    ) -> List[dict]:
+        """
+        Enforce retention for a compartment (or subtree) in several regions concurrently.
+        
+        Returns one summary per compartment and region, tagged with its region.
+        """
+        pool = get_client_pool(profile, instance_principals_first=True)
+        
+        def enforce(region: str) -> List[dict]:
+            if subtree:
+                return self.enforce_retention_tree(compartment_id, profile, max_workers, region, inherit)
+            block_storage = pool.get(oci.core.BlockstorageClient, region)
+            deleted = self.enforce_retention(compartment_id, block_storage=block_storage)
+            return [{"compartment_id": compartment_id, "name": compartment_id,
+                     "status": "completed", "deleted": deleted, "region": region}]
+        
+        summaries = []
+        for run in iter_regions(regions, enforce):
+            if run.status == "failed":
+                summaries.append({"compartment_id": compartment_id, "name": compartment_id, "deleted": 0,
+                                  **run.summary()})
+                continue
+            for summary in run.result:
+                summary.setdefault("duration_seconds", run.duration_seconds)
+                summaries.append(summary)
+        return summaries
 
 
 def create_default_policies() -> List[BackupPolicy]:
@@ -326,18 +613,33 @@ def create_default_policies() -> List[BackupPolicy]:
     return policies
 
 
-def main():
+def main(argv=None):
     """CLI for policy management"""
     import argparse
     
     parser = argparse.ArgumentParser(description="OCI Backup Policy Manager")
-    parser.add_argument("action", choices=["list", "create-defaults", "enforce", "show"],
+    parser.add_argument("action", choices=["list", "create-defaults", "enforce", "show", "import"],
                        help="Action to perform")
     parser.add_argument("--policy-id", help="Policy ID for show action")
+    parser.add_argument("--file", help="JSON file of policies for import action")
+    parser.add_argument("--mode", choices=[m.value for m in BulkMode], default=BulkMode.UPSERT.value,
+                       help="Import mode: create, update or upsert (default)")
     parser.add_argument("--compartment", help="Compartment ID for enforce action")
+    parser.add_argument("--subtree", action="store_true",
+                       help="Enforce across all nested compartments")
+    parser.add_argument("--inherit-root-policies", action="store_true",
+                       help="In subtree mode, apply the root's policies to compartments without policies of their own")
+    parser.add_argument("--max-workers", type=int, default=8,
+                       help="Compartments processed concurrently in subtree mode")
+    parser.add_argument("--regions", default=DEFAULT_REGIONS,
+                       help="Comma-separated regions to enforce in concurrently (default: config region)")
     parser.add_argument("--profile", help="OCI config profile")
+    metrics.add_metrics_arguments(parser)
+    profiling.add_profile_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    metrics.write_on_exit(args.metrics_file)
+    profiling.profile_until_exit(args.profile_out)
     
     manager = PolicyManager()
     
@@ -384,14 +686,55 @@ def main():
         print(f"{'='*80}\n")
         print(json.dumps(policy.to_dict(), indent=2))
     
+    elif args.action == "import":
+        if not args.file:
+            print("Error: --file required for import action")
+            return
+        
+        with open(args.file, 'r') as f:
+            data = json.load(f)
+        entries = data.get('policies', []) if isinstance(data, dict) else data
+        
+        outcome = manager.bulk_apply(entries, BulkMode(args.mode))
+        for result in outcome['results']:
+            if result['status'] == "ok":
+                print(f"✅ {result['policy_id']}: {result['action']}")
+            else:
+                print(f"❌ {result['policy_id'] or '#' + str(result['index'])}: {result['error']}")
+        
+        if outcome['applied']:
+            print(f"\n{outcome['succeeded']} policies imported ({args.mode}).")
+        else:
+            print(f"\nImport rejected: {outcome['failed']} of {outcome['total']} entries invalid. No changes applied.")
+    
     elif args.action == "enforce":
         if not args.compartment:
             print("Error: --compartment required for enforce action")
             return
         
-        print(f"Enforcing retention policies for compartment: {args.compartment}")
-        manager.enforce_retention(args.compartment, args.profile)
-        print("✅ Retention enforcement complete")
+        regions = parse_regions(args.regions)
+        if args.subtree or regions:
+            scope = "compartment tree" if args.subtree else "compartment"
+            print(f"Enforcing retention policies for {scope}: {args.compartment}")
+            if regions:
+                summaries = manager.enforce_retention_regions(
+                    args.compartment, regions, args.profile, args.subtree, args.max_workers,
+                    args.inherit_root_policies
+                )
+            else:
+                summaries = manager.enforce_retention_tree(
+                    args.compartment, args.profile, args.max_workers, inherit=args.inherit_root_policies
+                )
+            for summary in summaries:
+                marker = "❌" if summary['status'] == "failed" else "✅"
+                where = f"[{summary['region']}] " if summary.get('region') else ""
+                print(f"  {marker} {where}{summary['name']}: deleted {summary['deleted']} "
+                      f"in {summary['duration_seconds']:.1f}s")
+            print(f"✅ Retention enforcement complete: {sum(s['deleted'] for s in summaries)} backups deleted")
+        else:
+            print(f"Enforcing retention policies for compartment: {args.compartment}")
+            manager.enforce_retention(args.compartment, args.profile)
+            print("✅ Retention enforcement complete")
 
 
 if __name__ == "__main__":
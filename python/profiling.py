@@ -0,0 +1,183 @@
+"""
+profiling.py - Opt-in sampling profiler with flamegraph output
+
+A background thread samples the Python stacks of running threads at a
+fixed interval and counts identical stacks. The result is written in the
+collapsed-stack format ("frame;frame;frame count") that flamegraph.pl,
+speedscope and inferno read directly. Nothing is installed or hooked
+unless a profile is running, so code paths pay no cost while profiling is
+off; while it runs, the cost is one stack walk per thread per interval,
+off the profiled threads.
+
+Used by the CLIs through --profile-out, and by the API for requests sent
+with an ``X-Profile`` header or ``profile=1`` query flag once a deployment
+opts in with OCI_BACKUP_PROFILING=on. Only the newest
+OCI_BACKUP_PROFILE_KEEP request profiles are kept on disk.
+"""
+import atexit
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_INTERVAL = float(os.environ.get("OCI_BACKUP_PROFILE_INTERVAL", "0.005"))
+DEFAULT_PROFILE_DIR = os.environ.get(
+    "OCI_BACKUP_PROFILE_DIR",
+    os.path.join(tempfile.gettempdir(), "oci-backup-profiles")
+)
+# Profiles triggered per request are off unless a deployment opts in
+PROFILING_ALLOWED = os.environ.get("OCI_BACKUP_PROFILING", "off").lower() in ("1", "on", "true", "yes")
+MAX_STORED_PROFILES = int(os.environ.get("OCI_BACKUP_PROFILE_KEEP", "50"))
+MAX_DEPTH = 128
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def is_requested(value: Optional[str]) -> bool:
+    """True for header or query values that ask for a profile"""
+    return (value or "").strip().lower() in _TRUE_VALUES
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples thread stacks until stopped.
+    
+    ``thread_ids`` limits sampling to those threads (e.g. the event loop
+    thread serving a request); by default every thread except the
+    sampler's own is sampled, each stack rooted at its thread name.
+    """
+    
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.duration = 0.0
+        self._labels = {}  # code object -> label; code objects are few and reused
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _collapse(self, frame) -> str:
+        labels = self._labels
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = _frame_label(code)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return ";".join(stack)
+    
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (self.thread_ids is not None and ident not in self.thread_ids):
+                continue
+            stack = self._collapse(frame)
+            if self.thread_ids is None:
+                stack = f"{names.get(ident, ident)};{stack}"
+            self.stacks[stack] += 1
+        self.samples += 1
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+    
+    def start(self) -> 'SamplingProfiler':
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> 'SamplingProfiler':
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.duration = time.monotonic() - self.started
+        return self
+    
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format, most frequent stack first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+    
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.collapsed())
+        os.replace(tmp_path, path)
+        logging.info("Wrote profile (%d samples over %.1fs) to %s", self.samples, self.duration, path)
+
+
+@contextmanager
+def profiled(path: Optional[str] = None, interval: float = DEFAULT_INTERVAL,
+             thread_ids: Optional[Iterable[int]] = None):
+    """Profile the enclosed block, writing collapsed stacks to ``path`` if given"""
+    profiler = SamplingProfiler(interval, thread_ids).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        if path:
+            profiler.write(path)
+
+
+def new_profile_path(profile_dir: str = DEFAULT_PROFILE_DIR) -> str:
+    """Unique file under ``profile_dir`` for one profiled request"""
+    return os.path.join(profile_dir, f"profile-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.folded")
+
+
+def prune_profiles(profile_dir: str = DEFAULT_PROFILE_DIR, keep: int = MAX_STORED_PROFILES) -> int:
+    """Delete all but the newest ``keep`` request profiles; returns how many were removed"""
+    try:
+        names = [name for name in os.listdir(profile_dir) if name.startswith("profile-") and name.endswith(".folded")]
+    except FileNotFoundError:
+        return 0
+    # Names start with their creation time, so they sort oldest first
+    stale = sorted(names)[:max(0, len(names) - keep)]
+    for name in stale:
+        try:
+            os.unlink(os.path.join(profile_dir, name))
+        except FileNotFoundError:
+            pass
+    return len(stale)
+
+
+def add_profile_arguments(parser):
+    """--profile-out option shared by the CLIs"""
+    parser.add_argument("--profile-out",
+                        help="Sample the run and write collapsed stacks (flamegraph input) to this file")
+
+
+def profile_until_exit(path: Optional[str], interval: float = DEFAULT_INTERVAL):
+    """Profile the rest of the process, writing ``path`` at exit; no-op without a path"""
+    if not path:
+        return None
+    profiler = SamplingProfiler(interval).start()
+    
+    def write():
+        profiler.stop()
+        try:
+            profiler.write(path)
+        except OSError as e:
+            logging.warning("Could not write profile to %s: %s", path, e)
+    
+    atexit.register(write)
+    return profiler
@@ -0,0 +1,206 @@
+"""
+report_diff.py - Compliance report snapshots and differential reports
+
+Persists a compact per-backup status vector for every validation run and
+computes what changed between two runs (newly failing, newly passing,
+new and deleted backups) without reloading full report details.
+"""
+import glob
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from dataclasses import dataclass, field
+
+from validator import ValidationCheck, ValidationResult, ValidationStatus
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get(
+    "OCI_BACKUP_SNAPSHOT_DIR",
+    os.path.expanduser("~/.oci-backup/snapshots")
+)
+
+# Status vector encoding: low 2 bits hold the overall status, the remaining
+# bits flag which checks failed (one bit per ValidationCheck, in enum order).
+# Keyed by value so results from validator.py run as __main__ encode too.
+_STATUS_CODES = {
+    ValidationStatus.PASSED.value: 0,
+    ValidationStatus.WARNING.value: 1,
+    ValidationStatus.FAILED.value: 2,
+    ValidationStatus.SKIPPED.value: 3,
+}
+_CODE_STATUS = {code: ValidationStatus(value) for value, code in _STATUS_CODES.items()}
+_CHECKS = [check.value for check in ValidationCheck]
+
+
+def encode_status(result: ValidationResult) -> int:
+    """Pack a validation result into a single status integer"""
+    mask = 0
+    for bit, check in enumerate(_CHECKS):
+        if result.checks.get(check, {}).get("status") == "failed":
+            mask |= 1 << bit
+    return _STATUS_CODES[result.overall_status.value] | (mask << 2)
+
+
+def decode_status(code: int) -> ValidationStatus:
+    """Overall status held in a packed status integer"""
+    return _CODE_STATUS[code & 0b11]
+
+
+def decode_failed_checks(code: int) -> List[str]:
+    """Names of the checks flagged as failed in a packed status integer"""
+    mask = code >> 2
+    return [check for bit, check in enumerate(_CHECKS) if mask & (1 << bit)]
+
+
+@dataclass
+class ReportSnapshot:
+    """Compact record of one validation run"""
+    snapshot_id: str
+    compartment_id: str
+    created_at: str = None
+    vector: Dict[str, int] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        if self.created_at is None:
+            self.created_at = datetime.utcnow().isoformat()
+    
+    def record(self, results: Iterable[ValidationResult]) -> Iterator[ValidationResult]:
+        """Record each result's status while passing it through unchanged"""
+        for result in results:
+            self.vector[result.backup_id] = encode_status(result)
+            yield result
+    
+    def to_dict(self) -> dict:
+        """Convert to a columnar dictionary for storage"""
+        return {
+            "snapshot_id": self.snapshot_id,
+            "compartment_id": self.compartment_id,
+            "created_at": self.created_at,
+            "backup_ids": list(self.vector.keys()),
+            "codes": list(self.vector.values())
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ReportSnapshot':
+        """Create snapshot from dictionary"""
+        return cls(
+            snapshot_id=data["snapshot_id"],
+            compartment_id=data["compartment_id"],
+            created_at=data["created_at"],
+            vector=dict(zip(data["backup_ids"], data["codes"]))
+        )
+
+
+class SnapshotStore:
+    """Filesystem store of report snapshots, grouped by compartment"""
+    
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+    
+    def _compartment_dir(self, compartment_id: str) -> str:
+        """Directory of a compartment's snapshots; ids come from API callers, so only plain names pass"""
+        if (not compartment_id or compartment_id in (".", "..") or "\0" in compartment_id
+                or os.path.basename(compartment_id) != compartment_id or "\\" in compartment_id):
+            raise ValueError(f"Invalid compartment id {compartment_id!r}")
+        return os.path.join(self.root, compartment_id)
+    
+    def save(self, snapshot: ReportSnapshot) -> str:
+        """Persist a snapshot and return its path"""
+        directory = self._compartment_dir(snapshot.compartment_id)
+        if os.path.basename(snapshot.snapshot_id) != snapshot.snapshot_id:
+            raise ValueError(f"Invalid snapshot id {snapshot.snapshot_id!r}")
+        os.makedirs(directory, exist_ok=True)
+        # Timestamp prefix keeps directory listings in run order
+        stamp = datetime.fromisoformat(snapshot.created_at).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(directory, f"{stamp}_{snapshot.snapshot_id}.json.gz")
+        with gzip.open(path, "wt") as f:
+            json.dump(snapshot.to_dict(), f, separators=(",", ":"))
+        logging.info("Saved report snapshot %s (%d backups)", snapshot.snapshot_id, len(snapshot.vector))
+        return path
+    
+    def _paths(self, compartment_id: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(glob.escape(self._compartment_dir(compartment_id)), "*.json.gz")))
+    
+    def list_snapshots(self, compartment_id: str) -> List[str]:
+        """Snapshot ids for a compartment, oldest first"""
+        return [
+            os.path.basename(p).split("_", 1)[1][:-len(".json.gz")]
+            for p in self._paths(compartment_id)
+        ]
+    
+    def load(self, compartment_id: str, snapshot_id: str) -> ReportSnapshot:
+        """Load a snapshot by id"""
+        for path in self._paths(compartment_id):
+            if path.endswith(f"_{snapshot_id}.json.gz"):
+                with gzip.open(path, "rt") as f:
+                    return ReportSnapshot.from_dict(json.load(f))
+        raise KeyError(f"Snapshot {snapshot_id} not found for {compartment_id}")
+    
+    def previous(self, compartment_id: str, snapshot_id: Optional[str] = None) -> Optional[str]:
+        """Id of the snapshot taken before ``snapshot_id`` (or the latest if None)"""
+        ids = self.list_snapshots(compartment_id)
+        if snapshot_id is None:
+            return ids[-1] if ids else None
+        if snapshot_id not in ids:
+            raise KeyError(f"Snapshot {snapshot_id} not found for {compartment_id}")
+        index = ids.index(snapshot_id)
+        return ids[index - 1] if index > 0 else None
+
+
+def diff_snapshots(baseline: ReportSnapshot, current: ReportSnapshot) -> dict:
+    """Compute what changed between two validation runs"""
+    base, curr = baseline.vector, current.vector
+    failed = _STATUS_CODES[ValidationStatus.FAILED.value]
+    passed = _STATUS_CODES[ValidationStatus.PASSED.value]
+    
+    newly_failing, newly_passing, status_changed = [], [], []
+    for backup_id in base.keys() & curr.keys():
+        before, after = base[backup_id], curr[backup_id]
+        if before == after:
+            continue
+        entry = {
+            "backup_id": backup_id,
+            "from": decode_status(before).value,
+            "to": decode_status(after).value,
+            "newly_failed_checks": decode_failed_checks(after & ~before & ~0b11),
+            "recovered_checks": decode_failed_checks(before & ~after & ~0b11)
+        }
+        before_status, after_status = before & 0b11, after & 0b11
+        if after_status == failed and before_status != failed:
+            newly_failing.append(entry)
+        elif after_status == passed and before_status != passed:
+            newly_passing.append(entry)
+        else:
+            status_changed.append(entry)
+    
+    new_backups = sorted(curr.keys() - base.keys())
+    deleted_backups = sorted(base.keys() - curr.keys())
+    
+    for entries in (newly_failing, newly_passing, status_changed):
+        entries.sort(key=lambda e: e["backup_id"])
+    
+    return {
+        "compartment_id": current.compartment_id,
+        "baseline": {"snapshot_id": baseline.snapshot_id, "created_at": baseline.created_at},
+        "current": {"snapshot_id": current.snapshot_id, "created_at": current.created_at},
+        "summary": {
+            "newly_failing": len(newly_failing),
+            "newly_passing": len(newly_passing),
+            "status_changed": len(status_changed),
+            "new_backups": len(new_backups),
+            "deleted_backups": len(deleted_backups)
+        },
+        "newly_failing": newly_failing,
+        "newly_passing": newly_passing,
+        "status_changed": status_changed,
+        "new_backups": [
+            {"backup_id": b, "status": decode_status(curr[b]).value} for b in new_backups
+        ],
+        "deleted_backups": [
+            {"backup_id": b, "last_status": decode_status(base[b]).value} for b in deleted_backups
+        ]
+    }
@@ -0,0 +1,375 @@
+"""
+resilience.py - Retries, backoff and circuit breaking for OCI API calls
+
+Wraps pooled OCI clients so transient failures (429, 5xx, dropped
+connections) are retried with decorrelated-jitter backoff that honors the
+service's retry-after hint. Retries draw from a per-endpoint budget so a
+degraded API is not amplified into a retry storm, and a per-endpoint
+circuit breaker fails calls fast while the endpoint is down.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import metrics
+import tracing
+from throttling import is_overload_status
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Create and attach operations that accept opc_retry_token; a token is
+# generated once per logical call so a retried call cannot produce a
+# duplicate resource or attachment
+RETRY_TOKEN_OPERATIONS = {
+    "create_boot_volume_backup",
+    "create_volume_backup",
+    "copy_boot_volume_backup",
+    "copy_volume_backup",
+    "create_boot_volume",
+    "create_volume",
+    "launch_instance",
+    "instance_action",
+    "attach_volume",
+    "attach_boot_volume",
+    "attach_vnic",
+    "capture_console_history",
+    "create_image",
+    "create_vcn",
+    "create_subnet",
+    "create_internet_gateway",
+    "create_route_table",
+    "create_security_list",
+}
+
+# Other operations with these prefixes are not idempotent: a call that timed
+# out or failed with a 5xx may still have taken effect, so they are only
+# retried when the service rejected them outright (429)
+_NON_IDEMPOTENT_PREFIXES = ("create_", "attach_", "launch_", "copy_", "capture_", "commit_", "instance_action")
+
+# Exception class names raised for connection-level failures (requests/oci)
+_CONNECTION_ERRORS = {"ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "RequestException"}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the service while an endpoint's circuit is open"""
+    
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit open for {endpoint}; retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """True for failures worth retrying: throttling, server errors, lost connections"""
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return is_overload_status(status)
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _CONNECTION_ERRORS for cls in type(exc).__mro__)
+
+
+def is_idempotent(operation: str) -> bool:
+    """True if repeating ``operation`` after an unknown outcome is safe"""
+    return operation in RETRY_TOKEN_OPERATIONS or not operation.startswith(_NON_IDEMPOTENT_PREFIXES)
+
+
+def request_id(exc: Exception) -> Optional[str]:
+    """opc-request-id of a failed call, for correlating with OCI support"""
+    rid = getattr(exc, "request_id", None)
+    if rid:
+        return rid
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        return headers.get("opc-request-id")
+    except AttributeError:
+        return None
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Seconds the service asked us to wait (retry-after header), if any"""
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    except AttributeError:
+        return None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a share of overall traffic.
+    
+    Every call deposits ``ratio`` tokens and every retry spends one, so
+    sustained failures can add at most ``ratio`` extra load on top of the
+    normal call rate (plus the initial ``capacity`` burst).
+    """
+    
+    def __init__(self, ratio: float = 0.2, capacity: float = 20):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.exhausted = 0
+        self._lock = threading.Lock()
+    
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+    
+    def withdraw(self) -> bool:
+        """Spend a token for one retry; False when the budget is exhausted"""
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one endpoint"""
+    
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"  # closed, open, half_open
+        self.failures = 0
+        self.opened = 0
+        self.last_error: Optional[str] = None
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(self.endpoint, remaining)
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                # Let a single trial call probe the endpoint
+                if self._trial_in_flight:
+                    raise CircuitOpenError(self.endpoint, 0.0)
+                self._trial_in_flight = True
+    
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logging.info("Circuit for %s closed", self.endpoint)
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+    
+    def record_failure(self, error: str):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self._trial_in_flight = False
+            if self.state == "half_open" or (
+                self.state == "closed" and self.failures >= self.failure_threshold
+            ):
+                self.state = "open"
+                self.opened += 1
+                self._opened_at = time.monotonic()
+                logging.warning("Circuit for %s opened after %d failures: %s",
+                                self.endpoint, self.failures, error)
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.opened,
+                "last_error": self.last_error
+            }
+
+
+class RetryPolicy:
+    """Retry with decorrelated-jitter backoff, a retry budget and a breaker"""
+    
+    def __init__(
+        self,
+        endpoint: str,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        sleep=time.sleep
+    ):
+        self.endpoint = endpoint
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker(endpoint)
+        self.retries = 0
+        self.gave_up = 0
+        self._sleep = sleep
+        self._lock = threading.Lock()
+    
+    def next_delay(self, previous: float) -> float:
+        """Decorrelated jitter: uniform between base and 3x the last delay, capped"""
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+    
+    def call(self, operation: str, func, *args, **kwargs):
+        """Call ``func`` with retries; ``operation`` names it in logs"""
+        if operation in RETRY_TOKEN_OPERATIONS:
+            kwargs.setdefault("opc_retry_token", uuid.uuid4().hex)
+        idempotent = is_idempotent(operation)
+        self.budget.deposit()
+        delay = self.base_delay
+        
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    # The endpoint answered; client errors say nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure(str(e))
+                if not idempotent and getattr(e, "status", None) != 429:
+                    logging.error("%s.%s failed and is not safe to retry (opc-request-id %s): %s",
+                                  self.endpoint, operation, request_id(e), e)
+                    raise
+                if attempt == self.max_attempts or not self.budget.withdraw():
+                    with self._lock:
+                        self.gave_up += 1
+                    logging.error("%s.%s failed after %d attempts (opc-request-id %s): %s",
+                                  self.endpoint, operation, attempt, request_id(e), e)
+                    raise
+                delay = self.next_delay(delay)
+                hinted = retry_after(e)
+                wait = min(self.max_delay, max(delay, hinted)) if hinted is not None else delay
+                with self._lock:
+                    self.retries += 1
+                tracing.current_span().add_event("retry", {
+                    "oci.operation": operation, "oci.attempt": attempt, "oci.retry_delay_s": round(wait, 3)
+                })
+                logging.warning("%s.%s attempt %d failed (opc-request-id %s): %s; retrying in %.2fs",
+                                self.endpoint, operation, attempt, request_id(e), e, wait)
+                self._sleep(wait)
+            else:
+                self.breaker.record_success()
+                return result
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = {"retries": self.retries, "gave_up": self.gave_up}
+        stats["retry_tokens"] = round(self.budget.tokens, 2)
+        stats["budget_exhausted"] = self.budget.exhausted
+        stats["circuit"] = self.breaker.snapshot()
+        return stats
+
+
+class ResilienceManager:
+    """Shared registry of per-endpoint retry policies"""
+    
+    def __init__(self, **policy_defaults):
+        self.policy_defaults = policy_defaults
+        self._policies: Dict[str, RetryPolicy] = {}
+        self._lock = threading.Lock()
+    
+    def policy(self, endpoint: str) -> RetryPolicy:
+        """Retry policy for an endpoint, created on first use"""
+        with self._lock:
+            if endpoint not in self._policies:
+                self._policies[endpoint] = RetryPolicy(endpoint, **self.policy_defaults)
+            return self._policies[endpoint]
+    
+    def wrap(self, client, endpoint: str):
+        """Wrap a client so every API call goes through the endpoint's retry policy"""
+        return ResilientClient(client, self.policy(endpoint))
+    
+    def snapshot(self) -> Dict[str, dict]:
+        """Retry and circuit state for every endpoint seen so far"""
+        with self._lock:
+            policies = dict(self._policies)
+        return {endpoint: policy.snapshot() for endpoint, policy in sorted(policies.items())}
+
+
+class ResilientClient:
+    """
+    Proxy for an OCI client that retries public method calls.
+    
+    Reads, updates and deletes are retried on any transient failure;
+    creates and attaches only with a retry token or after a 429.
+    """
+    
+    def __init__(self, client, policy: RetryPolicy):
+        self._client = client
+        self._policy = policy
+    
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        
+        policy = self._policy
+        
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return policy.call(name, attr, *args, **kwargs)
+        
+        return call
+    
+    def __repr__(self):
+        return f"ResilientClient({self._client!r}, endpoint={self._policy.endpoint!r})"
+
+
+_manager: Optional[ResilienceManager] = None
+_manager_lock = threading.Lock()
+
+_CIRCUIT_STATES = ("closed", "open", "half_open")
+
+
+def _collect_metrics():
+    """Scrape-time view of retries and circuit breakers per endpoint"""
+    if _manager is None:
+        return
+    snapshot = _manager.snapshot()
+    yield (metrics.PREFIX + "oci_retries", "counter", "OCI call attempts retried per endpoint",
+           [({"endpoint": e, "__name__": "_total"}, s["retries"]) for e, s in snapshot.items()])
+    yield (metrics.PREFIX + "oci_retries_exhausted", "counter", "OCI calls that failed after giving up retrying",
+           [({"endpoint": e, "__name__": "_total"}, s["gave_up"]) for e, s in snapshot.items()])
+    yield (metrics.PREFIX + "oci_retry_tokens", "gauge", "Retry budget tokens left per endpoint",
+           [({"endpoint": e}, s["retry_tokens"]) for e, s in snapshot.items()])
+    yield (metrics.PREFIX + "oci_circuit_state", "gauge", "1 for the current circuit breaker state per endpoint",
+           [({"endpoint": e, "state": state}, float(s["circuit"]["state"] == state))
+            for e, s in snapshot.items() for state in _CIRCUIT_STATES])
+
+
+metrics.register_collector("oci_resilience", _collect_metrics)
+
+
+def get_resilience() -> ResilienceManager:
+    """Process-wide resilience manager shared by all OCI clients"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ResilienceManager()
+        return _manager
@@ -5,54 +5,68 @@ restore.py - Restore OCI VM from backups (boot + block volumes)
 import argparse
 import logging
 from datetime import datetime
-import oci
+from lazy import oci
+
+import metrics
+import profiling
+from clients import get_client_pool
+from waiter import DEFAULT_POLL_INTERVAL, wait_for_backups
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
-def load_clients(profile=None):
-    try:
-        config = oci.config.from_file(profile_name=profile) if profile else oci.config.from_file()
-        signer = None
-    except Exception:
-        signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-        config = {}
-    compute = oci.core.ComputeClient(config, signer=signer)
-    block = oci.core.BlockstorageClient(config, signer=signer)
+RESTORE_STAGE_SECONDS = metrics.histogram(
+    "restore_stage_duration_seconds", "Time spent in each stage of an instance restore", ["stage"],
+    buckets=metrics.JOB_BUCKETS
+)
+RESTORE_SECONDS = metrics.histogram(
+    "restore_duration_seconds", "End-to-end instance restore time (time to recover)", buckets=metrics.JOB_BUCKETS
+)
+RESTORE_OUTCOMES = metrics.counter("restore_outcomes", "Instance restores by outcome", ["outcome"])
+
+def load_clients(profile=None, region=None):
+    pool = get_client_pool(profile)
+    compute = pool.get(oci.core.ComputeClient, region)
+    block = pool.get(oci.core.BlockstorageClient, region)
     return compute, block
 
-def restore_boot(block, compartment_id, ad, boot_backup_id):
+def restore_boot(block, compartment_id, ad, boot_backup_id, freeform_tags=None):
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     details = oci.core.models.CreateBootVolumeDetails(
         compartment_id=compartment_id,
         availability_domain=ad,
         source_details=oci.core.models.BootVolumeSourceFromBootVolumeBackupDetails(id=boot_backup_id),
-        display_name=f"oci-restore-boot-{ts}"
+        display_name=f"oci-restore-boot-{ts}",
+        freeform_tags=freeform_tags
     )
     resp = block.create_boot_volume(details)
     logging.info("Restored boot volume %s", resp.data.id)
     return resp.data
 
-def restore_volume(block, compartment_id, ad, vol_backup_id):
+def restore_volume(block, compartment_id, ad, vol_backup_id, freeform_tags=None):
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     details = oci.core.models.CreateVolumeDetails(
         compartment_id=compartment_id,
         availability_domain=ad,
         source_details=oci.core.models.VolumeSourceFromVolumeBackupDetails(id=vol_backup_id),
-        display_name=f"oci-restore-vol-{ts}"
+        display_name=f"oci-restore-vol-{ts}",
+        freeform_tags=freeform_tags
     )
     resp = block.create_volume(details)
     logging.info("Restored block volume %s", resp.data.id)
     return resp.data
 
-def launch_instance(compute, compartment_id, ad, subnet_id, shape, image_id, boot_vol_id):
+def launch_instance(compute, compartment_id, ad, subnet_id, shape, image_id, boot_vol_id,
+                    assign_public_ip=True, shape_config=None, freeform_tags=None):
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     launch = oci.core.models.LaunchInstanceDetails(
         compartment_id=compartment_id,
         availability_domain=ad,
         shape=shape,
+        shape_config=shape_config,
         source_details=oci.core.models.InstanceSourceViaBootVolumeDetails(boot_volume_id=boot_vol_id),
-        create_vnic_details=oci.core.models.CreateVnicDetails(subnet_id=subnet_id, assign_public_ip=True),
-        display_name=f"oci-restore-instance-{ts}"
+        create_vnic_details=oci.core.models.CreateVnicDetails(subnet_id=subnet_id, assign_public_ip=assign_public_ip),
+        display_name=f"oci-restore-instance-{ts}",
+        freeform_tags=freeform_tags
     )
     resp = compute.launch_instance(launch)
     logging.info("Launched instance %s", resp.data.id)
@@ -66,7 +80,7 @@ def attach_volume(compute, compartment_id, instance_id, vol_id):
     logging.info("Attached volume %s to instance %s", vol_id, instance_id)
     return resp.data
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("--compartment", "-c", required=True)
     parser.add_argument("--availability-domain", "-a", required=True)
@@ -76,14 +90,38 @@ def main():
     parser.add_argument("--boot-backup", required=True)
     parser.add_argument("--block-backups", nargs="*", default=[])
     parser.add_argument("--profile", "-p")
-    args = parser.parse_args()
+    parser.add_argument("--region", "-r", help="Region to operate in (default: config region)")
+    parser.add_argument("--wait-timeout", type=float, default=None, help="Seconds to wait for restored volumes")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    metrics.add_metrics_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics.write_on_exit(args.metrics_file)
+    profiling.profile_until_exit(args.profile_out)
+
+    compute, block = load_clients(args.profile, args.region)
+    try:
+        with RESTORE_SECONDS.time():
+            with RESTORE_STAGE_SECONDS.labels("create_volumes").time():
+                boot = restore_boot(block, args.compartment, args.availability_domain, args.boot_backup)
+                vols = [restore_volume(block, args.compartment, args.availability_domain, vb) for vb in args.block_backups]
 
-    compute, block = load_clients(args.profile)
-    boot = restore_boot(block, args.compartment, args.availability_domain, args.boot_backup)
-    vols = [restore_volume(block, args.compartment, args.availability_domain, vb) for vb in args.block_backups]
-    instance = launch_instance(compute, args.compartment, args.availability_domain, args.subnet, args.shape, args.image_id, boot.id)
-    for vol in vols:
-        attach_volume(compute, args.compartment, instance.id, vol.id)
+            # Volumes must be AVAILABLE before launch/attach; poll them all together
+            pending = [(boot, "boot_volume")] + [(vol, "volume") for vol in vols]
+            with RESTORE_STAGE_SECONDS.labels("wait_available").time():
+                outcomes = wait_for_backups(block, pending, args.wait_timeout, args.poll_interval)
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    raise SystemExit(f"Restored volume not available: {outcome}")
+            with RESTORE_STAGE_SECONDS.labels("launch_instance").time():
+                instance = launch_instance(compute, args.compartment, args.availability_domain, args.subnet, args.shape, args.image_id, boot.id)
+            with RESTORE_STAGE_SECONDS.labels("attach_volumes").time():
+                for vol in vols:
+                    attach_volume(compute, args.compartment, instance.id, vol.id)
+    except BaseException:
+        RESTORE_OUTCOMES.labels("failed").inc()
+        raise
+    RESTORE_OUTCOMES.labels("succeeded").inc()
 
     logging.info("Restore complete. Instance OCID: %s", instance.id)
 
@@ -0,0 +1,238 @@
+"""
+restore_reader.py - Parallel prefetching restore of exported images
+
+Rebuilds an image from a restore plan: the ordered extents (export frames
+or dedupe chunks) that make it up and where each one is stored. Extents
+are fetched concurrently with a bounded read-ahead, handed to a second
+pool that decompresses and verifies them, and written in order to the
+target file or device, so memory stays at roughly the read-ahead size no
+matter how large the image is. Progress is checkpointed to a local state
+file after the target is synced, so an interrupted restore resumes at the
+last checkpoint.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import stat
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple
+
+from compression import decompress
+from objectstore import ObjectStore
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_FETCH_WORKERS = 16
+DEFAULT_DECODE_WORKERS = os.cpu_count() or 4
+DEFAULT_READ_AHEAD = 256 * 1024 * 1024
+DEFAULT_CHECKPOINT_BYTES = 256 * 1024 * 1024
+PROGRESS_INTERVAL = 10.0
+
+DEFAULT_STATE_DIR = os.environ.get(
+    "OCI_BACKUP_RESTORE_STATE_DIR",
+    os.path.expanduser("~/.oci-backup/restores")
+)
+
+
+@dataclass
+class Extent:
+    """One piece of an image and where its (possibly compressed) bytes live"""
+    offset: int
+    length: int
+    sha256: str
+    object_name: str
+    byte_range: Optional[Tuple[int, int]] = None  # Inclusive; None for the whole object
+    codec: str = "none"
+
+
+@dataclass
+class RestorePlan:
+    """Everything needed to rebuild one image, in image order"""
+    source_id: str  # Identifies the exact backup, so resume state is not reused across backups
+    image_size: int
+    extents: List[Extent]
+
+
+@dataclass
+class RestoreState:
+    """Restore progress: everything below ``written`` is on the target"""
+    source_id: str
+    target: str
+    image_size: int
+    written: int = 0
+    
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional['RestoreState']:
+        try:
+            with open(path) as f:
+                return cls(**json.load(f))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+
+
+class RestoreReader:
+    """
+    Fetch, decode and write pipeline for restore plans.
+    
+    ``fetch_workers`` bounds concurrent object reads, ``decode_workers``
+    concurrent decompress/verify calls, and ``read_ahead`` the bytes
+    fetched but not yet written.
+    """
+    
+    def __init__(
+        self,
+        store: ObjectStore,
+        fetch_workers: int = DEFAULT_FETCH_WORKERS,
+        decode_workers: int = DEFAULT_DECODE_WORKERS,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+        checkpoint_bytes: int = DEFAULT_CHECKPOINT_BYTES
+    ):
+        self.store = store
+        self.fetch_workers = fetch_workers
+        self.decode_workers = decode_workers
+        self.read_ahead = read_ahead
+        self.checkpoint_bytes = checkpoint_bytes
+    
+    def _fetch(self, extent: Extent) -> bytes:
+        return self.store.get_object(extent.object_name, extent.byte_range)
+    
+    @staticmethod
+    def _decode(extent: Extent, payload: bytes) -> bytes:
+        data = decompress(extent.codec, payload)
+        if len(data) != extent.length or hashlib.sha256(data).hexdigest() != extent.sha256:
+            raise ValueError(f"Extent at offset {extent.offset} ({extent.object_name}) is corrupt")
+        return data
+    
+    def _submit(self, fetch_pool: ThreadPoolExecutor, decode_pool: ThreadPoolExecutor, extent: Extent) -> Future:
+        """Fetch, then decode on the other pool; the returned future carries the data"""
+        result = Future()
+        
+        def decoded(future: Future):
+            if future.exception():
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+        
+        def fetched(future: Future):
+            if future.exception():
+                result.set_exception(future.exception())
+                return
+            decode_pool.submit(self._decode, extent, future.result()).add_done_callback(decoded)
+        
+        fetch_pool.submit(self._fetch, extent).add_done_callback(fetched)
+        return result
+    
+    def restore(self, plan: RestorePlan, target: str, state_path: Optional[str] = None) -> dict:
+        """
+        Write ``plan`` to ``target`` and return throughput statistics.
+        
+        ``state_path`` defaults to a file under DEFAULT_STATE_DIR named after
+        the target; it is removed once the restore completes.
+        """
+        state_path = state_path or os.path.join(
+            DEFAULT_STATE_DIR, hashlib.sha1(os.path.abspath(target).encode()).hexdigest() + ".json"
+        )
+        state = RestoreState.load(state_path)
+        if state and (state.source_id, state.target, state.image_size) == (plan.source_id, target, plan.image_size):
+            logging.info("Resuming restore of %s to %s at %.1f MiB", plan.source_id, target, state.written / 2 ** 20)
+        else:
+            state = RestoreState(plan.source_id, target, plan.image_size)
+        resumed = state.written
+        extents = [e for e in plan.extents if e.length and e.offset + e.length > resumed]
+        if extents and extents[0].offset != resumed:
+            raise ValueError(f"Restore checkpoint at {resumed} is not on an extent boundary")
+        
+        flags = os.O_WRONLY | os.O_CREAT | (0 if resumed else os.O_TRUNC)
+        fd = os.open(target, flags, 0o600)
+        regular_file = stat.S_ISREG(os.fstat(fd).st_mode)
+        checkpointed = resumed
+        started = last_report = time.monotonic()
+        buffered = 0  # Bytes fetched or in flight but not yet written
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.decode_workers) as decode_pool, \
+                    ThreadPoolExecutor(max_workers=self.fetch_workers) as fetch_pool:
+                pending = deque()
+                remaining = iter(extents)
+                next_extent = next(remaining, None)
+                while next_extent is not None or pending:
+                    # Read ahead up to the byte budget (always at least one extent)
+                    while next_extent is not None and (not pending or
+                                                       buffered + next_extent.length <= self.read_ahead):
+                        buffered += next_extent.length
+                        pending.append((next_extent, self._submit(fetch_pool, decode_pool, next_extent)))
+                        next_extent = next(remaining, None)
+                    
+                    extent, future = pending.popleft()
+                    data = future.result()
+                    view = memoryview(data)
+                    position = extent.offset
+                    while view:
+                        count = os.pwrite(fd, view, position)
+                        view = view[count:]
+                        position += count
+                    buffered -= extent.length
+                    written = extent.offset + extent.length
+                    
+                    if written - checkpointed >= self.checkpoint_bytes:
+                        os.fsync(fd)
+                        state.written = checkpointed = written
+                        state.save(state_path)
+                    if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.monotonic()
+                        logging.info("Restored %.1f/%.1f MiB of %s (%.0f MiB/s)",
+                                     written / 2 ** 20, plan.image_size / 2 ** 20, plan.source_id,
+                                     (written - resumed) / 2 ** 20 / (last_report - started))
+            
+            if regular_file:
+                os.ftruncate(fd, plan.image_size)
+            os.fsync(fd)
+        except BaseException:
+            # Keep the last synced checkpoint so a rerun resumes from it
+            if checkpointed > resumed:
+                state.written = checkpointed
+                state.save(state_path)
+            raise
+        finally:
+            os.close(fd)
+        elapsed = time.monotonic() - started
+        
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        restored = plan.image_size - resumed
+        logging.info("Restored %s to %s: %.1f MiB (%.1f MiB resumed) in %.1fs",
+                     plan.source_id, target, plan.image_size / 2 ** 20, resumed / 2 ** 20, elapsed)
+        return {
+            "image_size": plan.image_size,
+            "extents": len(plan.extents),
+            "bytes_restored": restored,
+            "bytes_resumed": resumed,
+            "duration_seconds": round(elapsed, 3),
+            "throughput_mib_s": round(restored / 2 ** 20 / elapsed, 1) if elapsed else None
+        }
+
+
+def add_restore_arguments(parser: argparse.ArgumentParser):
+    """Tuning options shared by CLIs that restore images"""
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS,
+                        help="Concurrent object reads while restoring")
+    parser.add_argument("--decode-workers", type=int, default=DEFAULT_DECODE_WORKERS,
+                        help="Threads decompressing and verifying while restoring")
+    parser.add_argument("--read-ahead-mb", type=int, default=DEFAULT_READ_AHEAD // 2 ** 20,
+                        help="Data fetched ahead of the restore writer (bounds memory)")
+
+
+def reader_from_args(store: ObjectStore, args) -> RestoreReader:
+    return RestoreReader(store, args.fetch_workers, args.decode_workers, args.read_ahead_mb * 2 ** 20)
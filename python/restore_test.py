@@ -0,0 +1,402 @@
+"""
+restore_test.py - Automated restore testing for the RESTORE_TEST check
+
+Restores sampled backups into an isolated sandbox subnet, boots restored
+boot volumes, checks the instance reaches a ready console and tears
+everything down again. Tests run in parallel under a concurrency limit and
+a cost budget, share one sandbox network and waiter per run, and record a
+measured time-to-restore per backup for RTO reporting.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from lazy import oci
+
+from restore import launch_instance, restore_boot, restore_volume
+from validator import ValidationCheck, ValidationResult
+from waiter import LifecycleWaiter
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Freeform tag marking every resource a restore test creates, for leak sweeps
+RESTORE_TEST_TAG = "oci-backup-restore-test"
+
+DEFAULT_READINESS_MARKERS = ("login:", "Cloud-init", "Reached target")
+
+
+@dataclass
+class SandboxConfig:
+    """Where and how restore tests run"""
+    compartment_id: str
+    availability_domain: str
+    subnet_id: Optional[str] = None  # Created for the run (and removed) when None
+    vcn_cidr: str = "10.254.0.0/24"
+    shape: str = "VM.Standard.E4.Flex"
+    ocpus: Optional[float] = 1
+    memory_in_gbs: Optional[float] = 8
+    readiness_markers: Tuple[str, ...] = DEFAULT_READINESS_MARKERS
+    restore_timeout: float = 3600
+    readiness_timeout: float = 1200
+    poll_interval: float = 15
+
+
+@dataclass
+class RestoreTestResult:
+    """Outcome of one restore test"""
+    backup_id: str
+    backup_type: str
+    status: str  # passed, failed, skipped
+    message: str
+    time_to_restore_seconds: Optional[float] = None
+    phases: Dict[str, float] = field(default_factory=dict)
+    estimated_cost: float = 0.0
+    
+    def to_check(self) -> dict:
+        """RESTORE_TEST entry for ValidationResult.checks"""
+        details = {"sampled": True, "phases": {k: round(v, 1) for k, v in self.phases.items()}}
+        if self.time_to_restore_seconds is not None:
+            details["time_to_restore_seconds"] = round(self.time_to_restore_seconds, 1)
+        if self.estimated_cost:
+            details["estimated_cost"] = round(self.estimated_cost, 4)
+        return {"status": self.status, "message": self.message, "details": details}
+
+
+class CostBudget:
+    """
+    Spend cap for sandbox instances across a run.
+    
+    A test reserves its worst case (hourly cost times the longest run its
+    timeouts allow, teardown included) before it starts and settles to the
+    actual runtime when it finishes, so concurrent tests can never overrun
+    the budget together. Custom readiness checks must return within
+    readiness_timeout for that bound to hold.
+    """
+    
+    def __init__(self, max_cost: Optional[float] = None, hourly_cost: float = 0.0):
+        self.max_cost = max_cost
+        self.hourly_cost = hourly_cost
+        self.reserved = 0.0
+        self.spent = 0.0
+        self._lock = threading.Lock()
+    
+    def reserve(self, hours: float) -> Optional[float]:
+        """Reserve cost for ``hours`` of sandbox time; None if over budget"""
+        cost = hours * self.hourly_cost
+        with self._lock:
+            if self.max_cost is not None and self.spent + self.reserved + cost > self.max_cost:
+                return None
+            self.reserved += cost
+            return cost
+    
+    def settle(self, reserved: float, hours: float) -> float:
+        """Release a reservation and charge the actual runtime"""
+        cost = hours * self.hourly_cost
+        with self._lock:
+            self.reserved -= reserved
+            self.spent += cost
+        return cost
+
+
+class RestoreSandbox:
+    """
+    Network scaffolding shared by every restore test in a run.
+    
+    Uses the configured subnet, or creates one private VCN and subnet with
+    no gateways on first use and deletes them on close.
+    """
+    
+    def __init__(self, network_client, config: SandboxConfig, run_id: str):
+        self.network = network_client
+        self.config = config
+        self.run_id = run_id
+        self._subnet_id = config.subnet_id
+        self._vcn_id = None
+        self._lock = threading.Lock()
+    
+    @property
+    def tags(self) -> Dict[str, str]:
+        return {RESTORE_TEST_TAG: self.run_id}
+    
+    def subnet_id(self) -> str:
+        """Sandbox subnet, created once per run if not configured"""
+        with self._lock:
+            if self._subnet_id is None:
+                self._create_network()
+            return self._subnet_id
+    
+    def _create_network(self):
+        cfg = self.config
+        vcn = self.network.create_vcn(oci.core.models.CreateVcnDetails(
+            compartment_id=cfg.compartment_id,
+            cidr_blocks=[cfg.vcn_cidr],
+            display_name=f"restore-test-{self.run_id}",
+            freeform_tags=self.tags
+        )).data
+        self._vcn_id = vcn.id
+        oci.wait_until(self.network, self.network.get_vcn(vcn.id), "lifecycle_state", "AVAILABLE")
+        
+        subnet = self.network.create_subnet(oci.core.models.CreateSubnetDetails(
+            compartment_id=cfg.compartment_id,
+            vcn_id=vcn.id,
+            cidr_block=cfg.vcn_cidr,
+            prohibit_public_ip_on_vnic=True,
+            display_name=f"restore-test-{self.run_id}",
+            freeform_tags=self.tags
+        )).data
+        oci.wait_until(self.network, self.network.get_subnet(subnet.id), "lifecycle_state", "AVAILABLE")
+        self._subnet_id = subnet.id
+        logging.info("Created restore sandbox subnet %s", subnet.id)
+    
+    def close(self):
+        """Delete scaffolding created for this run"""
+        if self._vcn_id is None:
+            return
+        try:
+            if self._subnet_id:
+                self.network.delete_subnet(self._subnet_id)
+                oci.wait_until(
+                    self.network, self.network.get_subnet(self._subnet_id), "lifecycle_state", "TERMINATED",
+                    succeed_on_not_found=True
+                )
+            self.network.delete_vcn(self._vcn_id)
+            logging.info("Removed restore sandbox VCN %s", self._vcn_id)
+        except Exception as e:
+            logging.error("Failed to remove restore sandbox %s (tag %s=%s): %s",
+                          self._vcn_id, RESTORE_TEST_TAG, self.run_id, e)
+        self._vcn_id = None
+        self._subnet_id = self.config.subnet_id
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def console_ready(compute, instance_id: str, markers: Iterable[str],
+                  timeout: float, interval: float = 30) -> bool:
+    """True once the instance's serial console output shows a readiness marker; never waits past ``timeout``"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        history = compute.capture_console_history(
+            oci.core.models.CaptureConsoleHistoryDetails(instance_id=instance_id)
+        ).data
+        try:
+            oci.wait_until(compute, compute.get_console_history(history.id),
+                           "lifecycle_state", "SUCCEEDED",
+                           max_wait_seconds=max(1, min(120, int(deadline - time.monotonic()))))
+            content = compute.get_console_history_content(history.id).data or ""
+        finally:
+            compute.delete_console_history(history.id)
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "replace")
+        if any(marker in content for marker in markers):
+            return True
+        time.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+    return False
+
+
+def is_sampled(backup_id: str, sample_rate: float, seed: Optional[str] = None) -> bool:
+    """
+    Deterministic sampling by backup id.
+    
+    The seed defaults to today's date, so each day's runs agree on the
+    sample while coverage rotates across the fleet over time.
+    """
+    if sample_rate >= 1:
+        return True
+    seed = seed or date.today().isoformat()
+    digest = hashlib.sha1(f"{seed}:{backup_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 < sample_rate
+
+
+class RestoreTester:
+    """Runs restore tests in parallel and folds them into validation results"""
+    
+    def __init__(
+        self,
+        compute_client,
+        block_storage_client,
+        network_client,
+        config: SandboxConfig,
+        max_concurrent: int = 4,
+        budget: Optional[CostBudget] = None,
+        readiness_check: Optional[Callable[[str], bool]] = None
+    ):
+        self.compute = compute_client
+        self.block = block_storage_client
+        self.config = config
+        self.max_concurrent = max_concurrent
+        self.budget = budget or CostBudget()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.sandbox = RestoreSandbox(network_client, config, self.run_id)
+        # One waiter for all tests: state polling is batched across the run
+        self.waiter = LifecycleWaiter(block_storage_client, config.poll_interval, compute_client=compute_client)
+        self.readiness_check = readiness_check or (
+            lambda instance_id: console_ready(
+                self.compute, instance_id, config.readiness_markers,
+                config.readiness_timeout, config.poll_interval
+            )
+        )
+    
+    def test_backup(self, backup_id: str, backup_type: str) -> RestoreTestResult:
+        """Restore one backup into the sandbox, check it and tear it down"""
+        booting = backup_type == "boot_volume"
+        # Worst case the clock can run: the restore, then three waits bounded
+        # by readiness_timeout (boot, readiness check, termination)
+        timeout = self.config.restore_timeout + 3 * self.config.readiness_timeout
+        reserved = self.budget.reserve(timeout / 3600) if booting else 0.0
+        if reserved is None:
+            return RestoreTestResult(backup_id, backup_type, "skipped", "Restore test cost budget exhausted")
+        
+        started = time.monotonic()
+        try:
+            if booting:
+                result = self._test_boot(backup_id)
+            else:
+                result = self._test_volume(backup_id)
+        except Exception as e:
+            result = RestoreTestResult(backup_id, backup_type, "failed", f"Restore test failed: {e}")
+        if booting:
+            result.estimated_cost = self.budget.settle(reserved, (time.monotonic() - started) / 3600)
+        
+        logging.info("Restore test %s: %s (%s)", backup_id, result.status, result.message)
+        return result
+    
+    def _test_boot(self, backup_id: str) -> RestoreTestResult:
+        cfg = self.config
+        tags = self.sandbox.tags
+        phases = {}
+        boot = instance = None
+        started = time.monotonic()
+        try:
+            boot = restore_boot(self.block, cfg.compartment_id, cfg.availability_domain, backup_id, tags)
+            self.waiter.track_backup(boot, "boot_volume", cfg.restore_timeout).result()
+            phases["restore_seconds"] = time.monotonic() - started
+            
+            shape_config = None
+            if cfg.shape.endswith(".Flex") and (cfg.ocpus or cfg.memory_in_gbs):
+                shape_config = oci.core.models.LaunchInstanceShapeConfigDetails(
+                    ocpus=cfg.ocpus, memory_in_gbs=cfg.memory_in_gbs
+                )
+            instance = launch_instance(
+                self.compute, cfg.compartment_id, cfg.availability_domain, self.sandbox.subnet_id(),
+                cfg.shape, None, boot.id,
+                assign_public_ip=False, shape_config=shape_config, freeform_tags=tags
+            )
+            self.waiter.track(
+                instance.id, "instance", cfg.compartment_id,
+                timeout=cfg.readiness_timeout, time_created=instance.time_created
+            ).result()
+            phases["boot_seconds"] = time.monotonic() - started - phases["restore_seconds"]
+            
+            ready = self.readiness_check(instance.id)
+            elapsed = time.monotonic() - started
+            phases["readiness_seconds"] = elapsed - phases["restore_seconds"] - phases["boot_seconds"]
+            if not ready:
+                return RestoreTestResult(backup_id, "boot_volume", "failed",
+                                         "Instance booted but never reported ready", phases=phases)
+            return RestoreTestResult(backup_id, "boot_volume", "passed",
+                                     f"Restored and booted in {elapsed:.0f}s",
+                                     time_to_restore_seconds=elapsed, phases=phases)
+        finally:
+            teardown_started = time.monotonic()
+            self._teardown(instance_id=instance.id if instance else None,
+                           boot_volume_id=boot.id if boot and not instance else None)
+            phases["teardown_seconds"] = time.monotonic() - teardown_started
+    
+    def _test_volume(self, backup_id: str) -> RestoreTestResult:
+        cfg = self.config
+        phases = {}
+        volume = None
+        started = time.monotonic()
+        try:
+            volume = restore_volume(self.block, cfg.compartment_id, cfg.availability_domain,
+                                    backup_id, self.sandbox.tags)
+            self.waiter.track_backup(volume, "volume", cfg.restore_timeout).result()
+            elapsed = time.monotonic() - started
+            phases["restore_seconds"] = elapsed
+            return RestoreTestResult(backup_id, "block_volume", "passed",
+                                     f"Restored volume available in {elapsed:.0f}s",
+                                     time_to_restore_seconds=elapsed, phases=phases)
+        finally:
+            teardown_started = time.monotonic()
+            self._teardown(volume_id=volume.id if volume else None)
+            phases["teardown_seconds"] = time.monotonic() - teardown_started
+    
+    def _teardown(self, instance_id: str = None, boot_volume_id: str = None, volume_id: str = None):
+        """Remove test resources; failures are logged with the run tag for cleanup"""
+        try:
+            if instance_id:
+                # Terminating also deletes the restored boot volume; wait so
+                # the sandbox subnet has no VNICs left when it is removed
+                self.compute.terminate_instance(instance_id, preserve_boot_volume=False)
+                self.waiter.track(
+                    instance_id, "instance", self.config.compartment_id,
+                    timeout=self.config.readiness_timeout,
+                    success_states={"TERMINATED"}, failure_states=set()
+                ).result()
+            if boot_volume_id:
+                self.block.delete_boot_volume(boot_volume_id)
+            if volume_id:
+                self.block.delete_volume(volume_id)
+        except Exception as e:
+            logging.error("Restore test teardown failed (tag %s=%s): %s", RESTORE_TEST_TAG, self.run_id, e)
+    
+    def iter_with_restore_tests(
+        self,
+        results: Iterable[ValidationResult],
+        sample_rate: float = 0.1,
+        max_tests: Optional[int] = None,
+        seed: Optional[str] = None
+    ) -> Iterator[ValidationResult]:
+        """
+        Run restore tests for a sample of results while passing them through.
+        
+        Unsampled results are yielded immediately; sampled ones are yielded
+        once their test finishes, with the RESTORE_TEST check filled in and
+        the overall status failed if the restore failed.
+        """
+        started = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent) as pool:
+                pending = {}
+                for result in results:
+                    exists = result.checks.get(ValidationCheck.BACKUP_EXISTS.value, {}).get("status") == "passed"
+                    if (exists and (max_tests is None or started < max_tests)
+                            and is_sampled(result.backup_id, sample_rate, seed)):
+                        started += 1
+                        pending[pool.submit(self.test_backup, result.backup_id, result.backup_type)] = result
+                    else:
+                        yield result
+                    # Hand back finished tests without waiting for the input to end
+                    for future in [f for f in pending if f.done()]:
+                        yield _apply_restore_test(pending.pop(future), future.result())
+                
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield _apply_restore_test(pending.pop(future), future.result())
+        finally:
+            self.sandbox.close()
+    
+    def close(self):
+        self.sandbox.close()
+
+
+def _apply_restore_test(result: ValidationResult, test: RestoreTestResult) -> ValidationResult:
+    """Record a restore test on its validation result"""
+    result.checks[ValidationCheck.RESTORE_TEST.value] = test.to_check()
+    if test.status == "failed":
+        # Use the result's own enum class (validator.py may be running as __main__)
+        result.overall_status = type(result.overall_status)("failed")
+        result.compliance_status = "NON_COMPLIANT"
+        result.issues.append(test.message)
+        result.recommendations.append("Investigate backups that fail restore tests")
+    return result
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+startup_bench.py - Startup-time benchmark for the CLIs and the API
+
+Every measurement runs in a fresh interpreter, the way cron jobs and
+autoscaled API containers start: module import time, full CLI runs, and
+the API's time to first response (import, lifespan startup and one
+request, driven through ASGI without a server). Results can be saved and
+compared with an earlier run so regressions, such as a module importing
+the OCI SDK at top level again, show up as deltas.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(PYTHON_DIR)
+
+DEFAULT_MODULES = ["policy_manager", "validator", "backup", "restore", "inventory"]
+DEFAULT_CLI = ["policy_manager.py", "list"]
+DEFAULT_API_PATHS = ["/api/health", "/api/v1/policies"]
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "oci_imported": "oci" in sys.modules
+}}))
+"""
+
+_API_PROBE = """
+import asyncio, json, resource, sys, time
+spawned = float(sys.argv[1])
+sys.path.insert(0, {root!r})
+from api.main import app
+imported = time.time()
+
+async def get(path):
+    messages = []
+    async def receive():
+        return {{"type": "http.request", "body": b"", "more_body": False}}
+    async def send(message):
+        messages.append(message)
+    await app({{
+        "type": "http", "asgi": {{"version": "3.0"}}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "server": ("bench", 80), "client": ("bench", 1)
+    }}, receive, send)
+    return messages[0]["status"]
+
+async def main():
+    async with app.router.lifespan_context(app):
+        ready = time.time()
+        status = await get({path!r})
+        return ready, status
+
+ready, status = asyncio.run(main())
+print(json.dumps({{
+    "import_seconds": imported - spawned,
+    "startup_seconds": ready - spawned,
+    "seconds": time.time() - spawned,
+    "status": status,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "oci_imported": "oci" in sys.modules
+}}))
+"""
+
+
+def _run_probe(code: str, *args: str, cwd: str = PYTHON_DIR) -> dict:
+    result = subprocess.run([sys.executable, "-c", code, *args], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _summarize(samples: List[dict]) -> dict:
+    times = [s["seconds"] for s in samples]
+    summary = {
+        "runs": len(times),
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "min_ms": round(min(times) * 1000, 1),
+    }
+    if "max_rss_mb" in samples[0]:
+        summary["max_rss_mb"] = round(max(s["max_rss_mb"] for s in samples), 1)
+    for key in ("import_seconds", "startup_seconds"):
+        if key in samples[0]:
+            summary[key.replace("_seconds", "_median_ms")] = round(statistics.median(s[key] for s in samples) * 1000, 1)
+    for key in ("oci_imported", "status"):
+        if key in samples[0]:
+            summary[key] = samples[0][key]
+    return summary
+
+
+def bench_import(module: str, runs: int) -> dict:
+    """Time to import one module in a fresh interpreter"""
+    return _summarize([_run_probe(_IMPORT_PROBE.format(module=module)) for _ in range(runs)])
+
+
+def bench_cli(argv: List[str], runs: int) -> dict:
+    """Wall time of a complete CLI invocation"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, *argv], cwd=PYTHON_DIR, capture_output=True)
+        samples.append({"seconds": time.perf_counter() - started, "exit_code": result.returncode})
+    summary = _summarize(samples)
+    summary["exit_code"] = samples[-1]["exit_code"]
+    return summary
+
+
+def bench_api(path: str, runs: int) -> dict:
+    """Process start to first response from the API for ``path``"""
+    code = _API_PROBE.format(root=REPO_ROOT, path=path)
+    return _summarize([_run_probe(code, repr(time.time()), cwd=REPO_ROOT) for _ in range(runs)])
+
+
+def run_benchmarks(modules: List[str], cli: Optional[List[str]], api_paths: List[str], runs: int) -> Dict[str, dict]:
+    results = {}
+    for module in modules:
+        name = f"import {module}"
+        try:
+            results[name] = bench_import(module, runs)
+        except RuntimeError as e:
+            results[name] = {"error": str(e)}
+    if cli:
+        results[f"cli {' '.join(cli)}"] = bench_cli(cli, runs)
+    for path in api_paths:
+        name = f"api first response {path}"
+        try:
+            results[name] = bench_api(path, runs)
+        except RuntimeError as e:
+            results[name] = {"error": str(e)}
+    return results
+
+
+def print_results(results: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None):
+    print(f"\n{'Benchmark':<44} {'median':>10} {'min':>10} {'RSS MB':>8}  {'vs baseline':>12}  oci")
+    print("-" * 96)
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<44} error: {result['error']}")
+            continue
+        delta = ""
+        previous = (baseline or {}).get(name, {})
+        if previous.get("median_ms"):
+            delta = f"{(result['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100:+.0f}%"
+        oci = {True: "loaded", False: "-"}.get(result.get("oci_imported"), "")
+        rss = f"{result['max_rss_mb']:.1f}" if "max_rss_mb" in result else "-"
+        print(f"{name:<44} {result['median_ms']:>8.1f}ms {result['min_ms']:>8.1f}ms "
+              f"{rss:>8}  {delta:>12}  {oci}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup-time benchmark for the CLIs and API")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--cli", default=" ".join(DEFAULT_CLI),
+                        help="CLI invocation to time, relative to python/ (empty to skip)")
+    parser.add_argument("--api-paths", default=",".join(DEFAULT_API_PATHS),
+                        help="Comma-separated API paths for time to first response (empty to skip)")
+    parser.add_argument("--output", help="Save results as JSON")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    args = parser.parse_args(argv)
+    
+    results = run_benchmarks(
+        [m for m in args.modules.split(",") if m],
+        args.cli.split() or None,
+        [p for p in args.api_paths.split(",") if p],
+        args.runs
+    )
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "timestamp": time.time(), "results": results}, f, indent=2)
+        logging.info("Saved results to %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+throttling.py - Adaptive (AIMD) concurrency control for OCI API calls
+
+Every OCI client handed out by the client pool is wrapped so its calls pass
+through a per-API-family limiter. Each limiter grows its in-flight limit
+additively while calls succeed and cuts it multiplicatively on 429 or 5xx
+responses (other than 501), so throughput converges on the tenancy's real
+service limit.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import metrics
+import tracing
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+# Client class name -> API family sharing one limit
+API_FAMILIES = {
+    "ComputeClient": "compute",
+    "BlockstorageClient": "blockstorage",
+    "IdentityClient": "identity",
+    "ObjectStorageClient": "objectstorage",
+    "VirtualNetworkClient": "network",
+}
+
+
+OCI_REQUEST_SECONDS = metrics.histogram(
+    "oci_request_duration_seconds", "Latency of single OCI API attempts", ["family", "region", "operation"]
+)
+OCI_REQUEST_ERRORS = metrics.counter(
+    "oci_request_errors", "Failed OCI API attempts by HTTP status (or exception type)",
+    ["family", "region", "operation", "status"]
+)
+OCI_LIMITER_WAIT_SECONDS = metrics.histogram(
+    "oci_limiter_wait_seconds", "Time OCI calls waited for an AIMD concurrency slot", ["family", "region"]
+)
+
+
+def is_overload_status(status: int) -> bool:
+    """
+    True for HTTP statuses that signal an overloaded service: 429 and 5xx.
+    
+    501 Not Implemented is excluded; it is a deterministic answer to an
+    unsupported call, not a sign of load. Shared with resilience.py's
+    retry rule.
+    """
+    return status == 429 or (status >= 500 and status != 501)
+
+
+def is_throttle_error(exc: Exception) -> bool:
+    """True for responses that signal the service is overloaded (see is_overload_status)"""
+    status = getattr(exc, "status", None)
+    return isinstance(status, int) and is_overload_status(status)
+
+
+class AIMDLimiter:
+    """In-flight call limit for one API family, adjusted by AIMD"""
+    
+    def __init__(
+        self,
+        family: str,
+        initial_limit: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        window: int = 1000
+    ):
+        self.family = family
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.errors = 0
+        self.decreases = 0
+        self._recent = deque(maxlen=window)  # 1 = throttled, 0 = not
+        # Calls started before the last cut carry an older epoch; their
+        # throttles belong to the same congestion event and do not cut again
+        self._epoch = 0
+        self._cond = threading.Condition()
+    
+    def acquire(self) -> int:
+        """Block until a call slot is free; returns the epoch to pass to release()"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            return self._epoch
+    
+    def release(self, epoch: int, throttled: bool = False, failed: bool = False):
+        """Return a call slot and adjust the limit from the call's outcome"""
+        with self._cond:
+            self.in_flight -= 1
+            self._recent.append(1 if throttled else 0)
+            if throttled:
+                self.throttles += 1
+                if epoch == self._epoch:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.decreases += 1
+                    self._epoch += 1
+                    logging.debug("OCI %s throttled; concurrency limit cut to %d",
+                                  self.family, int(self.limit))
+            elif failed:
+                self.errors += 1
+            else:
+                self.successes += 1
+                # +increase per full window of successful calls
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+    
+    def throttle_rate(self) -> float:
+        """Share of recent calls that were throttled"""
+        with self._cond:
+            return sum(self._recent) / len(self._recent) if self._recent else 0.0
+    
+    def snapshot(self) -> dict:
+        """Current limit and counters"""
+        rate = self.throttle_rate()
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "errors": self.errors,
+                "decreases": self.decreases,
+                "throttle_rate": round(rate, 4)
+            }
+
+
+class ConcurrencyController:
+    """Shared registry of per-family AIMD limiters"""
+    
+    def __init__(self, **limiter_defaults):
+        self.limiter_defaults = limiter_defaults
+        self._limiters: Dict[str, AIMDLimiter] = {}
+        self._lock = threading.Lock()
+    
+    def limiter(self, family: str) -> AIMDLimiter:
+        """Limiter for an API family, created on first use"""
+        with self._lock:
+            if family not in self._limiters:
+                self._limiters[family] = AIMDLimiter(family, **self.limiter_defaults)
+            return self._limiters[family]
+    
+    def wrap(self, client, region: Optional[str] = None, family: Optional[str] = None):
+        """
+        Wrap an OCI client so every API call goes through its family's limiter.
+        
+        Service limits are regional, so clients for different regions get
+        separate limiters ("blockstorage@us-phoenix-1").
+        """
+        name = type(client).__name__
+        family = family or API_FAMILIES.get(name, name)
+        if region:
+            family = f"{family}@{region}"
+        return ThrottledClient(client, self.limiter(family))
+    
+    def snapshot(self) -> Dict[str, dict]:
+        """Limits and throttle rates for every family seen so far"""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {family: limiter.snapshot() for family, limiter in sorted(limiters.items())}
+
+
+class ThrottledClient:
+    """Proxy for an OCI client that gates public method calls on a limiter"""
+    
+    def __init__(self, client, limiter: AIMDLimiter):
+        self._client = client
+        self._limiter = limiter
+    
+    @property
+    def family(self) -> str:
+        """Limiter key this client's calls count against"""
+        return self._limiter.family
+    
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        
+        limiter = self._limiter
+        family, _, region = limiter.family.partition("@")
+        latency = OCI_REQUEST_SECONDS.labels(family, region, name)
+        waited = OCI_LIMITER_WAIT_SECONDS.labels(family, region)
+        attributes = {"rpc.system": "oci", "rpc.service": family, "rpc.method": name, "cloud.region": region}
+        
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with tracing.span(f"{family}.{name}", kind=tracing.KIND_CLIENT, attributes=attributes) as span:
+                queued = time.perf_counter()
+                epoch = limiter.acquire()
+                started = time.perf_counter()
+                waited.observe(started - queued)
+                span.set_attribute("oci.limiter_wait_ms", round((started - queued) * 1000, 3))
+                throttled = failed = False
+                try:
+                    return attr(*args, **kwargs)
+                except Exception as e:
+                    throttled = is_throttle_error(e)
+                    failed = not throttled
+                    status = getattr(e, "status", None)
+                    OCI_REQUEST_ERRORS.labels(family, region, name, status or type(e).__name__).inc()
+                    if status:
+                        span.set_attribute("http.status_code", status)
+                    raise
+                finally:
+                    limiter.release(epoch, throttled, failed)
+                    latency.observe(time.perf_counter() - started)
+        
+        return call
+    
+    def __repr__(self):
+        return f"ThrottledClient({self._client!r}, family={self._limiter.family!r})"
+
+
+_controller: Optional[ConcurrencyController] = None
+_controller_lock = threading.Lock()
+
+
+def _collect_metrics():
+    """Scrape-time view of the controller's limiters"""
+    if _controller is None:
+        return
+    snapshot = _controller.snapshot()
+    labels = {}
+    for key in snapshot:
+        family, _, region = key.partition("@")
+        labels[key] = {"family": family, "region": region}
+    yield (metrics.PREFIX + "oci_concurrency_limit", "gauge", "Current AIMD in-flight limit per API family",
+           [(dict(labels[k]), s["limit"]) for k, s in snapshot.items()])
+    yield (metrics.PREFIX + "oci_in_flight", "gauge", "OCI calls currently in flight per API family",
+           [(dict(labels[k]), s["in_flight"]) for k, s in snapshot.items()])
+    yield (metrics.PREFIX + "oci_throttle_ratio", "gauge", "Share of recent OCI calls that were throttled",
+           [(dict(labels[k]), s["throttle_rate"]) for k, s in snapshot.items()])
+    yield (metrics.PREFIX + "oci_limit_decreases", "counter", "Multiplicative AIMD limit cuts per API family",
+           [({**labels[k], "__name__": "_total"}, s["decreases"]) for k, s in snapshot.items()])
+
+
+metrics.register_collector("oci_concurrency", _collect_metrics)
+
+
+def get_controller() -> ConcurrencyController:
+    """Process-wide concurrency controller shared by all OCI clients"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = ConcurrencyController()
+        return _controller
@@ -0,0 +1,346 @@
+"""
+tracing.py - OpenTelemetry-compatible tracing without a collector
+
+Spans follow the OpenTelemetry data model (128-bit trace ids, 64-bit span
+ids, kinds, attributes, events, status) and propagate as W3C
+``traceparent`` headers, so traces join up with other OpenTelemetry
+services. Finished spans go to local exporters: an in-memory ring buffer
+the API serves at /api/v1/system/traces, and optionally an OTLP/JSON lines
+file (OCI_BACKUP_TRACE_FILE) that the OpenTelemetry Collector's
+otlpjsonfile receiver or Jaeger can import.
+
+The current span lives in a context variable, so it follows asyncio tasks
+automatically; work handed to thread pools keeps its parent through bind().
+Set OCI_BACKUP_TRACING=off to make every span a no-op.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+SERVICE_NAME = os.environ.get("OCI_BACKUP_SERVICE_NAME", "oci-backup")
+TRACING_ENABLED = os.environ.get("OCI_BACKUP_TRACING", "on").lower() not in ("0", "off", "false", "no")
+DEFAULT_TRACE_FILE = os.environ.get("OCI_BACKUP_TRACE_FILE")
+DEFAULT_BUFFER_SPANS = int(os.environ.get("OCI_BACKUP_TRACE_BUFFER", "4096"))
+
+# Span kinds and status codes as numbered in the OTLP protocol
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """Identity of a span, as carried between processes"""
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+    
+    @property
+    def traceparent(self) -> str:
+        """W3C trace context header value"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """SpanContext from a ``traceparent`` header, or None if absent or malformed"""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return SpanContext(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+class Span:
+    """One timed operation in a trace; ended exactly once"""
+    
+    def __init__(self, tracer: 'Tracer', name: str, context: SpanContext, parent_id: Optional[str] = None,
+                 kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self._tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.events: List[dict] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+    
+    @property
+    def recording(self) -> bool:
+        return self.end_ns is None
+    
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+    
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": dict(attributes or {})})
+    
+    def record_exception(self, exc: BaseException):
+        """Mark the span failed with OpenTelemetry's exception event"""
+        self.add_event("exception", {"exception.type": type(exc).__name__, "exception.message": str(exc)})
+        self.set_status(STATUS_ERROR, str(exc))
+    
+    def set_status(self, code: int, message: str = ""):
+        self.status = code
+        self.status_message = message
+    
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._export(self)
+    
+    def to_dict(self) -> dict:
+        """Compact form for the API"""
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "duration_ms": round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {STATUS_UNSET: "unset", STATUS_OK: "ok", STATUS_ERROR: "error"}[self.status],
+            "status_message": self.status_message or None
+        }
+    
+    def to_otlp(self) -> dict:
+        """Span in the OTLP/JSON encoding"""
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [
+                {"timeUnixNano": str(e["time_ns"]), "name": e["name"], "attributes": _otlp_attributes(e["attributes"])}
+                for e in self.events
+            ],
+            "status": {"code": self.status, "message": self.status_message}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+    context = None
+    recording = False
+    
+    def set_attribute(self, key, value):
+        pass
+    
+    def add_event(self, name, attributes=None):
+        pass
+    
+    def record_exception(self, exc):
+        pass
+    
+    def set_status(self, code, message=""):
+        pass
+    
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans"""
+    
+    def __init__(self, max_spans: int = DEFAULT_BUFFER_SPANS):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+    
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+    
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        return [s for s in spans if trace_id is None or s.context.trace_id == trace_id]
+    
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter:
+    """Appends each finished span as one OTLP/JSON ``resourceSpans`` line"""
+    
+    def __init__(self, path: str, service_name: str = SERVICE_NAME):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        self._lock = threading.Lock()
+    
+    def export(self, span: Span):
+        line = json.dumps({"resourceSpans": [{
+            "resource": self._resource,
+            "scopeSpans": [{"scope": {"name": "oci-backup"}, "spans": [span.to_otlp()]}]
+        }]})
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("oci_backup_span", default=None)
+
+
+class Tracer:
+    """Creates spans and hands finished ones to its exporters"""
+    
+    def __init__(self, exporters=(), enabled: bool = True):
+        self.exporters = list(exporters)
+        self.enabled = enabled
+    
+    def _export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logging.warning("Trace exporter %s failed: %s", type(exporter).__name__, e)
+    
+    def start_span(self, name: str, parent: Optional[SpanContext] = None, kind: int = KIND_INTERNAL,
+                   attributes: Optional[Dict[str, Any]] = None):
+        """
+        Start a span without making it current.
+        
+        The parent defaults to the current span; a trace is started when
+        there is none.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            current = _current.get()
+            parent = current.context if current is not None else None
+        if parent is not None and not parent.sampled:
+            return NOOP_SPAN
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        context = SpanContext(trace_id, secrets.token_hex(8))
+        return Span(self, name, context, parent.span_id if parent else None, kind, attributes)
+    
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, kind: int = KIND_INTERNAL,
+             attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+        """Run the enclosed block as the current span, recording any exception"""
+        span = self.start_span(name, parent, kind, attributes)
+        token = _current.set(span) if span is not NOOP_SPAN else None
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            if token is not None:
+                _current.reset(token)
+            span.end()
+
+
+def _default_tracer() -> Tracer:
+    exporters = [InMemoryExporter()]
+    if DEFAULT_TRACE_FILE:
+        exporters.append(FileExporter(DEFAULT_TRACE_FILE))
+    return Tracer(exporters, enabled=TRACING_ENABLED)
+
+
+_tracer = _default_tracer()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer"""
+    return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, parent: Optional[SpanContext] = None, kind: int = KIND_INTERNAL,
+         attributes: Optional[Dict[str, Any]] = None):
+    """Context manager running a block as a span of the process-wide tracer"""
+    return _tracer.span(name, parent, kind, attributes)
+
+
+def traced(name: Optional[str] = None, kind: int = KIND_INTERNAL):
+    """Decorator running every call of a function or coroutine function as a span"""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+        
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, kind=kind):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind=kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    
+    return decorate
+
+
+def current_span():
+    """The active span, or a no-op span outside any trace"""
+    return _current.get() or NOOP_SPAN
+
+
+def current_traceparent() -> Optional[str]:
+    """``traceparent`` of the active span, for handing work to later tasks or other processes"""
+    span = _current.get()
+    return span.context.traceparent if span is not None else None
+
+
+def memory_exporter() -> Optional[InMemoryExporter]:
+    """The process-wide tracer's in-memory exporter, if it has one"""
+    return next((e for e in _tracer.exporters if isinstance(e, InMemoryExporter)), None)
+
+
+def bind(fn: Callable, *args, **kwargs) -> Callable[[], Any]:
+    """
+    Capture the current trace context for a call made on another thread.
+    
+    Thread pools do not inherit context variables; submit the returned
+    callable instead of ``fn`` so spans it opens keep their parent. Each
+    bound callable must run once.
+    """
+    context = contextvars.copy_context()
+    return lambda: context.run(fn, *args, **kwargs)
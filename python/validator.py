@@ -5,17 +5,42 @@ validator.py - Backup Validation for OCI DataProtect MVP
 Validates backup integrity and recoverability to ensure backups are trustworthy.
 Demonstrates enterprise-grade backup validation and compliance reporting.
 """
+import functools
 import hashlib
 import json
 import logging
+import os
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 from enum import Enum
 from dataclasses import dataclass, asdict
-import oci
+from lazy import oci
+
+import metrics
+import profiling
+from clients import DEFAULT_REGIONS, get_client_pool, parse_regions
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
+# Failed backup ids listed in a compliance report; the rest are only counted
+MAX_REPORTED_FAILURES = int(os.environ.get("OCI_BACKUP_REPORT_MAX_FAILURES", "1000"))
+
+VALIDATIONS = metrics.counter("validations", "Backup validations by backup type and result", ["backup_type", "status"])
+VALIDATION_SECONDS = metrics.histogram("validation_duration_seconds", "Time to validate one backup", ["backup_type"])
+
+
+def _observed(validate):
+    """Record duration and outcome of a single-backup validation"""
+    @functools.wraps(validate)
+    def wrapper(self, backup_id: str) -> 'ValidationResult':
+        started = time.perf_counter()
+        result = validate(self, backup_id)
+        VALIDATION_SECONDS.labels(result.backup_type).observe(time.perf_counter() - started)
+        VALIDATIONS.labels(result.backup_type, result.overall_status.value).inc()
+        return result
+    return wrapper
+
 
 class ValidationStatus(Enum):
     """Validation result status"""
@@ -46,6 +71,7 @@ class ValidationResult:
     issues: List[str]
     recommendations: List[str]
     compliance_status: str
+    region: Optional[str] = None
     
     def __post_init__(self):
         if not self.validation_time:
@@ -65,36 +91,31 @@ class ValidationResult:
 class BackupValidator:
     """Validates backup integrity and recoverability"""
     
-    def __init__(self, profile: str = None):
+    def __init__(self, profile: str = None, region: str = None):
         self.profile = profile
+        self.region = region
         self.compute_client = None
         self.block_storage_client = None
         self.object_storage_client = None
+        self.identity_client = None
         self._init_clients()
         logging.info("BackupValidator initialized")
     
     def _init_clients(self):
         """Initialize OCI clients"""
         try:
-            if self.profile:
-                config = oci.config.from_file(profile_name=self.profile)
-                signer = None
-            else:
-                try:
-                    signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
-                    config = {}
-                except Exception:
-                    config = oci.config.from_file()
-                    signer = None
+            pool = get_client_pool(self.profile, instance_principals_first=True)
             
-            self.compute_client = oci.core.ComputeClient(config, signer=signer)
-            self.block_storage_client = oci.core.BlockstorageClient(config, signer=signer)
-            self.object_storage_client = oci.object_storage.ObjectStorageClient(config, signer=signer)
+            self.compute_client = pool.get(oci.core.ComputeClient, self.region)
+            self.block_storage_client = pool.get(oci.core.BlockstorageClient, self.region)
+            self.object_storage_client = pool.get(oci.object_storage.ObjectStorageClient, self.region)
+            self.identity_client = pool.get(oci.identity.IdentityClient, self.region)
             
         except Exception as e:
             logging.error("Failed to initialize OCI clients: %s", e)
             raise
     
+    @_observed
     def validate_boot_volume_backup(self, backup_id: str) -> ValidationResult:
         """Validate a boot volume backup"""
         logging.info("Validating boot volume backup: %s", backup_id)
@@ -137,7 +158,8 @@ class BackupValidator:
                     checks=checks,
                     issues=issues,
                     recommendations=recommendations,
-                    compliance_status="FAILED"
+                    compliance_status="FAILED",
+                    region=self.region
                 )
             
             # Check 2: Metadata validation
@@ -189,9 +211,11 @@ class BackupValidator:
             checks=checks,
             issues=issues,
             recommendations=recommendations,
-            compliance_status=compliance_status
+            compliance_status=compliance_status,
+            region=self.region
         )
     
+    @_observed
     def validate_volume_backup(self, backup_id: str) -> ValidationResult:
         """Validate a block volume backup"""
         logging.info("Validating block volume backup: %s", backup_id)
@@ -234,7 +258,8 @@ class BackupValidator:
                     checks=checks,
                     issues=issues,
                     recommendations=recommendations,
-                    compliance_status="FAILED"
+                    compliance_status="FAILED",
+                    region=self.region
                 )
             
             # Check 2: Metadata validation
@@ -267,7 +292,8 @@ class BackupValidator:
             checks=checks,
             issues=issues,
             recommendations=recommendations,
-            compliance_status=compliance_status
+            compliance_status=compliance_status,
+            region=self.region
         )
     
     def _validate_metadata(self, backup) -> dict:
@@ -347,103 +373,355 @@ class BackupValidator:
     
     def validate_compartment_backups(self, compartment_id: str) -> List[ValidationResult]:
         """Validate all backups in a compartment"""
+        return list(self.iter_compartment_backups(compartment_id))
+    
+    def iter_compartment_backups(self, compartment_id: str) -> Iterator[ValidationResult]:
+        """
+        Validate all backups in a compartment, yielding each result as it is produced.
+        
+        Transient API errors are retried by the client layer. Both backup
+        types are listed before anything is validated; a listing that still
+        fails raises, so the compartment is reported as failed instead of
+        as completed with missing backups.
+        """
         logging.info("Validating all backups in compartment: %s", compartment_id)
         
-        results = []
+        count = 0
+        listings = [
+            ("boot volume", self.block_storage_client.list_boot_volume_backups, self.validate_boot_volume_backup),
+            ("block volume", self.block_storage_client.list_volume_backups, self.validate_volume_backup),
+        ]
         
-        try:
-            # Validate boot volume backups
-            boot_backups = self.block_storage_client.list_boot_volume_backups(
-                compartment_id=compartment_id
-            ).data
-            
-            for backup in boot_backups:
-                result = self.validate_boot_volume_backup(backup.id)
-                results.append(result)
-            
-            # Validate block volume backups
-            volume_backups = self.block_storage_client.list_volume_backups(
-                compartment_id=compartment_id
-            ).data
-            
-            for backup in volume_backups:
-                result = self.validate_volume_backup(backup.id)
-                results.append(result)
-            
-            logging.info("Validated %d backups in compartment", len(results))
-            
-        except Exception as e:
-            logging.error("Failed to validate compartment backups: %s", e)
+        listed = []
+        for label, list_backups, validate in listings:
+            try:
+                backups = oci.pagination.list_call_get_all_results(
+                    list_backups, compartment_id=compartment_id
+                ).data
+            except Exception as e:
+                logging.error("Failed to list %s backups in %s: %s", label, compartment_id, e)
+                raise
+            listed.append((backups, validate))
+        
+        for backups, validate in listed:
+            for backup in backups:
+                count += 1
+                yield validate(backup.id)
         
-        return results
+        logging.info("Validated %d backups in compartment", count)
+    
+    def iter_compartment_tree(
+        self,
+        root_compartment_id: str,
+        max_workers: int = 8,
+        timings: Optional[List[dict]] = None
+    ) -> Iterator[ValidationResult]:
+        """
+        Validate every compartment in a subtree concurrently.
+        
+        Results are yielded compartment by compartment as each one finishes.
+        Per-compartment timings are appended to ``timings`` when given.
+        """
+        from compartments import discover_compartments, iter_fan_out
+        
+        compartments = discover_compartments(self.identity_client, root_compartment_id, max_workers)
+        for run in iter_fan_out(
+            compartments,
+            lambda node: self.validate_compartment_backups(node.id),
+            max_workers
+        ):
+            if timings is not None:
+                timings.append(run.summary())
+            yield from run.result or []
+    
+    def iter_region_backups(
+        self,
+        compartment_id: str,
+        regions: List[str],
+        subtree: bool = False,
+        max_workers: int = 8,
+        region_timings: Optional[List[dict]] = None,
+        compartment_timings: Optional[List[dict]] = None
+    ) -> Iterator[ValidationResult]:
+        """
+        Validate a compartment (or subtree) in several regions concurrently.
+        
+        Every result is tagged with its region. Results are yielded region
+        by region as each one finishes.
+        """
+        from clients import iter_regions
+        
+        def validate_region(region: str) -> List[ValidationResult]:
+            validator = BackupValidator(profile=self.profile, region=region)
+            if not subtree:
+                return validator.validate_compartment_backups(compartment_id)
+            timings = []
+            results = list(validator.iter_compartment_tree(compartment_id, max_workers, timings))
+            if compartment_timings is not None:
+                compartment_timings.extend({**t, "region": region} for t in timings)
+            return results
+        
+        for run in iter_regions(regions, validate_region):
+            if region_timings is not None:
+                region_timings.append({**run.summary(), "backups": len(run.result or [])})
+            yield from run.result or []
     
     def generate_compliance_report(self, results: List[ValidationResult]) -> dict:
         """Generate a compliance report from validation results"""
-        total = len(results)
-        passed = sum(1 for r in results if r.overall_status == ValidationStatus.PASSED)
-        failed = sum(1 for r in results if r.overall_status == ValidationStatus.FAILED)
-        warnings = sum(1 for r in results if r.overall_status == ValidationStatus.WARNING)
+        builder = ComplianceReportBuilder()
+        details = []
+        for result in results:
+            builder.add(result)
+            details.append(result.to_dict())
+        
+        report = builder.summary()
+        report["details"] = details
+        return report
+
+
+class ComplianceReportBuilder:
+    """
+    Single-pass compliance report accumulator.
+    
+    Results are folded into counters as they arrive, so the summary never
+    needs the full result list. Only the first ``max_failed_backups`` failed
+    backup ids and the (bounded) set of distinct recommendations are
+    retained; further failures are only counted.
+    """
+    
+    def __init__(self, max_failed_backups: int = MAX_REPORTED_FAILURES):
+        self.max_failed_backups = max_failed_backups
+        self.total = 0
+        self.passed = 0
+        self.failed = 0
+        self.warnings = 0
+        self.unencrypted = 0
+        self.failed_backups: List[str] = []
+        self.compartments: List[dict] = []  # Per-compartment timings for subtree runs
+        self.region_runs: List[dict] = []  # Per-region timings for multi-region runs
+        self.regions: Dict[str, Dict[str, int]] = {}
+        self.restore_tests = {"tested": 0, "passed": 0, "failed": 0, "skipped": 0}
+        self.restore_times: List[float] = []  # Measured time-to-restore of sampled backups
+        self._recommendations = set()
+    
+    def add(self, result: ValidationResult):
+        """Fold one validation result into the report"""
+        self.total += 1
+        if result.overall_status == ValidationStatus.PASSED:
+            self.passed += 1
+        elif result.overall_status == ValidationStatus.FAILED:
+            self.failed += 1
+            if len(self.failed_backups) < self.max_failed_backups:
+                self.failed_backups.append(result.backup_id)
+        elif result.overall_status == ValidationStatus.WARNING:
+            self.warnings += 1
+        
+        if result.region:
+            counts = self.regions.setdefault(
+                result.region, {"total_backups": 0, "passed": 0, "failed": 0, "warnings": 0}
+            )
+            counts["total_backups"] += 1
+            key = {
+                ValidationStatus.PASSED: "passed",
+                ValidationStatus.FAILED: "failed",
+                ValidationStatus.WARNING: "warnings"
+            }.get(result.overall_status)
+            if key:
+                counts[key] += 1
+        
+        self._recommendations.update(result.recommendations)
+        if result.checks.get(ValidationCheck.ENCRYPTION_VERIFIED.value, {}).get("status") == "failed":
+            self.unencrypted += 1
+        
+        restore_test = result.checks.get(ValidationCheck.RESTORE_TEST.value, {})
+        rto = restore_test.get("details", {}).get("time_to_restore_seconds")
+        if rto is not None or restore_test.get("status") == "failed":
+            self.restore_tests["tested"] += 1
+            self.restore_tests["passed" if restore_test.get("status") == "passed" else "failed"] += 1
+            if rto is not None:
+                self.restore_times.append(rto)
+        elif restore_test.get("status") == "skipped" and restore_test.get("details", {}).get("sampled"):
+            # Sampled but not run (e.g. cost budget exhausted)
+            self.restore_tests["skipped"] += 1
+    
+    def rto_summary(self) -> Optional[dict]:
+        """Measured time-to-restore statistics, or None if nothing was tested"""
+        if not self.restore_times:
+            return None
+        times = sorted(self.restore_times)
         
-        compliance_rate = (passed / total * 100) if total > 0 else 0
+        def percentile(p: float) -> float:
+            return times[min(len(times) - 1, int(p / 100 * len(times)))]
+        
+        return {
+            "samples": len(times),
+            "min": times[0],
+            "p50": percentile(50),
+            "p90": percentile(90),
+            "max": times[-1],
+            "mean": round(sum(times) / len(times), 1)
+        }
+    
+    def recommendations(self) -> List[str]:
+        """Recommendations based on everything added so far"""
+        recommendations = set(self._recommendations)
+        
+        # Add general recommendations
+        if self.failed > 0:
+            recommendations.add("Investigate and remediate failed backups immediately")
+        if self.restore_tests["failed"] > 0:
+            recommendations.add(f"{self.restore_tests['failed']} sampled backups failed restore tests")
+        if self.unencrypted > 0:
+            recommendations.add(f"Enable encryption for {self.unencrypted} unencrypted backups")
+        
+        return sorted(recommendations)
+    
+    def summary(self) -> dict:
+        """Report body without per-backup details"""
+        compliance_rate = (self.passed / self.total * 100) if self.total > 0 else 0
         
         report = {
             "report_date": datetime.utcnow().isoformat(),
             "summary": {
-                "total_backups": total,
-                "passed": passed,
-                "failed": failed,
-                "warnings": warnings,
+                "total_backups": self.total,
+                "passed": self.passed,
+                "failed": self.failed,
+                "warnings": self.warnings,
                 "compliance_rate": f"{compliance_rate:.1f}%"
             },
             "status": "COMPLIANT" if compliance_rate >= 95 else "NON_COMPLIANT",
-            "failed_backups": [
-                r.backup_id for r in results 
-                if r.overall_status == ValidationStatus.FAILED
-            ],
-            "recommendations": self._generate_recommendations(results),
-            "details": [r.to_dict() for r in results]
+            "failed_backups": list(self.failed_backups),
+            "recommendations": self.recommendations()
         }
-        
+        if self.failed > len(self.failed_backups):
+            report["failed_backups_omitted"] = self.failed - len(self.failed_backups)
+        if self.compartments:
+            report["compartments"] = list(self.compartments)
+        if self.regions:
+            report["regions"] = {region: dict(counts) for region, counts in self.regions.items()}
+        if self.region_runs:
+            report["region_runs"] = list(self.region_runs)
+        if self.restore_tests["tested"] or self.restore_tests["skipped"]:
+            report["restore_tests"] = {**self.restore_tests, "rto_seconds": self.rto_summary()}
         return report
+
+
+def iter_compliance_report(
+    results: Iterable[ValidationResult],
+    fmt: str = "ndjson",
+    builder: Optional[ComplianceReportBuilder] = None
+) -> Iterator[str]:
+    """
+    Stream a compliance report as text chunks while results are produced.
     
-    def _generate_recommendations(self, results: List[ValidationResult]) -> List[str]:
-        """Generate recommendations based on validation results"""
-        recommendations = set()
-        
+    ``ndjson`` emits one ``{"type": "result", ...}`` line per backup followed
+    by a final ``{"type": "summary", ...}`` line. ``json`` emits a single JSON
+    document with ``details`` first and the summary fields after it.
+    Pass a ``builder`` to read the summary once the stream is exhausted.
+    """
+    builder = builder if builder is not None else ComplianceReportBuilder()
+    
+    if fmt == "ndjson":
         for result in results:
-            recommendations.update(result.recommendations)
-        
-        # Add general recommendations
-        failed_count = sum(1 for r in results if r.overall_status == ValidationStatus.FAILED)
-        if failed_count > 0:
-            recommendations.add("Investigate and remediate failed backups immediately")
-        
-        unencrypted = sum(
-            1 for r in results 
-            if r.checks.get(ValidationCheck.ENCRYPTION_VERIFIED.value, {}).get("status") == "failed"
-        )
-        if unencrypted > 0:
-            recommendations.add(f"Enable encryption for {unencrypted} unencrypted backups")
-        
-        return sorted(list(recommendations))
+            builder.add(result)
+            yield json.dumps({"type": "result", **result.to_dict()}) + "\n"
+        yield json.dumps({"type": "summary", **builder.summary()}) + "\n"
+    
+    elif fmt == "json":
+        yield '{"details": ['
+        for result in results:
+            builder.add(result)
+            yield ("," if builder.total > 1 else "") + "\n  " + json.dumps(result.to_dict())
+        summary = builder.summary()
+        yield "\n]"
+        for key, value in summary.items():
+            yield f", {json.dumps(key)}: {json.dumps(value)}"
+        yield "}\n"
+    
+    else:
+        raise ValueError(f"Unsupported report format: {fmt}")
+
 
+def write_compliance_report(
+    results: Iterable[ValidationResult],
+    stream: TextIO,
+    fmt: str = "ndjson",
+    builder: Optional[ComplianceReportBuilder] = None
+) -> dict:
+    """Stream a compliance report to a file object and return its summary"""
+    builder = builder if builder is not None else ComplianceReportBuilder()
+    for chunk in iter_compliance_report(results, fmt, builder):
+        stream.write(chunk)
+    return builder.summary()
 
-def main():
+
+def main(argv=None):
     """CLI for backup validation"""
     import argparse
     
     parser = argparse.ArgumentParser(description="OCI Backup Validator")
-    parser.add_argument("action", choices=["validate-backup", "validate-compartment", "generate-report"],
+    parser.add_argument("action", choices=["validate-backup", "validate-compartment", "generate-report",
+                                           "diff-report", "verify-image"],
                        help="Action to perform")
     parser.add_argument("--backup-id", help="Backup ID to validate")
     parser.add_argument("--backup-type", choices=["boot", "volume"], help="Type of backup")
     parser.add_argument("--compartment", help="Compartment ID to validate")
+    parser.add_argument("--subtree", action="store_true",
+                       help="Also validate all nested compartments")
+    parser.add_argument("--max-workers", type=int, default=8,
+                       help="Compartments validated concurrently in subtree mode")
+    parser.add_argument("--regions", default=DEFAULT_REGIONS,
+                       help="Comma-separated regions to validate concurrently (default: config region)")
+    parser.add_argument("--region", help="Region for single-backup validation (default: config region)")
     parser.add_argument("--profile", help="OCI config profile")
     parser.add_argument("--output", help="Output file for report (JSON)")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                       help="Report file format (streamed as results are produced)")
+    parser.add_argument("--save-snapshot", action="store_true",
+                       help="Persist a status snapshot of this run for diff-report")
+    parser.add_argument("--snapshot-dir", help="Directory holding report snapshots")
+    parser.add_argument("--baseline", help="Baseline snapshot ID for diff-report (default: previous run)")
+    parser.add_argument("--current", help="Current snapshot ID for diff-report (default: latest run)")
+    parser.add_argument("--image", help="Exported or restored image (file or block device) for verify-image")
+    parser.add_argument("--manifest", help="Block-hash manifest for verify-image")
+    parser.add_argument("--test-restore", action="store_true",
+                       help="Restore sampled backups into a sandbox to measure time-to-restore")
+    parser.add_argument("--sandbox-compartment", help="Compartment for restore tests (default: --compartment)")
+    parser.add_argument("--availability-domain", help="Availability domain for restore tests")
+    parser.add_argument("--sandbox-subnet", help="Existing sandbox subnet (default: create a private one per run)")
+    parser.add_argument("--sandbox-shape", default="VM.Standard.E4.Flex", help="Shape for restore test instances")
+    parser.add_argument("--restore-sample-rate", type=float, default=0.1,
+                       help="Share of backups to restore-test (0-1)")
+    parser.add_argument("--restore-max-tests", type=int, default=10, help="Maximum restore tests per run")
+    parser.add_argument("--restore-concurrency", type=int, default=4, help="Restore tests run in parallel")
+    parser.add_argument("--restore-budget", type=float, help="Maximum estimated sandbox cost for the run")
+    parser.add_argument("--hourly-cost", type=float, default=0.0,
+                       help="Estimated hourly cost of one sandbox instance")
+    metrics.add_metrics_arguments(parser)
+    profiling.add_profile_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    metrics.write_on_exit(args.metrics_file)
+    profiling.profile_until_exit(args.profile_out)
     
-    validator = BackupValidator(profile=args.profile)
+    if args.action == "diff-report":
+        # Works from persisted snapshots only; no OCI access needed
+        diff_report_main(args)
+        return
+    
+    if args.action == "verify-image":
+        # Local image verification; no OCI access needed
+        if not args.image or not args.manifest:
+            print("Error: --image and --manifest required")
+            return
+        result = validate_image_integrity(args.backup_id or args.image, args.image, args.manifest)
+        print(result.to_json())
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(result.to_json())
+        return
+    
+    validator = BackupValidator(profile=args.profile, region=args.region)
     
     if args.action == "validate-backup":
         if not args.backup_id or not args.backup_type:
@@ -455,6 +733,12 @@ def main():
         else:
             result = validator.validate_volume_backup(args.backup_id)
         
+        if args.test_restore:
+            tester = _restore_tester(args, validator)
+            if tester is None:
+                return
+            result = next(tester.iter_with_restore_tests([result], sample_rate=1.0))
+        
         print(f"\n{'='*80}")
         print(f"Validation Result: {result.overall_status.value.upper()}")
         print(f"{'='*80}\n")
@@ -475,8 +759,41 @@ def main():
             print("Error: --compartment required")
             return
         
-        results = validator.validate_compartment_backups(args.compartment)
-        report = validator.generate_compliance_report(results)
+        builder = ComplianceReportBuilder()
+        regions = parse_regions(args.regions)
+        if regions:
+            results = validator.iter_region_backups(
+                args.compartment, regions, args.subtree, args.max_workers,
+                builder.region_runs, builder.compartments
+            )
+        elif args.subtree:
+            results = validator.iter_compartment_tree(args.compartment, args.max_workers, builder.compartments)
+        else:
+            results = validator.iter_compartment_backups(args.compartment)
+        if args.test_restore:
+            tester = _restore_tester(args, validator)
+            if tester is None:
+                return
+            results = tester.iter_with_restore_tests(
+                results, args.restore_sample_rate, args.restore_max_tests
+            )
+        snapshot = None
+        if args.save_snapshot:
+            from report_diff import ReportSnapshot
+            snapshot = ReportSnapshot(
+                snapshot_id=f"run-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}",
+                compartment_id=args.compartment
+            )
+            results = snapshot.record(results)
+        
+        if args.output:
+            # Stream details to disk as they are produced
+            with open(args.output, 'w') as f:
+                report = write_compliance_report(results, f, args.format, builder)
+        else:
+            for result in results:
+                builder.add(result)
+            report = builder.summary()
         
         print(f"\n{'='*80}")
         print(f"Compliance Report")
@@ -488,10 +805,33 @@ def main():
         print(f"\nCompliance Rate: {report['summary']['compliance_rate']}")
         print(f"Status: {report['status']}")
         
+        if report.get('compartments'):
+            print(f"\nCompartments ({len(report['compartments'])}):")
+            for timing in report['compartments']:
+                marker = "❌" if timing['status'] == "failed" else "✅"
+                where = f"[{timing['region']}] " if timing.get('region') else ""
+                print(f"  {marker} {where}{timing['name']}: {timing['items']} backups in {timing['duration_seconds']:.1f}s")
+        
+        if report.get('regions'):
+            print(f"\nRegions ({len(report['regions'])}):")
+            for region, counts in sorted(report['regions'].items()):
+                print(f"  {region}: {counts['total_backups']} backups, {counts['passed']} passed, "
+                      f"{counts['warnings']} warnings, {counts['failed']} failed")
+        
+        if report.get('restore_tests'):
+            tests = report['restore_tests']
+            print(f"\nRestore Tests: {tests['tested']} run, {tests['passed']} passed, "
+                  f"{tests['failed']} failed, {tests['skipped']} skipped (budget)")
+            if tests['rto_seconds']:
+                rto = tests['rto_seconds']
+                print(f"  Measured RTO: p50 {rto['p50']:.0f}s, p90 {rto['p90']:.0f}s, max {rto['max']:.0f}s")
+        
         if report['failed_backups']:
             print(f"\nFailed Backups:")
             for backup_id in report['failed_backups']:
                 print(f"  - {backup_id}")
+            if report.get('failed_backups_omitted'):
+                print(f"  ... and {report['failed_backups_omitted']} more")
         
         if report['recommendations']:
             print(f"\nRecommendations:")
@@ -499,13 +839,99 @@ def main():
                 print(f"  - {rec}")
         
         if args.output:
-            with open(args.output, 'w') as f:
-                json.dump(report, f, indent=2)
             print(f"\n✅ Report saved to: {args.output}")
+        
+        if snapshot is not None:
+            from report_diff import SnapshotStore, DEFAULT_SNAPSHOT_DIR
+            SnapshotStore(args.snapshot_dir or DEFAULT_SNAPSHOT_DIR).save(snapshot)
+            print(f"✅ Snapshot saved: {snapshot.snapshot_id}")
     
     elif args.action == "generate-report":
         print("generate-report requires validate-compartment first")
 
 
+def validate_image_integrity(backup_id: str, image_path: str, manifest_path: str) -> ValidationResult:
+    """Validate an exported or restored image against its block-hash manifest"""
+    from checksum import integrity_check
+    
+    check = integrity_check(image_path, manifest_path)
+    passed = check["status"] == "passed"
+    return ValidationResult(
+        backup_id=backup_id,
+        backup_type="image",
+        validation_time=datetime.utcnow().isoformat(),
+        overall_status=ValidationStatus.PASSED if passed else ValidationStatus.FAILED,
+        checks={ValidationCheck.INTEGRITY_CHECKSUM.value: check},
+        issues=[] if passed else [check["message"]],
+        recommendations=[] if passed else ["Re-export or restore the image from a known-good backup"],
+        compliance_status="COMPLIANT" if passed else "NON_COMPLIANT"
+    )
+
+
+def _restore_tester(args, validator: BackupValidator):
+    """Build a restore tester from CLI arguments (None if misconfigured)"""
+    from restore_test import CostBudget, RestoreTester, SandboxConfig
+    
+    compartment = args.sandbox_compartment or args.compartment
+    if not compartment or not args.availability_domain:
+        print("Error: --test-restore requires --availability-domain and a sandbox compartment")
+        return None
+    
+    config = SandboxConfig(
+        compartment_id=compartment,
+        availability_domain=args.availability_domain,
+        subnet_id=args.sandbox_subnet,
+        shape=args.sandbox_shape
+    )
+    network = get_client_pool(args.profile).get(oci.core.VirtualNetworkClient, args.region)
+    return RestoreTester(
+        validator.compute_client, validator.block_storage_client, network, config,
+        max_concurrent=args.restore_concurrency,
+        budget=CostBudget(args.restore_budget, args.hourly_cost)
+    )
+
+
+def diff_report_main(args):
+    """CLI for differential reports between two validation runs"""
+    from report_diff import SnapshotStore, DEFAULT_SNAPSHOT_DIR, diff_snapshots
+    
+    if not args.compartment:
+        print("Error: --compartment required")
+        return
+    
+    store = SnapshotStore(args.snapshot_dir or DEFAULT_SNAPSHOT_DIR)
+    try:
+        current_id = args.current or store.previous(args.compartment)
+        baseline_id = args.baseline or (current_id and store.previous(args.compartment, current_id))
+        if not current_id or not baseline_id:
+            print("Error: need two snapshots (run validate-compartment --save-snapshot twice)")
+            return
+        diff = diff_snapshots(
+            store.load(args.compartment, baseline_id),
+            store.load(args.compartment, current_id)
+        )
+    except KeyError as e:
+        print(f"Error: {e}")
+        return
+    
+    print(f"\n{'='*80}")
+    print(f"Compliance Changes: {baseline_id} -> {current_id}")
+    print(f"{'='*80}\n")
+    print(f"❌ Newly failing: {diff['summary']['newly_failing']}")
+    print(f"✅ Newly passing: {diff['summary']['newly_passing']}")
+    print(f"🔀 Other status changes: {diff['summary']['status_changed']}")
+    print(f"➕ New backups: {diff['summary']['new_backups']}")
+    print(f"➖ Deleted backups: {diff['summary']['deleted_backups']}")
+    
+    for entry in diff['newly_failing']:
+        checks = ", ".join(entry['newly_failed_checks']) or "no individual check"
+        print(f"  - {entry['backup_id']}: {entry['from']} -> {entry['to']} ({checks})")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(diff, f, indent=2)
+        print(f"\n✅ Diff saved to: {args.output}")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,301 @@
+"""
+waiter.py - Batched lifecycle polling for in-flight backups and volumes
+
+Tracks any number of backups (or restored volumes) waiting to reach a
+terminal lifecycle state and refreshes them all with one list call per
+compartment and resource kind per interval, instead of one get call per
+resource. Each tracked resource resolves a Future when its state settles.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+DEFAULT_POLL_INTERVAL = 10.0
+
+# Resource kind -> (client, list method, list supports time sort)
+RESOURCE_KINDS = {
+    "boot_volume_backup": ("block", "list_boot_volume_backups", True),
+    "volume_backup": ("block", "list_volume_backups", True),
+    "boot_volume": ("block", "list_boot_volumes", False),
+    "volume": ("block", "list_volumes", True),
+    "instance": ("compute", "list_instances", True),
+}
+
+SUCCESS_STATES = {"AVAILABLE"}
+FAILURE_STATES = {"FAULTY", "TERMINATING", "TERMINATED"}
+
+# Kinds whose settled states differ from the block storage defaults
+KIND_STATES = {
+    "instance": ({"RUNNING"}, {"STOPPING", "STOPPED", "TERMINATING", "TERMINATED"}),
+}
+
+
+class LifecycleError(Exception):
+    """A tracked resource settled in a failure state or never appeared"""
+    
+    def __init__(self, resource_id: str, state: Optional[str], message: str):
+        super().__init__(f"{resource_id}: {message}")
+        self.resource_id = resource_id
+        self.state = state
+
+
+@dataclass
+class TrackedResource:
+    """A resource the waiter is polling for"""
+    resource_id: str
+    kind: str
+    compartment_id: str
+    availability_domain: Optional[str] = None
+    success_states: Set[str] = field(default_factory=lambda: set(SUCCESS_STATES))
+    failure_states: Set[str] = field(default_factory=lambda: set(FAILURE_STATES))
+    deadline: Optional[float] = None
+    future: Future = field(default_factory=Future)
+    state: Optional[str] = None
+    time_created: Optional[object] = None
+    misses: int = 0
+    
+    @property
+    def group(self) -> Tuple[str, str, Optional[str]]:
+        """Resources refreshed by the same list call"""
+        ad = self.availability_domain if self.kind == "boot_volume" else None
+        return self.kind, self.compartment_id, ad
+
+
+class LifecycleWaiter:
+    """
+    Resolve futures for many in-flight resources with batched list calls.
+    
+    A background thread runs while anything is tracked. Each tick groups
+    tracked resources by kind and compartment and issues one list call per
+    group (paging newest first and stopping once past the oldest tracked
+    resource where the API supports time sorting).
+    """
+    
+    def __init__(
+        self,
+        block_storage_client,
+        interval: float = DEFAULT_POLL_INTERVAL,
+        max_misses: int = 6,
+        compute_client=None
+    ):
+        self.block = block_storage_client
+        self.compute = compute_client
+        self.interval = interval
+        self.max_misses = max_misses
+        self.ticks = 0
+        self.list_calls = 0
+        self.resolved = 0
+        self._tracked: Dict[str, TrackedResource] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def track(
+        self,
+        resource_id: str,
+        kind: str,
+        compartment_id: str,
+        availability_domain: Optional[str] = None,
+        timeout: Optional[float] = None,
+        time_created=None,
+        success_states: Optional[Set[str]] = None,
+        failure_states: Optional[Set[str]] = None
+    ) -> Future:
+        """
+        Start tracking a resource and return a Future for its settled state.
+        
+        The future resolves to the resource summary from the list call once
+        it reaches AVAILABLE (RUNNING for instances), or fails with
+        LifecycleError (failure state, never listed) or TimeoutError.
+        Tracking an id twice returns the same future. Pass
+        ``success_states``/``failure_states`` to wait for other transitions
+        (e.g. TERMINATED during teardown).
+        """
+        if kind not in RESOURCE_KINDS:
+            raise ValueError(f"Unknown resource kind: {kind}")
+        if getattr(self, RESOURCE_KINDS[kind][0]) is None:
+            raise ValueError(f"Tracking {kind} requires a {RESOURCE_KINDS[kind][0]} client")
+        default_success, default_failure = KIND_STATES.get(kind, (SUCCESS_STATES, FAILURE_STATES))
+        success_states = default_success if success_states is None else success_states
+        failure_states = default_failure if failure_states is None else failure_states
+        
+        with self._lock:
+            existing = self._tracked.get(resource_id)
+            if existing:
+                return existing.future
+            resource = TrackedResource(
+                resource_id=resource_id,
+                kind=kind,
+                compartment_id=compartment_id,
+                availability_domain=availability_domain,
+                success_states=set(success_states),
+                failure_states=set(failure_states),
+                deadline=time.monotonic() + timeout if timeout else None,
+                time_created=time_created
+            )
+            self._tracked[resource_id] = resource
+            self._ensure_running()
+        return resource.future
+    
+    def track_backup(self, backup, kind: str, timeout: Optional[float] = None) -> Future:
+        """Track a backup/volume model as returned by a create_* call"""
+        return self.track(
+            backup.id, kind, backup.compartment_id,
+            availability_domain=getattr(backup, "availability_domain", None),
+            timeout=timeout,
+            time_created=getattr(backup, "time_created", None)
+        )
+    
+    def wait_all(self, futures: Iterable[Future]) -> List:
+        """Block until every future settles; returns results (or exceptions) in order"""
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+    
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._tracked)
+    
+    def stats(self) -> dict:
+        """Polling cost counters"""
+        return {
+            "pending": self.pending,
+            "ticks": self.ticks,
+            "list_calls": self.list_calls,
+            "resolved": self.resolved
+        }
+    
+    def _ensure_running(self):
+        # Caller holds self._lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="lifecycle-waiter", daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.poll_once()
+            with self._lock:
+                if not self._tracked:
+                    self._thread = None
+                    return
+    
+    def poll_once(self):
+        """Refresh every tracked resource with one list call per group"""
+        with self._lock:
+            groups: Dict[tuple, Dict[str, TrackedResource]] = {}
+            for resource in self._tracked.values():
+                groups.setdefault(resource.group, {})[resource.resource_id] = resource
+        if not groups:
+            return
+        
+        self.ticks += 1
+        for (kind, compartment_id, ad), resources in groups.items():
+            try:
+                seen = self._list_group(kind, compartment_id, ad, resources)
+            except Exception as e:
+                # Transient failures were already retried by the client;
+                # keep waiting and try again next tick
+                logging.warning("Lifecycle poll of %s in %s failed: %s", kind, compartment_id, e)
+                continue
+            for resource_id, resource in resources.items():
+                self._update(resource, seen.get(resource_id))
+        
+        now = time.monotonic()
+        with self._lock:
+            expired = [r for r in self._tracked.values() if r.deadline and now >= r.deadline]
+        for resource in expired:
+            self._resolve(resource, exception=TimeoutError(
+                f"{resource.resource_id} still {resource.state or 'unknown'} at timeout"
+            ))
+    
+    def _list_group(self, kind: str, compartment_id: str, ad: Optional[str],
+                    resources: Dict[str, TrackedResource]) -> Dict[str, object]:
+        """One (possibly paged) list call covering every resource in a group"""
+        client_name, method_name, time_sorted = RESOURCE_KINDS[kind]
+        list_method = getattr(getattr(self, client_name), method_name)
+        kwargs = {"compartment_id": compartment_id}
+        if ad:
+            kwargs["availability_domain"] = ad
+        
+        oldest = None
+        if time_sorted:
+            kwargs.update(sort_by="TIMECREATED", sort_order="DESC")
+            created = [r.time_created for r in resources.values()]
+            if created and all(created):
+                oldest = min(created)
+        
+        wanted = set(resources)
+        seen = {}
+        page = None
+        while True:
+            if page:
+                kwargs["page"] = page
+            response = list_method(**kwargs)
+            self.list_calls += 1
+            reached_oldest = False
+            for item in response.data:
+                if item.id in wanted:
+                    seen[item.id] = item
+                if oldest is not None and item.time_created is not None and item.time_created < oldest:
+                    reached_oldest = True
+            # Newest-first paging can stop once every tracked resource is
+            # found or the page is older than anything being tracked
+            if len(seen) == len(wanted) or reached_oldest or not response.has_next_page:
+                return seen
+            page = response.next_page
+    
+    def _update(self, resource: TrackedResource, item):
+        if item is None:
+            resource.misses += 1
+            if resource.misses >= self.max_misses:
+                self._resolve(resource, exception=LifecycleError(
+                    resource.resource_id, None, f"not listed after {resource.misses} polls"
+                ))
+            return
+        
+        resource.misses = 0
+        state = item.lifecycle_state
+        if state != resource.state:
+            logging.debug("%s %s -> %s", resource.kind, resource.resource_id, state)
+            resource.state = state
+        if state in resource.success_states:
+            self._resolve(resource, result=item)
+        elif state in resource.failure_states:
+            self._resolve(resource, exception=LifecycleError(
+                resource.resource_id, state, f"entered {state}"
+            ))
+    
+    def _resolve(self, resource: TrackedResource, result=None, exception: Exception = None):
+        with self._lock:
+            self._tracked.pop(resource.resource_id, None)
+        self.resolved += 1
+        if exception is not None:
+            resource.future.set_exception(exception)
+        else:
+            resource.future.set_result(result)
+
+
+def wait_for_backups(block_storage_client, backups: List[Tuple[object, str]],
+                     timeout: Optional[float] = None, interval: float = DEFAULT_POLL_INTERVAL) -> List:
+    """
+    Wait for ``(model, kind)`` pairs to settle using one shared waiter.
+    
+    Returns each resource's settled summary or the exception it failed
+    with, in input order.
+    """
+    waiter = LifecycleWaiter(block_storage_client, interval)
+    futures = [waiter.track_backup(model, kind, timeout) for model, kind in backups]
+    outcomes = waiter.wait_all(futures)
+    logging.info("Waited for %d resources with %d list calls over %d polls",
+                 len(futures), waiter.list_calls, waiter.ticks)
+    return outcomes